@@ -0,0 +1,144 @@
+"""Controle de admissão das requisições que usam o banco.
+
+No máximo DB_ADMISSAO_LIMITE requisições por processo acessam o banco ao
+mesmo tempo; as demais esperam numa fila de até DB_ADMISSAO_FILA lugares,
+por prioridade (escritas e GET por id antes das listagens completas) e, na
+mesma prioridade, por ordem de chegada. Quem não é admitido em
+DB_ADMISSAO_ESPERA segundos, ou chega com a fila cheia, recebe 503 na hora,
+com Retry-After: sob sobrecarga o banco continua respondendo no tempo normal
+para quem entrou, em vez de todas as requisições estourarem o timeout juntas.
+
+Com a fila cheia, uma requisição de prioridade maior toma o lugar da última
+de prioridade menor, que é descartada.
+"""
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+ALTA, NORMAL, BAIXA = 0, 1, 2
+PRIORIDADES = ("alta", "normal", "baixa")
+MOTIVOS = ("fila_cheia", "prazo", "preterida")
+
+
+class Sobrecarga(Exception):
+    """A requisição não foi admitida; `retry_after` sugere quando tentar de novo."""
+
+    def __init__(self, motivo, retry_after):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class _Espera:
+    __slots__ = ("chave", "prioridade", "evento", "admitida", "motivo")
+
+    def __init__(self, prioridade, ordem):
+        self.chave = (prioridade, ordem)
+        self.prioridade = prioridade
+        self.evento = threading.Event()
+        self.admitida = False
+        self.motivo = None
+
+    def __lt__(self, outra):
+        return self.chave < outra.chave
+
+
+class ControleAdmissao:
+    def __init__(self, limite=10, fila_maxima=50, espera_maxima=1.0):
+        self.limite = limite
+        self.fila_maxima = fila_maxima
+        self.espera_maxima = espera_maxima
+        self._em_execucao = 0
+        self._fila = []  # heap de _Espera
+        self._ordem = itertools.count()
+        self._lock = threading.Lock()
+        self._duracao_media = 0.05  # média móvel do tempo com a vaga, para o Retry-After
+        self.admitidas = 0
+        self.enfileiradas = 0
+        self.descartadas = dict.fromkeys(MOTIVOS, 0)
+
+    @property
+    def ativo(self):
+        return self.limite > 0
+
+    def _retry_after(self):
+        """Segundos até a fila atual andar, pelo tempo médio de cada requisição (mínimo 1)."""
+        return max(1, math.ceil((len(self._fila) + 1) * self._duracao_media / self.limite))
+
+    def _descarta(self, motivo):
+        self.descartadas[motivo] += 1
+        return Sobrecarga(motivo, self._retry_after())
+
+    def entrar(self, prioridade=NORMAL):
+        """Espera uma vaga e retorna os segundos de espera; levanta Sobrecarga se não for admitida."""
+        if not self.ativo:
+            return 0.0
+        with self._lock:
+            if self._em_execucao < self.limite and not self._fila:
+                self._em_execucao += 1
+                self.admitidas += 1
+                return 0.0
+            if len(self._fila) >= self.fila_maxima:
+                ultima = max(self._fila, default=None)
+                if ultima is None or ultima.prioridade <= prioridade:
+                    raise self._descarta("fila_cheia")
+                self._fila.remove(ultima)
+                heapq.heapify(self._fila)
+                ultima.motivo = "preterida"
+                ultima.evento.set()
+            espera = _Espera(prioridade, next(self._ordem))
+            heapq.heappush(self._fila, espera)
+            self.enfileiradas += 1
+
+        inicio = time.monotonic()
+        espera.evento.wait(self.espera_maxima)
+        with self._lock:
+            if espera.admitida:  # a vaga pode ter chegado junto com o fim do prazo
+                self.admitidas += 1
+                return time.monotonic() - inicio
+            if espera.motivo is None:
+                espera.motivo = "prazo"
+                self._fila.remove(espera)
+                heapq.heapify(self._fila)
+            raise self._descarta(espera.motivo)
+
+    def sair(self, duracao=None):
+        """Libera a vaga, passando-a direto para a primeira da fila."""
+        if not self.ativo:
+            return
+        with self._lock:
+            if duracao is not None:
+                self._duracao_media += (duracao - self._duracao_media) * 0.1
+            if self._fila:
+                proxima = heapq.heappop(self._fila)
+                proxima.admitida = True
+                proxima.evento.set()
+            else:
+                self._em_execucao -= 1
+
+    def estatisticas(self):
+        with self._lock:
+            fila = dict.fromkeys(PRIORIDADES, 0)
+            for espera in self._fila:
+                fila[PRIORIDADES[espera.prioridade]] += 1
+            return {
+                "limite": self.limite,
+                "em_execucao": self._em_execucao,
+                "fila": fila,
+                "fila_maxima": self.fila_maxima,
+                "admitidas": self.admitidas,
+                "enfileiradas": self.enfileiradas,
+                "descartadas": dict(self.descartadas),
+            }
+
+
+def cria_controle():
+    """Controle configurado pelo ambiente; DB_ADMISSAO_LIMITE=0 desliga."""
+    return ControleAdmissao(
+        limite=int(os.getenv("DB_ADMISSAO_LIMITE", os.getenv("DB_POOL_MAX", 10))),
+        fila_maxima=int(os.getenv("DB_ADMISSAO_FILA", 50)),
+        espera_maxima=float(os.getenv("DB_ADMISSAO_ESPERA", 1)),
+    )
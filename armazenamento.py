@@ -0,0 +1,213 @@
+"""Backends de armazenamento: MySQL (padrão) ou SQLite embutido.
+
+O backend é escolhido pela variável DB_BACKEND (mysql ou sqlite). Os dois
+entregam conexões com a mesma interface usada por views.py (cursor(),
+execute com %s, fetch*, rowcount, lastrowid, commit/rollback), então as
+consultas e o pool de servidor.py são os mesmos. As poucas diferenças de
+SQL (busca textual, UPDATE com JOIN, FOR UPDATE) ficam em views.py, que
+consulta usa_sqlite(conn).
+
+O SQLite roda no próprio processo, sem ida à rede: cada thread tem a sua
+conexão, em modo WAL (leitores não bloqueiam o escritor), e os comandos
+preparados são reaproveitados pelo cache de statements do sqlite3.
+"""
+import math
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+import mysql.connector
+from mysql.connector import Error
+
+ERROS_BANCO = (Error, sqlite3.Error)
+
+ESQUEMA_SQLITE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "esquema_sqlite.sql")
+
+PRAGMAS_SQLITE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",      # com WAL, só o checkpoint faz fsync
+    "busy_timeout": 5000,         # ms esperando o lock de escrita antes de SQLITE_BUSY
+    "cache_size": -64000,         # 64 MB de páginas em cache por conexão
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda momento: momento.isoformat(" "))
+sqlite3.register_converter("DATE", lambda valor: date.fromisoformat(valor.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda valor: datetime.fromisoformat(valor.decode()))
+
+
+def usa_sqlite(conn):
+    """True para conexões e cursores do backend SQLite."""
+    return getattr(conn, "dialeto", None) == "sqlite"
+
+
+def _ano(data):
+    """YEAR() do MySQL, para os triggers e consultas do resumo."""
+    if data is None:
+        return None
+    return int(str(data)[:4])
+
+def _faixa(valor):
+    """imoveis_faixa() da migração 005: faixas logarítmicas de 1%."""
+    if valor is None:
+        return None
+    valor = float(valor)
+    return math.floor(math.log(valor) / math.log(1.01)) if valor > 0 else -1
+
+
+@lru_cache(maxsize=512)
+def _traduz(sql):
+    """Troca os marcadores %s do mysql.connector pelos ? do sqlite3."""
+    return sql.replace("%s", "?")
+
+
+class CursorSQLite:
+    """Cursor do sqlite3 com a interface do mysql.connector usada por views.py."""
+
+    dialeto = "sqlite"
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._lastrowid = None
+
+    def execute(self, sql, params=()):
+        self._lastrowid = None
+        self._cursor.execute(_traduz(sql), params)
+
+    def executemany(self, sql, seq_params):
+        """Como no mysql.connector, lastrowid de um INSERT em lote é o id da primeira linha."""
+        self._cursor.executemany(_traduz(sql), seq_params)
+        self._lastrowid = None
+        if self._cursor.rowcount > 0 and sql.lstrip()[:6].upper() == "INSERT":
+            ultimo = self._cursor.connection.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self._lastrowid = ultimo - self._cursor.rowcount + 1
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, tamanho):
+        return self._cursor.fetchmany(tamanho)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._lastrowid if self._lastrowid is not None else self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexaoSQLite:
+    """Conexão entregue ao pool; cada chamada usa a conexão sqlite3 da thread atual.
+
+    Assim o pool continua limitando quantas requisições usam o banco ao mesmo
+    tempo, e nenhuma conexão sqlite3 é usada por duas threads.
+    """
+
+    dialeto = "sqlite"
+
+    def __init__(self, banco):
+        self.banco = banco
+
+    def cursor(self, buffered=None, **kwargs):
+        # os cursores do sqlite3 já leem as linhas sob demanda
+        return CursorSQLite(self.banco.conexao_da_thread().cursor())
+
+    def commit(self):
+        self.banco.conexao_da_thread().commit()
+
+    def rollback(self):
+        self.banco.conexao_da_thread().rollback()
+
+    @property
+    def in_transaction(self):
+        return self.banco.conexao_da_thread().in_transaction
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.banco.fechar_da_thread()
+
+
+class BancoSQLite:
+    """Banco SQLite em um arquivo, com uma conexão sqlite3 por thread."""
+
+    def __init__(self, caminho, pragmas=PRAGMAS_SQLITE, esquema=ESQUEMA_SQLITE):
+        self.caminho = caminho
+        self.pragmas = pragmas
+        self.esquema = esquema
+        self._locais = threading.local()
+        self._lock = threading.Lock()
+        self._esquema_aplicado = False
+
+    def _abrir(self):
+        conexao = sqlite3.connect(
+            self.caminho,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level="IMMEDIATE",  # o BEGIN implícito das escritas já pega o lock de escrita
+            cached_statements=256,
+        )
+        for nome, valor in self.pragmas.items():
+            conexao.execute(f"PRAGMA {nome} = {valor}")
+        conexao.create_function("YEAR", 1, _ano, deterministic=True)
+        conexao.create_function("imoveis_faixa", 1, _faixa, deterministic=True)
+        with self._lock:
+            if not self._esquema_aplicado:
+                with open(self.esquema, encoding="utf-8") as arquivo:
+                    conexao.executescript(arquivo.read())
+                self._esquema_aplicado = True
+        return conexao
+
+    def conexao_da_thread(self):
+        conexao = getattr(self._locais, "conexao", None)
+        if conexao is None:
+            conexao = self._locais.conexao = self._abrir()
+        return conexao
+
+    def fechar_da_thread(self):
+        conexao = getattr(self._locais, "conexao", None)
+        if conexao is not None:
+            self._locais.conexao = None
+            conexao.close()
+
+    def conectar(self):
+        self.conexao_da_thread()
+        return ConexaoSQLite(self)
+
+
+class BancoMySQL:
+    def __init__(self, config):
+        self.config = config
+
+    def conectar(self):
+        conn = mysql.connector.connect(**self.config)
+        if conn.is_connected():
+            return conn
+        return None
+
+
+def cria_banco(config):
+    """Cria o backend escolhido por DB_BACKEND; `config` são os parâmetros do MySQL."""
+    backend = os.getenv("DB_BACKEND", "mysql")
+    if backend == "sqlite":
+        return BancoSQLite(os.getenv("SQLITE_PATH", "imoveis.db"))
+    if backend != "mysql":
+        raise RuntimeError(f"DB_BACKEND={backend} inválido; use mysql ou sqlite")
+    return BancoMySQL(config)
@@ -0,0 +1,441 @@
+"""Benchmark de carga e latência das rotas de servidor.py.
+
+Semeia o banco com versões ampliadas do imoveis.sql (1 mil, 100 mil ou 1
+milhão de linhas), dispara clientes concorrentes contra cada rota por alguns
+segundos e registra vazão e latências p50/p95/p99. O resultado é salvo em
+JSON e pode ser comparado com um resultado anterior (a linha de base), para
+ver o efeito de mudanças no pool, no cache ou nos índices.
+
+Uso:
+    python benchmark.py rodar [--semear 100000] [--clientes 8] [--segundos 10]
+                              [--url http://localhost:5000] [--rotas item,pagina]
+                              [--saida resultado.json] [--baseline base.json]
+    python benchmark.py comparar resultado.json base.json [--tolerancia 0.1]
+
+Sem --url o servidor.py é iniciado neste processo (servidor WSGI com uma
+thread por requisição). Use um banco só para o benchmark (DB_NAME): as rotas
+de escrita criam, alteram e removem imóveis.
+"""
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+import carregar
+import utils
+from armazenamento import usa_sqlite
+
+ESCALAS = (1000, 100000, 1000000)
+TOLERANCIA = 0.10
+TAMANHO_LOTE_BENCHMARK = 100
+
+Rota = namedtuple("Rota", "nome gera depois padrao", defaults=(None, True))
+
+
+def linhas_sinteticas(base, total):
+    """Gera `total` linhas repetindo as de `base`, com logradouro e valor variando a cada volta."""
+    for posicao in range(total):
+        volta, indice = divmod(posicao, len(base))
+        linha = list(base[indice])
+        if volta:
+            linha[0] = f"{linha[0]} {volta}"
+            if linha[6] is not None:
+                linha[6] = f"{float(linha[6]) * (1 + (volta % 50) / 100):.2f}"
+        yield tuple(linha)
+
+
+def semear(conn, total, arquivo="imoveis.sql", relatorio=print):
+    """Carrega o banco até ter `total` imóveis, com carregar.carregar (retomável).
+
+    A carga se chama benchmark-<total>; a tabela precisa estar vazia ou ter
+    sido semeada por essa mesma carga. No SQLite a carga não é retomável e a
+    tabela precisa estar vazia.
+    """
+    carga = f"benchmark-{total}"
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM imoveis")
+    existentes = cursor.fetchone()[0]
+    retomando = False
+    if not usa_sqlite(conn):
+        cursor.execute("SELECT 1 FROM carga_progresso WHERE carga = %s", (carga,))
+        retomando = cursor.fetchone() is not None
+    cursor.close()
+    if existentes and not retomando:
+        raise ValueError(f"a tabela imoveis já tem {existentes} linhas; semeie a escala {total} em um banco vazio")
+    linhas = linhas_sinteticas(list(carregar.ler(arquivo)), total)
+    if usa_sqlite(conn):
+        return carregar.carregar_sqlite(conn, linhas, relatorio=relatorio)
+    return carregar.carregar(conn, linhas, carga, relatorio=relatorio)
+
+
+def percentil(ordenados, p):
+    """Percentil p (0-100) pelo método do posto mais próximo; `ordenados` em ordem crescente."""
+    if not ordenados:
+        return None
+    posto = max(1, -(-len(ordenados) * p // 100))
+    return ordenados[int(posto) - 1]
+
+
+def resume(latencias, erros, segundos):
+    """Resumo de uma rota: vazão em requisições/s e latências em milissegundos."""
+    ordenadas = sorted(latencias)
+
+    def ms(valor):
+        return None if valor is None else round(valor * 1000, 3)
+
+    return {
+        "requisicoes": len(ordenadas),
+        "erros": erros,
+        "rps": round(len(ordenadas) / segundos, 1) if segundos > 0 else 0.0,
+        "p50_ms": ms(percentil(ordenadas, 50)),
+        "p95_ms": ms(percentil(ordenadas, 95)),
+        "p99_ms": ms(percentil(ordenadas, 99)),
+        "max_ms": ms(ordenadas[-1] if ordenadas else None),
+    }
+
+
+class ClienteHTTP:
+    """Uma conexão HTTP/1.1 reaproveitada entre as requisições de um cliente."""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self.host, self.porta = partes.hostname, partes.port or 80
+        self.conexao = None
+
+    def __call__(self, metodo, caminho, corpo=None):
+        if self.conexao is None:
+            self.conexao = http.client.HTTPConnection(self.host, self.porta, timeout=30)
+        headers = {}
+        dados = None
+        if corpo is not None:
+            dados = json.dumps(corpo).encode()
+            headers["Content-Type"] = "application/json"
+        try:
+            self.conexao.request(metodo, caminho, body=dados, headers=headers)
+            resposta = self.conexao.getresponse()
+            conteudo = resposta.read()
+        except (OSError, http.client.HTTPException):
+            self.fechar()
+            raise
+        if resposta.will_close:
+            self.fechar()
+        return resposta.status, conteudo
+
+    def fechar(self):
+        if self.conexao is not None:
+            self.conexao.close()
+            self.conexao = None
+
+
+class Contexto:
+    """Dados compartilhados pelas rotas: uma amostra do banco e os ids criados no benchmark."""
+
+    def __init__(self, amostra, semente=0):
+        self.amostra = amostra
+        self.semente = semente
+        self._criados = []
+        self._lock = threading.Lock()
+        self._locais = threading.local()
+
+    @property
+    def aleatorio(self):
+        if not hasattr(self._locais, "aleatorio"):
+            self._locais.aleatorio = random.Random(f"{self.semente}-{threading.get_ident()}")
+        return self._locais.aleatorio
+
+    def escolhe(self, chave):
+        return self.aleatorio.choice(self.amostra[chave])
+
+    def guarda_criados(self, ids):
+        with self._lock:
+            self._criados.extend(ids)
+
+    def criado(self):
+        """Um id criado pelo benchmark, para PUT e PATCH (None se ainda não há)."""
+        with self._lock:
+            return self.aleatorio.choice(self._criados) if self._criados else None
+
+    def retira_criados(self, quantidade=1):
+        """Tira ids criados da lista, para os DELETE não repetirem ids."""
+        with self._lock:
+            retirados = self._criados[-quantidade:]
+            del self._criados[-quantidade:]
+        return retirados
+
+
+def amostra_do_servidor(cliente, limite=100):
+    """Lê uma página da listagem para sortear ids, tipos, cidades e palavras."""
+    status, corpo = cliente("GET", f"/imoveis?limite={limite}&links=none&campos=logradouro,cidade,tipo")
+    if status != 200:
+        raise RuntimeError(f"GET /imoveis respondeu {status}")
+    imoveis = json.loads(corpo)["imoveis"]
+    if not imoveis:
+        raise RuntimeError("o banco está vazio; use --semear")
+    return {
+        "ids": [imovel["id"] for imovel in imoveis],
+        "tipos": sorted({imovel["tipo"] for imovel in imoveis if imovel.get("tipo")}),
+        "cidades": sorted({imovel["cidade"] for imovel in imoveis if imovel.get("cidade")}),
+        "palavras": sorted({palavra for imovel in imoveis for palavra in (imovel.get("logradouro") or "").split() if len(palavra) > 3}),
+    }
+
+
+def _novo_imovel(contexto):
+    return {
+        "logradouro": f"Rua Benchmark {contexto.aleatorio.randrange(10**6)}",
+        "tipo_logradouro": "Rua",
+        "bairro": "Centro",
+        "cidade": contexto.escolhe("cidades"),
+        "cep": "01310-200",
+        "tipo": contexto.escolhe("tipos"),
+        "valor": round(contexto.aleatorio.uniform(50000, 2000000), 2),
+        "data_aquisicao": "2025-01-01",
+    }
+
+def _id_criado(contexto, status, corpo):
+    if status == 201:
+        contexto.guarda_criados([json.loads(corpo)["id"]])
+
+def _ids_lote(contexto, status, corpo):
+    if status == 201:
+        contexto.guarda_criados([imovel["id"] for imovel in json.loads(corpo)["imoveis"]])
+
+def _com_criado(gera):
+    def gera_com_id(contexto):
+        id = contexto.criado()
+        return None if id is None else gera(contexto, id)
+    return gera_com_id
+
+def _remove_lote(contexto):
+    ids = contexto.retira_criados(TAMANHO_LOTE_BENCHMARK)
+    return ("DELETE", "/imoveis/lote", {"ids": ids}) if ids else None
+
+def _remove_um(contexto):
+    ids = contexto.retira_criados()
+    return ("DELETE", f"/imoveis/{ids[0]}", None) if ids else None
+
+
+# na ordem em que rodam: as escritas vêm depois das leituras e os DELETE
+# removem os imóveis criados pelos POST
+ROTAS = [
+    Rota("pagina", lambda c: ("GET", "/imoveis?limite=50", None)),
+    Rota("pagina_cursor", lambda c: ("GET", f"/imoveis?limite=50&apos={utils.codifica_cursor(c.escolhe('ids'), 'p')}", None), padrao=False),
+    Rota("item", lambda c: ("GET", f"/imoveis/{c.escolhe('ids')}", None)),
+    Rota("tipo", lambda c: ("GET", f"/imoveis/tipo/{quote(c.escolhe('tipos'))}?limite=50", None)),
+    Rota("cidade", lambda c: ("GET", f"/imoveis/cidade/{quote(c.escolhe('cidades'))}?limite=50", None)),
+    Rota("busca", lambda c: ("GET", f"/imoveis/busca?tipo={quote(c.escolhe('tipos'))}&valor_max=500000&ordenar=valor", None)),
+    Rota("texto", lambda c: ("GET", f"/imoveis/texto?q={quote(c.escolhe('palavras'))}", None)),
+    Rota("estatisticas", lambda c: ("GET", "/imoveis/estatisticas?agrupar=cidade,tipo", None)),
+    Rota("listar_tudo", lambda c: ("GET", "/imoveis", None), padrao=False),
+    Rota("listar_stream", lambda c: ("GET", "/imoveis?stream=1", None), padrao=False),
+    Rota("criar", lambda c: ("POST", "/imoveis", _novo_imovel(c)), _id_criado),
+    Rota("criar_lote", lambda c: ("POST", "/imoveis/lote", {"imoveis": [_novo_imovel(c) for _ in range(TAMANHO_LOTE_BENCHMARK)]}), _ids_lote),
+    Rota("atualizar", _com_criado(lambda c, id: ("PUT", f"/imoveis/{id}", _novo_imovel(c)))),
+    Rota("atualizar_parcial", _com_criado(lambda c, id: ("PATCH", f"/imoveis/{id}", {"valor": round(c.aleatorio.uniform(50000, 2000000), 2)}))),
+    Rota("remover_lote", _remove_lote),
+    Rota("remover", _remove_um),
+]
+
+
+def mede_rota(rota, contexto, novo_cliente, clientes, segundos):
+    """Roda a rota com `clientes` threads por `segundos` (ou até `rota.gera` devolver None)."""
+    latencias = []
+    erros = [0]
+    lock = threading.Lock()
+    fim = time.perf_counter() + segundos
+
+    def trabalha():
+        cliente = novo_cliente()
+        minhas = []
+        falhas = 0
+        try:
+            while time.perf_counter() < fim:
+                pedido = rota.gera(contexto)
+                if pedido is None:
+                    break
+                inicio = time.perf_counter()
+                try:
+                    status, corpo = cliente(*pedido)
+                except (OSError, http.client.HTTPException):
+                    falhas += 1
+                    continue
+                minhas.append(time.perf_counter() - inicio)
+                if status >= 400:
+                    falhas += 1
+                elif rota.depois is not None:
+                    rota.depois(contexto, status, corpo)
+        finally:
+            if hasattr(cliente, "fechar"):
+                cliente.fechar()
+            with lock:
+                latencias.extend(minhas)
+                erros[0] += falhas
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalha) for _ in range(clientes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resume(latencias, erros[0], time.perf_counter() - inicio)
+
+
+def roda(rotas, contexto, novo_cliente, clientes=8, segundos=10.0, relatorio=print):
+    resultados = {}
+    for rota in rotas:
+        resultados[rota.nome] = resumo = mede_rota(rota, contexto, novo_cliente, clientes, segundos)
+        relatorio(f"{rota.nome:18} {resumo['rps']:>9.1f} req/s  p50 {resumo['p50_ms']} ms  "
+                  f"p95 {resumo['p95_ms']} ms  p99 {resumo['p99_ms']} ms  erros {resumo['erros']}")
+    return resultados
+
+
+def comparar(atual, base, tolerancia=TOLERANCIA):
+    """Compara dois resultados rota a rota.
+
+    Retorna [(rota, medida, base, atual, variação)] e a lista das rotas que
+    pioraram além da tolerância (p95 maior ou vazão menor).
+    """
+    linhas = []
+    regressoes = []
+    for nome, medidas in atual["rotas"].items():
+        anterior = base["rotas"].get(nome)
+        if anterior is None:
+            continue
+        piorou = False
+        for medida, maior_e_pior in (("rps", False), ("p50_ms", True), ("p95_ms", True), ("p99_ms", True)):
+            antes, agora = anterior.get(medida), medidas.get(medida)
+            if not antes or agora is None:
+                continue
+            variacao = (agora - antes) / antes
+            linhas.append((nome, medida, antes, agora, variacao))
+            if medida in ("rps", "p95_ms") and (variacao if maior_e_pior else -variacao) > tolerancia:
+                piorou = True
+        if piorou:
+            regressoes.append(nome)
+    return linhas, regressoes
+
+
+def imprime_comparacao(linhas, regressoes, relatorio=print):
+    for nome, medida, antes, agora, variacao in linhas:
+        relatorio(f"{nome:18} {medida:7} {antes:>10} -> {agora:>10} ({variacao:+.1%})")
+    relatorio(f"Regressões: {', '.join(regressoes)}" if regressoes else "Nenhuma regressão")
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def servidor_local():
+    """Sobe o app Flask de servidor.py em uma porta livre, em outra thread."""
+    from werkzeug.serving import make_server
+    import servidor
+
+    servidor_wsgi = make_server("127.0.0.1", 0, servidor.app, threaded=True)
+    thread = threading.Thread(target=servidor_wsgi.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{servidor_wsgi.server_port}"
+    finally:
+        servidor_wsgi.shutdown()
+
+
+def escolhe_rotas(nomes):
+    if not nomes:
+        return [rota for rota in ROTAS if rota.padrao]
+    por_nome = {rota.nome: rota for rota in ROTAS}
+    desconhecidas = [nome for nome in nomes if nome not in por_nome]
+    if desconhecidas:
+        raise ValueError(f"rotas desconhecidas: {', '.join(desconhecidas)}; use: {', '.join(por_nome)}")
+    return [rota for rota in ROTAS if rota.nome in nomes]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das rotas da API de imóveis")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    cmd_rodar = sub.add_parser("rodar", help="mede as rotas e salva o resultado em JSON")
+    cmd_rodar.add_argument("--url", help="servidor já em execução (padrão: sobe o servidor.py neste processo)")
+    cmd_rodar.add_argument("--semear", type=int, choices=ESCALAS, help="carrega o banco com esse número de imóveis antes")
+    cmd_rodar.add_argument("--clientes", type=int, default=8, help="clientes concorrentes")
+    cmd_rodar.add_argument("--segundos", type=float, default=10.0, help="duração de cada rota")
+    cmd_rodar.add_argument("--rotas", help="rotas separadas por vírgula (padrão: " + ",".join(r.nome for r in ROTAS if r.padrao) + ")")
+    cmd_rodar.add_argument("--saida", default="benchmark.json", help="arquivo do resultado")
+    cmd_rodar.add_argument("--baseline", help="resultado anterior para comparar")
+    cmd_rodar.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    cmd_comparar = sub.add_parser("comparar", help="compara dois resultados já salvos")
+    cmd_comparar.add_argument("resultado")
+    cmd_comparar.add_argument("baseline")
+    cmd_comparar.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = parser.parse_args(argv)
+
+    if args.comando == "comparar":
+        with open(args.resultado, encoding="utf-8") as arquivo:
+            atual = json.load(arquivo)
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        linhas, regressoes = comparar(atual, base, args.tolerancia)
+        imprime_comparacao(linhas, regressoes)
+        return 1 if regressoes else 0
+
+    try:
+        rotas = escolhe_rotas(args.rotas.split(",") if args.rotas else None)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.semear:
+        from servidor import connect_db
+        conn = connect_db()
+        if not conn:
+            print("Falha na conexão com o banco de dados")
+            return 1
+        try:
+            semear(conn, args.semear)
+        finally:
+            conn.close()
+
+    with (servidor_local() if args.url is None else nullcontext(args.url.rstrip("/"))) as url:
+        cliente = ClienteHTTP(url)
+        try:
+            contexto = Contexto(amostra_do_servidor(cliente))
+        except RuntimeError as e:
+            print(f"Não foi possível ler a amostra: {e}")
+            return 1
+        finally:
+            cliente.fechar()
+        print(f"Medindo {len(rotas)} rotas em {url} com {args.clientes} clientes, {args.segundos:g}s cada")
+        resultados = roda(rotas, contexto, lambda: ClienteHTTP(url), args.clientes, args.segundos)
+
+    resultado = {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "url": args.url,
+        "escala": args.semear,
+        "clientes": args.clientes,
+        "segundos": args.segundos,
+        "rotas": resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    print(f"Resultado salvo em {args.saida}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        linhas, regressoes = comparar(resultado, base, args.tolerancia)
+        imprime_comparacao(linhas, regressoes)
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import asyncio
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class CacheMemoria:
+    """Cache LRU em memória do processo, com TTL e limite de entradas e de bytes.
+
+    Os valores são guardados serializados, então quem recebe um valor do
+    cache pode alterá-lo sem afetar as próximas leituras.
+    """
+
+    faz_io = False
+
+    def __init__(self, max_entradas=1000, max_bytes=16 * 1024 * 1024, ttl=60.0):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (bytes, expira_em, tags)
+        self._por_tag = {}
+        self._bytes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.despejos = 0
+
+    def _remover(self, chave):
+        dados, _, tags = self._entradas.pop(chave)
+        self._bytes -= len(dados)
+        for tag in tags:
+            chaves = self._por_tag.get(tag)
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._por_tag[tag]
+
+    def obter(self, chave):
+        """Retorna (True, valor) se a chave estiver no cache, senão (False, None)."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[1] < time.monotonic():
+                self._remover(chave)
+                entrada = None
+            if entrada is None:
+                self.faltas += 1
+                return False, None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            dados = entrada[0]
+        return True, pickle.loads(dados)
+
+    def guardar(self, chave, valor, tags=()):
+        dados = pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+        if len(dados) > self.max_bytes:
+            return
+        tags = frozenset(tags)
+        with self._lock:
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = (dados, time.monotonic() + self.ttl, tags)
+            self._bytes += len(dados)
+            for tag in tags:
+                self._por_tag.setdefault(tag, set()).add(chave)
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                self._remover(next(iter(self._entradas)))
+                self.despejos += 1
+
+    def invalidar(self, tags):
+        """Remove todas as entradas marcadas com alguma das tags."""
+        with self._lock:
+            for tag in tags:
+                for chave in list(self._por_tag.get(tag, ())):
+                    self._remover(chave)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._por_tag.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "backend": "memoria",
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "despejos": self.despejos,
+            }
+
+
+class CacheRedis:
+    """Cache compartilhado entre processos, guardado no Redis.
+
+    Cada tag é um conjunto no Redis com as chaves marcadas por ela. Os
+    despejos são feitos pelo próprio Redis (maxmemory-policy), então aqui
+    só contamos os que este processo observa pelo TTL.
+    """
+
+    faz_io = True  # cada operação é uma ida ao Redis
+
+    def __init__(self, cliente, ttl=60.0, prefixo="imoveis:"):
+        self.cliente = cliente
+        self.ttl = ttl
+        self.prefixo = prefixo
+        self.acertos = 0
+        self.faltas = 0
+        self.despejos = 0
+
+    def obter(self, chave):
+        dados = self.cliente.get(self.prefixo + chave)
+        if dados is None:
+            self.faltas += 1
+            return False, None
+        self.acertos += 1
+        return True, pickle.loads(dados)
+
+    def guardar(self, chave, valor, tags=()):
+        ttl = max(1, int(self.ttl))
+        pipe = self.cliente.pipeline()
+        pipe.set(self.prefixo + chave, pickle.dumps(valor, pickle.HIGHEST_PROTOCOL), ex=ttl)
+        for tag in tags:
+            pipe.sadd(self.prefixo + "tag:" + tag, self.prefixo + chave)
+            pipe.expire(self.prefixo + "tag:" + tag, ttl)
+        pipe.execute()
+
+    def invalidar(self, tags):
+        for tag in tags:
+            chave_tag = self.prefixo + "tag:" + tag
+            chaves = self.cliente.smembers(chave_tag)
+            self.cliente.delete(chave_tag, *chaves)
+
+    def limpar(self):
+        chaves = list(self.cliente.scan_iter(self.prefixo + "*"))
+        if chaves:
+            self.cliente.delete(*chaves)
+
+    def estatisticas(self):
+        return {
+            "backend": "redis",
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "despejos": self.despejos,
+        }
+
+
+class SemCache:
+    """Backend nulo, usado com CACHE_BACKEND=nenhum."""
+
+    faz_io = False
+
+    def obter(self, chave):
+        return False, None
+
+    def guardar(self, chave, valor, tags=()):
+        pass
+
+    def invalidar(self, tags):
+        pass
+
+    def limpar(self):
+        pass
+
+    def estatisticas(self):
+        return {"backend": "nenhum"}
+
+
+def cria_cache():
+    """Cria o backend escolhido pelas variáveis de ambiente CACHE_*."""
+    backend = os.getenv("CACHE_BACKEND", "memoria")
+    ttl = float(os.getenv("CACHE_TTL", 60))
+    if backend == "nenhum":
+        return SemCache()
+    if backend == "redis":
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requer o pacote redis")
+        cliente = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return CacheRedis(cliente, ttl=ttl)
+    return CacheMemoria(
+        max_entradas=int(os.getenv("CACHE_MAX_ENTRADAS", 1000)),
+        max_bytes=int(os.getenv("CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+        ttl=ttl,
+    )
+
+
+cache_imoveis = cria_cache()
+
+
+def tag_id(id):
+    return f"id:{id}"
+
+def tag_tipo(tipo):
+    return f"tipo:{tipo}"
+
+def tag_cidade(cidade):
+    return f"cidade:{cidade}"
+
+
+def em_cache(nome, tags):
+    """Decorador de leitura através do cache para funções f(conn, *args) de views.py.
+
+    `tags(resultado, *args)` devolve as tags da entrada; quem escreve no banco
+    invalida essas tags para descartar exatamente as entradas afetadas.
+
+    O que foi lido numa réplica (conexão marcada com `de_replica`) não é
+    guardado: a réplica pode estar atrasada em relação a uma escrita que já
+    invalidou a entrada, e o valor velho seria servido a todos.
+    """
+    def decorador(f):
+        @wraps(f)
+        def wrapper(conn, *args):
+            chave = nome + ":" + repr(args)
+            achou, valor = cache_imoveis.obter(chave)
+            if achou:
+                return valor
+            valor = f(conn, *args)
+            if getattr(conn, "de_replica", False) is not True:
+                cache_imoveis.guardar(chave, valor, tags(valor, *args))
+            return valor
+        return wrapper
+    return decorador
+
+
+def em_cache_async(nome, tags):
+    """Como em_cache, para as corrotinas de repositorio_async.py.
+
+    Usa as mesmas chaves de em_cache, então os dois servidores compartilham
+    as entradas quando o backend é o Redis.
+    """
+    def decorador(f):
+        @wraps(f)
+        async def wrapper(conn, *args):
+            chave = nome + ":" + repr(args)
+            achou, valor = await _sem_bloquear(cache_imoveis.obter, chave)
+            if achou:
+                return valor
+            valor = await f(conn, *args)
+            await _sem_bloquear(cache_imoveis.guardar, chave, valor, tags(valor, *args))
+            return valor
+        return wrapper
+    return decorador
+
+
+async def _sem_bloquear(operacao, *args):
+    """Roda uma operação do cache sem travar o event loop.
+
+    O cliente do Redis é síncrono, então com ele a operação vai para uma
+    thread; o cache em memória só pega um lock e roda direto.
+    """
+    if cache_imoveis.faz_io:
+        return await asyncio.to_thread(operacao, *args)
+    return operacao(*args)
+
+
+def invalidar(*tags):
+    cache_imoveis.invalidar(tags)
+
+async def invalidar_async(*tags):
+    await _sem_bloquear(cache_imoveis.invalidar, tags)
@@ -0,0 +1,311 @@
+"""Carga em massa de imóveis a partir de CSV, NDJSON ou do imoveis.sql.
+
+As linhas são inseridas em blocos grandes (INSERT de várias linhas ou LOAD
+DATA LOCAL INFILE), com os índices secundários removidos durante a carga e
+recriados no fim. O progresso de cada carga fica em carga_progresso, na
+mesma transação de cada bloco, então uma carga interrompida é retomada de
+onde parou ao rodar o mesmo comando de novo.
+
+Durante a carga a sessão define @carga_em_massa, e os triggers de INSERT
+(migração 008) não fazem o trabalho por linha: a versão é incrementada uma
+vez por bloco e o resumo de estatísticas é reconstruído uma vez no fim.
+
+Uso:
+    python carregar.py dados.csv [--lote 5000] [--metodo insert|load-data]
+    python carregar.py imoveis.sql --converter imoveis.csv
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+import views
+
+TAMANHO_LOTE = 5000
+
+RE_INSERT = re.compile(r"INSERT\s+INTO\s+imoveis\s*\(([^)]*)\)\s*VALUES\s*\((.*)\)\s*;?\s*$", re.IGNORECASE)
+
+
+def _ordena(registro, colunas):
+    faltando = [c for c in views.CAMPOS_IMOVEL if c not in colunas]
+    if faltando:
+        raise ValueError(f"colunas faltando: {', '.join(faltando)}")
+    return tuple(registro[c] for c in views.CAMPOS_IMOVEL)
+
+
+def ler_csv(caminho):
+    with open(caminho, newline="", encoding="utf-8") as arquivo:
+        leitor = csv.DictReader(arquivo)
+        for registro in leitor:
+            yield _ordena(registro, leitor.fieldnames)
+
+
+def ler_ndjson(caminho):
+    with open(caminho, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            if linha.strip():
+                registro = json.loads(linha)
+                yield _ordena(registro, registro)
+
+
+def ler_sql(caminho):
+    """Lê os INSERTs de uma linha do imoveis.sql."""
+    with open(caminho, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            encontrado = RE_INSERT.match(linha.strip())
+            if not encontrado:
+                continue
+            colunas = [c.strip() for c in encontrado.group(1).split(",")]
+            valores = next(csv.reader([encontrado.group(2)], quotechar="'", skipinitialspace=True))
+            valores = [None if v == "NULL" else v for v in valores]
+            yield _ordena(dict(zip(colunas, valores)), colunas)
+
+
+LEITORES = {".csv": ler_csv, ".ndjson": ler_ndjson, ".jsonl": ler_ndjson, ".sql": ler_sql}
+
+
+def ler(caminho):
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao not in LEITORES:
+        raise ValueError(f"formato não suportado: {extensao}")
+    return LEITORES[extensao](caminho)
+
+
+def converter(linhas, destino):
+    """Grava as linhas em CSV ou NDJSON, conforme a extensão do destino."""
+    total = 0
+    with open(destino, "w", newline="", encoding="utf-8") as arquivo:
+        if destino.lower().endswith(".csv"):
+            escritor = csv.writer(arquivo)
+            escritor.writerow(views.CAMPOS_IMOVEL)
+            for linha in linhas:
+                escritor.writerow(linha)
+                total += 1
+        else:
+            for linha in linhas:
+                arquivo.write(json.dumps(dict(zip(views.CAMPOS_IMOVEL, linha)), ensure_ascii=False) + "\n")
+                total += 1
+    return total
+
+
+def indices_secundarios(conn):
+    """Retorna [(nome, colunas, tipo)] dos índices secundários não únicos de imoveis."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT index_name, GROUP_CONCAT(column_name ORDER BY seq_in_index SEPARATOR ', '), MAX(index_type)
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = 'imoveis'
+          AND index_name <> 'PRIMARY' AND non_unique = 1
+        GROUP BY index_name
+        ORDER BY index_name
+        """
+    )
+    indices = [tuple(row) for row in cursor.fetchall()]
+    cursor.close()
+    return indices
+
+
+def remover_indices(conn, indices):
+    if indices:
+        cursor = conn.cursor()
+        cursor.execute("ALTER TABLE imoveis " + ", ".join(f"DROP INDEX {nome}" for nome, _, _ in indices))
+        cursor.close()
+
+
+def recriar_indices(conn, indices):
+    """Recria os índices comuns em um único ALTER TABLE (uma passada na tabela).
+
+    O InnoDB só cria um índice FULLTEXT por comando, então esses vêm depois.
+    Os que já existem ficam de fora: uma carga interrompida depois deste
+    passo é retomada sem erro de nome de índice duplicado.
+    """
+    existentes = {nome for nome, _, _ in indices_secundarios(conn)}
+    indices = [indice for indice in indices if indice[0] not in existentes]
+    comuns = [f"ADD INDEX {nome} ({colunas})" for nome, colunas, tipo in indices if tipo != "FULLTEXT"]
+    cursor = conn.cursor()
+    if comuns:
+        cursor.execute("ALTER TABLE imoveis " + ", ".join(comuns))
+    for nome, colunas, tipo in indices:
+        if tipo == "FULLTEXT":
+            cursor.execute(f"ALTER TABLE imoveis ADD FULLTEXT INDEX {nome} ({colunas})")
+    cursor.close()
+
+
+def _progresso(conn, carga):
+    cursor = conn.cursor()
+    cursor.execute("SELECT linhas, indices, concluida FROM carga_progresso WHERE carga = %s", (carga,))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute("INSERT INTO carga_progresso (carga) VALUES (%s)", (carga,))
+        conn.commit()
+        row = (0, None, False)
+    cursor.close()
+    return row
+
+
+def _valor_tsv(valor):
+    if valor is None:
+        return "\\N"
+    texto = str(valor)
+    return texto.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _insere_insert(cursor, bloco):
+    cursor.executemany(views.SQL_INSERE_IMOVEL, bloco)
+
+
+def _insere_load_data(cursor, bloco):
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False, encoding="utf-8") as arquivo:
+        for linha in bloco:
+            arquivo.write("\t".join(_valor_tsv(v) for v in linha) + "\n")
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE '{arquivo.name}' INTO TABLE imoveis "
+            f"CHARACTER SET utf8mb4 ({', '.join(views.CAMPOS_IMOVEL)})"
+        )
+    finally:
+        os.unlink(arquivo.name)
+
+
+METODOS = {"insert": _insere_insert, "load-data": _insere_load_data}
+
+
+def carregar(conn, linhas, carga, tamanho_lote=TAMANHO_LOTE, metodo="insert", manter_indices=False, relatorio=print):
+    """Insere as linhas em blocos, retomando a partir do progresso salvo da carga.
+
+    Retorna (linhas inseridas nesta execução, segundos).
+    """
+    insere = METODOS[metodo]
+    ja_carregadas, indices_salvos, concluida = _progresso(conn, carga)
+    if concluida:
+        relatorio(f"A carga {carga} já foi concluída")
+        return 0, 0.0
+
+    cursor = conn.cursor()
+    cursor.execute("SET SESSION unique_checks = 0")
+    cursor.execute("SET @carga_em_massa = 1")
+    if indices_salvos is not None:
+        indices = [tuple(i) for i in json.loads(indices_salvos)]
+    elif manter_indices:
+        indices = []
+    else:
+        indices = indices_secundarios(conn)
+        # guarda as definições antes de remover, para recriá-las mesmo se a carga for interrompida
+        cursor.execute("UPDATE carga_progresso SET indices = %s WHERE carga = %s", (json.dumps(indices), carga))
+        conn.commit()
+        remover_indices(conn, indices)
+
+    inicio = time.monotonic()
+    inseridas = 0
+    bloco = []
+
+    def grava(bloco):
+        cursor.execute(views.SQL_NOVA_VERSAO)  # uma versão para o bloco todo
+        insere(cursor, bloco)
+        cursor.execute("UPDATE carga_progresso SET linhas = linhas + %s WHERE carga = %s", (len(bloco), carga))
+        conn.commit()
+
+    for posicao, linha in enumerate(linhas):
+        if posicao < ja_carregadas:
+            continue
+        bloco.append(linha)
+        if len(bloco) >= tamanho_lote:
+            grava(bloco)
+            inseridas += len(bloco)
+            bloco = []
+            decorrido = time.monotonic() - inicio
+            relatorio(f"{ja_carregadas + inseridas} linhas ({inseridas / max(decorrido, 1e-9):,.0f} linhas/s)")
+    if bloco:
+        grava(bloco)
+        inseridas += len(bloco)
+
+    relatorio("Recriando índices...")
+    recriar_indices(conn, indices)
+    cursor.execute("SET @carga_em_massa = NULL")
+    relatorio("Reconstruindo o resumo de estatísticas...")
+    # o resumo refeito ganha a última versão da carga: uma leitura de
+    # /imoveis/estatisticas feita entre os blocos e o fim fica com ETag antigo
+    views.reconstroi_resumo(conn)
+    cursor.execute("UPDATE carga_progresso SET concluida = TRUE WHERE carga = %s", (carga,))
+    cursor.execute("SET SESSION unique_checks = 1")
+    conn.commit()
+    cursor.close()
+
+    segundos = time.monotonic() - inicio
+    relatorio(f"{inseridas} linhas em {segundos:.1f}s ({inseridas / max(segundos, 1e-9):,.0f} linhas/s)")
+    return inseridas, segundos
+
+
+def carregar_sqlite(conn, linhas, tamanho_lote=TAMANHO_LOTE, relatorio=print):
+    """Carga no backend SQLite (DB_BACKEND=sqlite): um executemany por bloco.
+
+    Cada bloco tem sua transação; os triggers do esquema_sqlite.sql mantêm
+    versão, resumo e índice de texto. Não há retomada nem remoção de índices.
+    Retorna (linhas inseridas, segundos).
+    """
+    inicio = time.monotonic()
+    inseridas = 0
+    cursor = conn.cursor()
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= tamanho_lote:
+            cursor.executemany(views.SQL_INSERE_IMOVEL, bloco)
+            conn.commit()
+            inseridas += len(bloco)
+            bloco = []
+            decorrido = time.monotonic() - inicio
+            relatorio(f"{inseridas} linhas ({inseridas / max(decorrido, 1e-9):,.0f} linhas/s)")
+    if bloco:
+        cursor.executemany(views.SQL_INSERE_IMOVEL, bloco)
+        conn.commit()
+        inseridas += len(bloco)
+    cursor.close()
+
+    segundos = time.monotonic() - inicio
+    relatorio(f"{inseridas} linhas em {segundos:.1f}s ({inseridas / max(segundos, 1e-9):,.0f} linhas/s)")
+    return inseridas, segundos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga em massa da tabela imoveis")
+    parser.add_argument("arquivo", help="arquivo .csv, .ndjson/.jsonl ou .sql")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="linhas por bloco")
+    parser.add_argument("--metodo", choices=sorted(METODOS), default="insert")
+    parser.add_argument("--carga", help="nome da carga para retomada (padrão: nome do arquivo)")
+    parser.add_argument("--manter-indices", action="store_true", help="não remove os índices durante a carga")
+    parser.add_argument("--converter", metavar="DESTINO", help="só converte o arquivo para .csv ou .ndjson")
+    args = parser.parse_args(argv)
+
+    if args.converter:
+        total = converter(ler(args.arquivo), args.converter)
+        print(f"{total} linhas gravadas em {args.converter}")
+        return 0
+
+    if os.getenv("DB_BACKEND") == "sqlite":
+        from servidor import connect_db
+        conn = connect_db()
+        try:
+            carregar_sqlite(conn, ler(args.arquivo), args.lote)
+        finally:
+            conn.close()
+        return 0
+
+    import mysql.connector
+    from servidor import config
+    conn = mysql.connector.connect(**config, allow_local_infile=args.metodo == "load-data")
+    try:
+        carregar(conn, ler(args.arquivo), args.carga or os.path.basename(args.arquivo),
+                 args.lote, args.metodo, args.manter_indices)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
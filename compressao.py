@@ -0,0 +1,161 @@
+"""Compressão das respostas negociada pelo Accept-Encoding (zstd, br ou gzip).
+
+gzip vem da biblioteca padrão; brotli e zstd só entram se os pacotes
+brotli e zstandard estiverem instalados. Corpos menores que
+COMPRESSAO_MIN_BYTES vão sem compressão; respostas em streaming são
+comprimidas lote a lote, com um flush por lote para o cliente continuar
+recebendo os dados aos poucos.
+"""
+import os
+import zlib
+
+import cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5   # acima disso o tempo de CPU cresce muito mais que a taxa
+NIVEL_ZSTD = 3
+
+TIPOS_COMPRESSIVEIS = {"application/json", "application/x-ndjson", "text/plain", "text/csv"}
+
+MINIMO_BYTES = int(os.getenv("COMPRESSAO_MIN_BYTES", 1024))
+
+
+def codificacoes_disponiveis():
+    """Codificações suportadas, da preferida para a menos preferida."""
+    disponiveis = []
+    if zstandard is not None:
+        disponiveis.append("zstd")
+    if brotli is not None:
+        disponiveis.append("br")
+    disponiveis.append("gzip")
+    return disponiveis
+
+CODIFICACOES = codificacoes_disponiveis()
+
+
+def escolhe(accept_encodings):
+    """A codificação a usar para o Accept-Encoding já lido pelo werkzeug, ou None.
+
+    Entre as que o cliente aceita com a mesma qualidade, vale a ordem de
+    CODIFICACOES.
+    """
+    return accept_encodings.best_match(CODIFICACOES)
+
+
+def comprime(dados, codificacao):
+    if codificacao == "gzip":
+        compressor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)  # wbits 31: cabeçalho gzip
+        return compressor.compress(dados) + compressor.flush()
+    if codificacao == "br":
+        return brotli.compress(dados, quality=QUALIDADE_BROTLI)
+    if codificacao == "zstd":
+        return zstandard.ZstdCompressor(level=NIVEL_ZSTD).compress(dados)
+    raise ValueError(f"codificação {codificacao} não suportada")
+
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+
+    def parte(self, dados):
+        return self._compressor.compress(dados) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def fim(self):
+        return self._compressor.flush()
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=QUALIDADE_BROTLI)
+
+    def parte(self, dados):
+        return self._compressor.process(dados) + self._compressor.flush()
+
+    def fim(self):
+        return self._compressor.finish()
+
+class _Zstd:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=NIVEL_ZSTD).compressobj()
+
+    def parte(self, dados):
+        return self._compressor.compress(dados) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def fim(self):
+        return self._compressor.flush()
+
+COMPRESSORES = {"gzip": _Gzip, "br": _Brotli, "zstd": _Zstd}
+
+
+def comprime_fluxo(partes, codificacao):
+    """Comprime um iterável de str/bytes sem juntar o corpo inteiro na memória."""
+    compressor = COMPRESSORES[codificacao]()
+    try:
+        for parte in partes:
+            if isinstance(parte, str):
+                parte = parte.encode("utf-8")
+            if parte:
+                yield compressor.parte(parte)
+        yield compressor.fim()
+    finally:
+        if hasattr(partes, "close"):
+            partes.close()
+
+
+def compressivel(resposta):
+    return (
+        resposta.status_code == 200
+        and resposta.mimetype in TIPOS_COMPRESSIVEIS
+        and "Content-Encoding" not in resposta.headers
+        and "no-transform" not in resposta.headers.get("Cache-Control", "")
+    )
+
+
+def marca(resposta, codificacao):
+    """Cabeçalhos de um corpo já comprimido.
+
+    O ETag vira fraco: os bytes mudam com a codificação, mas o conteúdo é o
+    mesmo, e o If-None-Match continua batendo com a versão da coleção.
+    """
+    resposta.headers["Content-Encoding"] = codificacao
+    etag, fraco = resposta.get_etag()
+    if etag and not fraco:
+        resposta.set_etag(etag, weak=True)
+    return resposta
+
+
+def aplica(resposta, codificacao):
+    """Comprime a resposta (em memória ou em streaming) se valer a pena."""
+    if not compressivel(resposta):
+        return resposta
+    resposta.vary.add("Accept-Encoding")
+    if codificacao is None:
+        return resposta
+    if resposta.is_streamed:
+        resposta.response = comprime_fluxo(resposta.response, codificacao)
+        resposta.headers.pop("Content-Length", None)
+        return marca(resposta, codificacao)
+    corpo = resposta.get_data()
+    if len(corpo) < MINIMO_BYTES:
+        return resposta
+    resposta.set_data(comprime(corpo, codificacao))
+    return marca(resposta, codificacao)
+
+
+# Corpos prontos (já comprimidos) das listagens, pela URL, ETag e codificação.
+# O ETag traz a versão da coleção, então uma escrita nunca é servida velha:
+# as entradas de versões antigas só deixam de ser pedidas e saem pelo LRU.
+corpos_colecao = cache.CacheMemoria(
+    max_entradas=int(os.getenv("COMPRESSAO_CACHE_ENTRADAS", 256)),
+    max_bytes=int(os.getenv("COMPRESSAO_CACHE_BYTES", 64 * 1024 * 1024)),
+    ttl=float(os.getenv("COMPRESSAO_CACHE_TTL", 3600)),
+)
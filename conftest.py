@@ -0,0 +1,39 @@
+import pytest
+
+import armazenamento
+import cache
+import pool as pool_conexoes
+import servidor
+
+
+@pytest.fixture
+def novo():
+    """Corpo válido de POST /imoveis; cada teste recebe a sua cópia."""
+    return {"logradouro": "Rua das Flores", "tipo_logradouro": "Rua", "bairro": "Jardim", "cidade": "Campinas",
+            "cep": "13000-000", "tipo": "casa", "valor": 250000.0, "data_aquisicao": "2022-01-15"}
+
+@pytest.fixture
+def cria_banco(tmp_path):
+    """Abre bancos SQLite em arquivos do tmp_path (vários, para os testes de réplicas)."""
+    bancos = []
+
+    def cria(nome="imoveis.db"):
+        banco = armazenamento.BancoSQLite(str(tmp_path / nome))
+        bancos.append(banco)
+        return banco
+    yield cria
+    for banco in bancos:
+        banco.fechar_da_thread()
+
+@pytest.fixture
+def banco(cria_banco):
+    return cria_banco()
+
+@pytest.fixture
+def cliente_sqlite(banco, monkeypatch):
+    """Cliente do app Flask com o servidor usando `banco` no lugar do MySQL."""
+    monkeypatch.setattr(servidor, "banco", banco)
+    monkeypatch.setattr(servidor, "pool", pool_conexoes.PoolConexoes(lambda: servidor.connect_db()))
+    cache.cache_imoveis.limpar()
+    yield servidor.app.test_client()
+    cache.cache_imoveis.limpar()
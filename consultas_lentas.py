@@ -0,0 +1,244 @@
+"""Log de consultas lentas e tempo acumulado por forma de consulta.
+
+views.py abre os cursores com cursor(conn): cada comando (execute mais os
+fetch* que leem o resultado) é cronometrado e somado à sua forma, o SQL
+normalizado, sem valores e com listas IN/VALUES colapsadas. Comandos acima
+de DB_CONSULTA_LENTA_MS vão para o log com os parâmetros (ou "<ocultos>"
+com DB_CONSULTA_LENTA_PARAMETROS=ocultar), as linhas e quem chamou, e o
+plano (EXPLAIN) da forma é capturado uma única vez. GET /admin/consultas
+lista as formas mais caras.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from armazenamento import ERROS_BANCO, usa_sqlite
+
+log = logging.getLogger("imoveis.consultas_lentas")
+
+AMOSTRAS_POR_FORMA = 1000  # últimas durações guardadas para o p99
+
+_RE_TEXTO = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_MARCADOR = re.compile(r"%s|\?")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_RE_TUPLAS = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+_RE_ESPACOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normaliza(sql):
+    """Forma da consulta: valores viram ?, listas viram (?...) e VALUES de várias linhas uma só."""
+    sql = _RE_TEXTO.sub("?", sql)
+    sql = _RE_NUMERO.sub("?", sql)
+    sql = _RE_MARCADOR.sub("?", sql)
+    sql = _RE_LISTA.sub("(?...)", sql)
+    sql = _RE_TUPLAS.sub("(?...), ...", sql)
+    return _RE_ESPACOS.sub(" ", sql).strip()
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+def _chamador():
+    """Primeiro quadro da pilha fora deste módulo (a função de views.py)."""
+    quadro = sys._getframe(1)
+    while quadro is not None and quadro.f_globals.get("__name__") == __name__:
+        quadro = quadro.f_back
+    if quadro is None:
+        return None
+    codigo = quadro.f_code
+    return f"{os.path.basename(codigo.co_filename)}:{quadro.f_lineno} em {codigo.co_name}"
+
+
+class Forma:
+    __slots__ = ("sql", "execucoes", "lentas", "total", "maximo", "linhas", "duracoes", "plano")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.execucoes = 0
+        self.lentas = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.linhas = 0
+        self.duracoes = deque(maxlen=AMOSTRAS_POR_FORMA)
+        self.plano = None
+
+    def como_dict(self):
+        return {
+            "sql": self.sql,
+            "execucoes": self.execucoes,
+            "lentas": self.lentas,
+            "linhas": self.linhas,
+            "total_ms": round(self.total * 1000, 3),
+            "media_ms": round(self.total * 1000 / self.execucoes, 3),
+            "p99_ms": round(_percentil(self.duracoes, 0.99) * 1000, 3),
+            "maximo_ms": round(self.maximo * 1000, 3),
+            "plano": self.plano,
+        }
+
+
+class RegistroConsultas:
+    def __init__(self, limite=0.2, ocultar_parametros=False):
+        self.limite = limite
+        self.ocultar_parametros = ocultar_parametros
+        self._formas = {}
+        self._lock = threading.Lock()
+
+    def registra(self, sql, params, duracao, linhas, conn, explicavel=True):
+        """Soma o comando à sua forma; se passou do limite, loga e captura o plano.
+
+        explicavel=False nos executemany, que não têm um único conjunto de
+        parâmetros para o EXPLAIN.
+        """
+        forma_sql = normaliza(sql)
+        lenta = duracao >= self.limite
+        capturar_plano = False
+        with self._lock:
+            forma = self._formas.get(forma_sql)
+            if forma is None:
+                forma = self._formas[forma_sql] = Forma(forma_sql)
+            forma.execucoes += 1
+            forma.total += duracao
+            forma.maximo = max(forma.maximo, duracao)
+            forma.linhas += linhas
+            forma.duracoes.append(duracao)
+            if lenta:
+                forma.lentas += 1
+                if forma.plano is None and explicavel:
+                    forma.plano = []  # marca antes de sair do lock: só uma thread roda o EXPLAIN
+                    capturar_plano = True
+        if not lenta:
+            return
+        log.warning(
+            "consulta lenta: %.1f ms, %d linhas, %s: %s | parametros: %s",
+            duracao * 1000, linhas, _chamador(), forma_sql,
+            "<ocultos>" if self.ocultar_parametros else repr(params),
+        )
+        if capturar_plano:
+            forma.plano = self.explica(conn, sql, params)
+
+    @staticmethod
+    def explica(conn, sql, params):
+        """Plano da consulta como lista de dicts (uma linha do EXPLAIN cada)."""
+        if sql.lstrip()[:6].upper() not in ("SELECT", "UPDATE", "DELETE", "INSERT"):
+            return None
+        explain = "EXPLAIN QUERY PLAN " if usa_sqlite(conn) else "EXPLAIN "
+        cursor = conn.cursor()
+        try:
+            cursor.execute(explain + sql, params or ())
+            colunas = [coluna[0] for coluna in cursor.description]
+            return [dict(zip(colunas, linha)) for linha in cursor.fetchall()]
+        except ERROS_BANCO as e:
+            return [{"erro": str(e)}]
+        finally:
+            cursor.close()
+
+    def mais_lentas(self, n=10, ordem="total"):
+        """As n formas de maior tempo total (ordem="total") ou maior p99 (ordem="p99")."""
+        with self._lock:
+            formas = [forma.como_dict() for forma in self._formas.values()]
+        chave = "total_ms" if ordem == "total" else "p99_ms"
+        return sorted(formas, key=lambda forma: forma[chave], reverse=True)[:n]
+
+    def limpar(self):
+        with self._lock:
+            self._formas.clear()
+
+
+class CursorMonitorado:
+    """Repassa tudo ao cursor do driver, cronometrando execute/executemany e os fetch*.
+
+    O comando só é registrado quando termina, no próximo execute ou no close,
+    para que o tempo e as linhas incluam a leitura do resultado.
+    """
+
+    def __init__(self, cursor, conn, registro):
+        self._cursor = cursor
+        self._conn = conn
+        self._registro = registro
+        self._sql = None
+
+    def _inicia(self, sql, params, explicavel=True):
+        self._finaliza()
+        self._sql = sql
+        self._params = params
+        self._explicavel = explicavel
+        self._duracao = 0.0
+        self._linhas = 0
+        self._leu = False
+
+    def _finaliza(self):
+        if self._sql is None:
+            return
+        linhas = self._linhas
+        if not self._leu:
+            # escritas: linhas afetadas (no SELECT sem fetch o sqlite3 dá -1)
+            linhas = max(self._cursor.rowcount, 0) if isinstance(self._cursor.rowcount, int) else 0
+        sql, self._sql = self._sql, None
+        self._registro.registra(sql, self._params, self._duracao, linhas, self._conn, self._explicavel)
+
+    def _mede(self, metodo, *args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            self._duracao += time.perf_counter() - inicio
+
+    def execute(self, sql, *params):
+        self._inicia(sql, params[0] if params else None)
+        return self._mede(self._cursor.execute, sql, *params)
+
+    def executemany(self, sql, seq_params):
+        seq_params = list(seq_params)
+        self._inicia(sql, seq_params if len(seq_params) <= 3 else seq_params[:3] + ["..."], explicavel=False)
+        return self._mede(self._cursor.executemany, sql, seq_params)
+
+    def fetchone(self):
+        linha = self._mede(self._cursor.fetchone)
+        self._leu = True
+        self._linhas += linha is not None
+        return linha
+
+    def fetchall(self):
+        linhas = self._mede(self._cursor.fetchall)
+        self._leu = True
+        self._linhas += len(linhas)
+        return linhas
+
+    def fetchmany(self, tamanho):
+        linhas = self._mede(self._cursor.fetchmany, tamanho)
+        self._leu = True
+        self._linhas += len(linhas)
+        return linhas
+
+    def close(self):
+        try:
+            return self._cursor.close()
+        finally:
+            # depois do close, para o EXPLAIN não encontrar resultado pendente na conexão
+            self._finaliza()
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+
+def cria_registro():
+    return RegistroConsultas(
+        limite=float(os.getenv("DB_CONSULTA_LENTA_MS", 200)) / 1000,
+        ocultar_parametros=os.getenv("DB_CONSULTA_LENTA_PARAMETROS", "mostrar") == "ocultar",
+    )
+
+
+registro_consultas = cria_registro()
+
+
+def cursor(conn, **kwargs):
+    """conn.cursor(**kwargs) com o tempo de cada comando contado em registro_consultas."""
+    return CursorMonitorado(conn.cursor(**kwargs), conn, registro_consultas)
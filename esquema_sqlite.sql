@@ -0,0 +1,195 @@
+-- Esquema do backend SQLite (DB_BACKEND=sqlite), equivalente ao imoveis.sql
+-- com as migrações 001 a 007 do MySQL. É aplicado por armazenamento.py ao
+-- abrir o banco; todos os comandos são idempotentes.
+--
+-- Os triggers usam as funções YEAR() e imoveis_faixa(), registradas em cada
+-- conexão por armazenamento.py: escritas feitas por outros clientes (como o
+-- shell sqlite3) falham com "no such function".
+
+CREATE TABLE IF NOT EXISTS imoveis (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    logradouro VARCHAR(200) NOT NULL,
+    tipo_logradouro VARCHAR(50),
+    bairro VARCHAR(120),
+    cidade VARCHAR(120) NOT NULL,
+    cep VARCHAR(10),
+    tipo VARCHAR(50),
+    valor REAL,
+    data_aquisicao DATE,
+    versao INTEGER NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_imoveis_cidade ON imoveis (cidade);
+CREATE INDEX IF NOT EXISTS idx_imoveis_tipo ON imoveis (tipo);
+CREATE INDEX IF NOT EXISTS idx_imoveis_tipo_cidade_valor ON imoveis (tipo, cidade, valor);
+
+-- versão das linhas (migração 003); como o SQLite não deixa alterar NEW, a
+-- versão é gravada por um UPDATE depois da escrita, que não dispara os
+-- triggers "UPDATE OF" das colunas de dados
+CREATE TABLE IF NOT EXISTS imoveis_estado (
+    id INTEGER PRIMARY KEY,
+    versao INTEGER NOT NULL,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+INSERT OR IGNORE INTO imoveis_estado (id, versao) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS imoveis_versao_insert AFTER INSERT ON imoveis
+BEGIN
+    UPDATE imoveis_estado SET versao = versao + 1, atualizado_em = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = 1;
+    UPDATE imoveis SET versao = (SELECT versao FROM imoveis_estado WHERE id = 1), atualizado_em = strftime('%Y-%m-%d %H:%M:%f', 'now')
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS imoveis_versao_update
+AFTER UPDATE OF logradouro, tipo_logradouro, bairro, cidade, cep, tipo, valor, data_aquisicao ON imoveis
+BEGIN
+    UPDATE imoveis_estado SET versao = versao + 1, atualizado_em = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = 1;
+    UPDATE imoveis SET versao = (SELECT versao FROM imoveis_estado WHERE id = 1), atualizado_em = strftime('%Y-%m-%d %H:%M:%f', 'now')
+    WHERE id = NEW.id;
+END;
+
+-- remoções para o feed de mudanças (migração 007): o DELETE deixa o id e a
+-- versão em imoveis_removidos. Bancos criados antes tinham um trigger de
+-- DELETE só com a versão, trocado aqui por este.
+CREATE TABLE IF NOT EXISTS imoveis_removidos (
+    id INTEGER PRIMARY KEY,
+    versao INTEGER NOT NULL,
+    removido_em TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_removidos_versao ON imoveis_removidos (versao);
+CREATE INDEX IF NOT EXISTS idx_imoveis_versao ON imoveis (versao);
+
+DROP TRIGGER IF EXISTS imoveis_versao_delete;
+
+CREATE TRIGGER IF NOT EXISTS imoveis_versao_remocao AFTER DELETE ON imoveis
+BEGIN
+    UPDATE imoveis_estado SET versao = versao + 1, atualizado_em = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = 1;
+    INSERT INTO imoveis_removidos (id, versao, removido_em)
+    VALUES (OLD.id, (SELECT versao FROM imoveis_estado WHERE id = 1), strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    ON CONFLICT (id) DO UPDATE SET versao = excluded.versao, removido_em = excluded.removido_em;
+END;
+
+-- resumo para GET /imoveis/estatisticas (migração 005)
+CREATE TABLE IF NOT EXISTS imoveis_resumo (
+    cidade VARCHAR(120) NOT NULL,
+    tipo VARCHAR(50) NOT NULL DEFAULT '',
+    ano INTEGER NOT NULL DEFAULT 0,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    quantidade_valor INTEGER NOT NULL DEFAULT 0,
+    soma_valor REAL NOT NULL DEFAULT 0,
+    min_valor REAL,
+    max_valor REAL,
+    PRIMARY KEY (cidade, tipo, ano)
+);
+
+CREATE TABLE IF NOT EXISTS imoveis_resumo_faixas (
+    cidade VARCHAR(120) NOT NULL,
+    tipo VARCHAR(50) NOT NULL DEFAULT '',
+    ano INTEGER NOT NULL DEFAULT 0,
+    faixa INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (cidade, tipo, ano, faixa)
+);
+
+CREATE TRIGGER IF NOT EXISTS imoveis_resumo_insert AFTER INSERT ON imoveis
+BEGIN
+    INSERT INTO imoveis_resumo (cidade, tipo, ano, quantidade, quantidade_valor, soma_valor, min_valor, max_valor)
+    VALUES (NEW.cidade, COALESCE(NEW.tipo, ''), COALESCE(YEAR(NEW.data_aquisicao), 0), 1, NEW.valor IS NOT NULL, COALESCE(NEW.valor, 0), NEW.valor, NEW.valor)
+    ON CONFLICT (cidade, tipo, ano) DO UPDATE SET
+        quantidade = quantidade + 1,
+        quantidade_valor = quantidade_valor + excluded.quantidade_valor,
+        soma_valor = soma_valor + excluded.soma_valor,
+        min_valor = COALESCE(MIN(min_valor, excluded.min_valor), min_valor, excluded.min_valor),
+        max_valor = COALESCE(MAX(max_valor, excluded.max_valor), max_valor, excluded.max_valor);
+    INSERT INTO imoveis_resumo_faixas (cidade, tipo, ano, faixa, quantidade)
+    SELECT NEW.cidade, COALESCE(NEW.tipo, ''), COALESCE(YEAR(NEW.data_aquisicao), 0), imoveis_faixa(NEW.valor), 1
+    WHERE NEW.valor IS NOT NULL
+    ON CONFLICT (cidade, tipo, ano, faixa) DO UPDATE SET quantidade = quantidade + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS imoveis_resumo_delete AFTER DELETE ON imoveis
+BEGIN
+    UPDATE imoveis_resumo
+    SET quantidade = quantidade - 1,
+        quantidade_valor = quantidade_valor - (OLD.valor IS NOT NULL),
+        soma_valor = soma_valor - COALESCE(OLD.valor, 0)
+    WHERE cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '') AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0);
+    UPDATE imoveis_resumo_faixas SET quantidade = quantidade - 1
+    WHERE OLD.valor IS NOT NULL AND cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '')
+      AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0) AND faixa = imoveis_faixa(OLD.valor);
+    DELETE FROM imoveis_resumo_faixas
+    WHERE OLD.valor IS NOT NULL AND cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '')
+      AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0) AND faixa = imoveis_faixa(OLD.valor) AND quantidade <= 0;
+    -- mínimo e máximo só são recalculados quando o valor removido era um dos extremos
+    UPDATE imoveis_resumo
+    SET min_valor = (SELECT MIN(valor) FROM imoveis WHERE cidade = OLD.cidade AND COALESCE(tipo, '') = COALESCE(OLD.tipo, '')
+                       AND COALESCE(YEAR(data_aquisicao), 0) = COALESCE(YEAR(OLD.data_aquisicao), 0)),
+        max_valor = (SELECT MAX(valor) FROM imoveis WHERE cidade = OLD.cidade AND COALESCE(tipo, '') = COALESCE(OLD.tipo, '')
+                       AND COALESCE(YEAR(data_aquisicao), 0) = COALESCE(YEAR(OLD.data_aquisicao), 0))
+    WHERE OLD.valor IS NOT NULL AND cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '')
+      AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0) AND (min_valor = OLD.valor OR max_valor = OLD.valor);
+    DELETE FROM imoveis_resumo
+    WHERE cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '') AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0) AND quantidade <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS imoveis_resumo_update AFTER UPDATE OF cidade, tipo, valor, data_aquisicao ON imoveis
+WHEN NOT (OLD.cidade IS NEW.cidade AND OLD.tipo IS NEW.tipo AND OLD.data_aquisicao IS NEW.data_aquisicao AND OLD.valor IS NEW.valor)
+BEGIN
+    UPDATE imoveis_resumo
+    SET quantidade = quantidade - 1,
+        quantidade_valor = quantidade_valor - (OLD.valor IS NOT NULL),
+        soma_valor = soma_valor - COALESCE(OLD.valor, 0)
+    WHERE cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '') AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0);
+    UPDATE imoveis_resumo_faixas SET quantidade = quantidade - 1
+    WHERE OLD.valor IS NOT NULL AND cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '')
+      AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0) AND faixa = imoveis_faixa(OLD.valor);
+    DELETE FROM imoveis_resumo_faixas
+    WHERE OLD.valor IS NOT NULL AND cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '')
+      AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0) AND faixa = imoveis_faixa(OLD.valor) AND quantidade <= 0;
+    UPDATE imoveis_resumo
+    SET min_valor = (SELECT MIN(valor) FROM imoveis WHERE cidade = OLD.cidade AND COALESCE(tipo, '') = COALESCE(OLD.tipo, '')
+                       AND COALESCE(YEAR(data_aquisicao), 0) = COALESCE(YEAR(OLD.data_aquisicao), 0)),
+        max_valor = (SELECT MAX(valor) FROM imoveis WHERE cidade = OLD.cidade AND COALESCE(tipo, '') = COALESCE(OLD.tipo, '')
+                       AND COALESCE(YEAR(data_aquisicao), 0) = COALESCE(YEAR(OLD.data_aquisicao), 0))
+    WHERE OLD.valor IS NOT NULL AND cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '')
+      AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0) AND (min_valor = OLD.valor OR max_valor = OLD.valor);
+    DELETE FROM imoveis_resumo
+    WHERE cidade = OLD.cidade AND tipo = COALESCE(OLD.tipo, '') AND ano = COALESCE(YEAR(OLD.data_aquisicao), 0) AND quantidade <= 0;
+
+    INSERT INTO imoveis_resumo (cidade, tipo, ano, quantidade, quantidade_valor, soma_valor, min_valor, max_valor)
+    VALUES (NEW.cidade, COALESCE(NEW.tipo, ''), COALESCE(YEAR(NEW.data_aquisicao), 0), 1, NEW.valor IS NOT NULL, COALESCE(NEW.valor, 0), NEW.valor, NEW.valor)
+    ON CONFLICT (cidade, tipo, ano) DO UPDATE SET
+        quantidade = quantidade + 1,
+        quantidade_valor = quantidade_valor + excluded.quantidade_valor,
+        soma_valor = soma_valor + excluded.soma_valor,
+        min_valor = COALESCE(MIN(min_valor, excluded.min_valor), min_valor, excluded.min_valor),
+        max_valor = COALESCE(MAX(max_valor, excluded.max_valor), max_valor, excluded.max_valor);
+    INSERT INTO imoveis_resumo_faixas (cidade, tipo, ano, faixa, quantidade)
+    SELECT NEW.cidade, COALESCE(NEW.tipo, ''), COALESCE(YEAR(NEW.data_aquisicao), 0), imoveis_faixa(NEW.valor), 1
+    WHERE NEW.valor IS NOT NULL
+    ON CONFLICT (cidade, tipo, ano, faixa) DO UPDATE SET quantidade = quantidade + 1;
+END;
+
+-- busca por endereço (migração 006): índice FTS5 externo sobre imoveis
+CREATE VIRTUAL TABLE IF NOT EXISTS imoveis_fts USING fts5(
+    logradouro, bairro, cidade, content='imoveis', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS imoveis_fts_insert AFTER INSERT ON imoveis
+BEGIN
+    INSERT INTO imoveis_fts (rowid, logradouro, bairro, cidade) VALUES (NEW.id, NEW.logradouro, NEW.bairro, NEW.cidade);
+END;
+
+CREATE TRIGGER IF NOT EXISTS imoveis_fts_delete AFTER DELETE ON imoveis
+BEGIN
+    INSERT INTO imoveis_fts (imoveis_fts, rowid, logradouro, bairro, cidade) VALUES ('delete', OLD.id, OLD.logradouro, OLD.bairro, OLD.cidade);
+END;
+
+CREATE TRIGGER IF NOT EXISTS imoveis_fts_update AFTER UPDATE OF logradouro, bairro, cidade ON imoveis
+BEGIN
+    INSERT INTO imoveis_fts (imoveis_fts, rowid, logradouro, bairro, cidade) VALUES ('delete', OLD.id, OLD.logradouro, OLD.bairro, OLD.cidade);
+    INSERT INTO imoveis_fts (rowid, logradouro, bairro, cidade) VALUES (NEW.id, NEW.logradouro, NEW.bairro, NEW.cidade);
+END;
@@ -0,0 +1,177 @@
+"""Exportação em massa de imóveis em NDJSON, CSV ou Parquet.
+
+As linhas saem de um cursor sem buffer, em lotes de views.iter_exportacao,
+sem z_links. CSV e Parquet são gerados direto das tuplas do driver; o
+NDJSON monta um dict por linha, que o orjson serializa em C (montar o
+objeto de cada linha com prefixos por coluna ficou mais lento). A memória
+fica limitada a um lote, seja na rota GET /imoveis/exportar, seja no
+arquivo gravado por este script.
+
+O Parquet precisa do pacote pyarrow; cada lote vira um row group.
+
+Uso:
+    python exportar.py imoveis.csv [--cidade Campinas] [--valor-min 100000]
+    python exportar.py - --formato ndjson --campos id,cidade,valor > imoveis.ndjson
+    python exportar.py imoveis.parquet --lote 50000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from collections import namedtuple
+
+import utils
+import views
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+Formato = namedtuple("Formato", "mimetype extensao gerador")
+
+
+def _codificador_json():
+    if utils.orjson is not None:
+        return lambda obj: utils.orjson.dumps(obj, default=utils.json_default)
+    return lambda obj: json.dumps(obj, default=utils.json_default, ensure_ascii=False).encode("utf-8")
+
+def gera_ndjson(colunas, lotes):
+    codifica = _codificador_json()
+    for lote in lotes:
+        yield b"\n".join([codifica(dict(zip(colunas, row))) for row in lote]) + b"\n"
+
+
+def gera_csv(colunas, lotes):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    escritor.writerow(colunas)
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+TIPOS_PARQUET = {
+    "id": "int64",
+    "valor": "float64",
+    "data_aquisicao": "date32",
+}
+
+def _esquema_parquet(colunas):
+    return pyarrow.schema([(coluna, getattr(pyarrow, TIPOS_PARQUET.get(coluna, "string"))()) for coluna in colunas])
+
+class _SaidaParquet:
+    """Destino do ParquetWriter que só acumula o que foi escrito.
+
+    O tell() conta todos os bytes já escritos, mesmo os já entregues por
+    retira(): o rodapé do Parquet guarda a posição de cada row group no
+    arquivo inteiro, não no pedaço atual.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retira(self):
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+def gera_parquet(colunas, lotes):
+    esquema = _esquema_parquet(colunas)
+    saida = _SaidaParquet()
+    escritor = pyarrow.parquet.ParquetWriter(saida, esquema, compression="zstd")
+    try:
+        for lote in lotes:
+            # transpõe o lote em colunas; o pyarrow converte Decimal e date em C
+            valores = zip(*lote)
+            arrays = [pyarrow.array(coluna).cast(campo.type) for coluna, campo in zip(valores, esquema)]
+            escritor.write_table(pyarrow.Table.from_arrays(arrays, schema=esquema))
+            yield saida.retira()
+    finally:
+        escritor.close()
+    yield saida.retira()
+
+
+FORMATOS = {
+    "ndjson": Formato("application/x-ndjson", "ndjson", gera_ndjson),
+    "csv": Formato("text/csv", "csv", gera_csv),
+    "parquet": Formato("application/vnd.apache.parquet", "parquet", gera_parquet),
+}
+
+
+def disponivel(formato):
+    return formato != "parquet" or pyarrow is not None
+
+
+def exporta(conn, formato, filtros, tamanho_lote=views.TAMANHO_LOTE_EXPORTACAO):
+    """Gera os bytes da exportação, lote a lote."""
+    if not disponivel(formato):
+        raise RuntimeError("o formato parquet requer o pacote pyarrow")
+    sql, params, colunas = views.consulta_exportacao(filtros)
+    lotes = views.iter_exportacao(conn, sql, params, tamanho_lote)
+    return FORMATOS[formato].gerador(colunas, lotes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta a tabela imoveis")
+    parser.add_argument("destino", help="arquivo de saída (.ndjson, .csv ou .parquet) ou - para a saída padrão")
+    parser.add_argument("--formato", choices=sorted(FORMATOS), help="padrão: pela extensão do destino")
+    parser.add_argument("--lote", type=int, default=views.TAMANHO_LOTE_EXPORTACAO, help="linhas por lote")
+    for filtro in ("tipo", "cidade", "bairro", "valor-min", "valor-max", "data-min", "data-max", "campos"):
+        parser.add_argument(f"--{filtro}")
+    args = parser.parse_args(argv)
+
+    formato = args.formato or os.path.splitext(args.destino)[1].lstrip(".")
+    if formato not in FORMATOS:
+        parser.error("use --formato ou um destino .ndjson, .csv ou .parquet")
+    filtros, erros = views.le_filtros_busca({
+        chave: valor for chave, valor in (
+            ("tipo", args.tipo), ("cidade", args.cidade), ("bairro", args.bairro),
+            ("valor_min", args.valor_min), ("valor_max", args.valor_max),
+            ("data_min", args.data_min), ("data_max", args.data_max), ("campos", args.campos),
+        ) if valor is not None
+    })
+    if erros:
+        parser.error("; ".join(erros))
+
+    from servidor import connect_db
+    conn = connect_db()
+    if conn is None:
+        return 1
+    saida = sys.stdout.buffer if args.destino == "-" else open(args.destino, "wb")
+    try:
+        for parte in exporta(conn, formato, filtros, args.lote):
+            saida.write(parte)
+    finally:
+        if saida is not sys.stdout.buffer:
+            saida.close()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Métricas no formato texto do Prometheus, expostas em GET /metrics.
+
+Contadores e histogramas guardam os valores em memória do processo, com um
+lock por métrica; cada observação custa um bisect e uma soma, então a
+instrumentação pode ficar ligada em produção. Valores que já existem em
+outro lugar (pool, cache) entram por coletores chamados só na leitura.
+"""
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# em segundos; começa em 1 ms porque as consultas por chave primária são rápidas
+LIMITES_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapa(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _rotulos(nomes, valores, extra=""):
+    pares = [f'{nome}="{_escapa(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+def _numero(valor):
+    if isinstance(valor, float):
+        if valor == float("inf"):
+            return "+Inf"
+        return repr(valor)
+    return str(valor)
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores_rotulos, n=1):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0) + n
+
+    def valor(self, *valores_rotulos):
+        with self._lock:
+            return self._valores.get(valores_rotulos, 0)
+
+    def linhas(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for chave, valor in valores:
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"
+
+    def limpar(self):
+        with self._lock:
+            self._valores.clear()
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_PADRAO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(limites)
+        self._series = {}  # rótulos -> [contagens por faixa (+Inf no fim), soma]
+        self._lock = threading.Lock()
+
+    def observa(self, valor, *valores_rotulos):
+        faixa = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][faixa] += 1
+            serie[1] += valor
+
+    def contagem(self, *valores_rotulos):
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            return sum(serie[0]) if serie else 0
+
+    def linhas(self):
+        with self._lock:
+            series = sorted((chave, (list(contagens), soma)) for chave, (contagens, soma) in self._series.items())
+        for chave, (contagens, soma) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                le = 'le="%s"' % _numero(limite)
+                yield f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(soma)}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}"
+
+    def limpar(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Registro:
+    """As métricas do processo e os coletores lidos a cada GET /metrics.
+
+    Um coletor é uma função que retorna [(nome, tipo, ajuda, [(rotulos, valor)])],
+    com `rotulos` um dict.
+    """
+
+    def __init__(self):
+        self._metricas = []
+        self._coletores = []
+
+    def contador(self, nome, ajuda, rotulos=()):
+        metrica = Contador(nome, ajuda, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nome, ajuda, rotulos=(), limites=LIMITES_PADRAO):
+        metrica = Histograma(nome, ajuda, rotulos, limites)
+        self._metricas.append(metrica)
+        return metrica
+
+    def coletor(self, funcao):
+        self._coletores.append(funcao)
+        return funcao
+
+    def texto(self):
+        linhas = []
+        for metrica in self._metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.linhas())
+        for coletor in self._coletores:
+            for nome, tipo, ajuda, amostras in coletor():
+                linhas.append(f"# HELP {nome} {ajuda}")
+                linhas.append(f"# TYPE {nome} {tipo}")
+                for rotulos, valor in amostras:
+                    linhas.append(f"{nome}{_rotulos(list(rotulos), list(rotulos.values()))} {_numero(valor)}")
+        return "\n".join(linhas) + "\n"
+
+    def limpar(self):
+        for metrica in self._metricas:
+            metrica.limpar()
+
+
+registro = Registro()
+
+requisicoes = registro.contador(
+    "imoveis_http_requisicoes_total", "Requisições HTTP respondidas", ("rota", "metodo", "status"))
+duracao_requisicao = registro.histograma(
+    "imoveis_http_duracao_segundos", "Tempo de resposta por rota", ("rota", "metodo"))
+conexao_banco = registro.histograma(
+    "imoveis_db_conexao_segundos", "Tempo para obter uma conexão do pool (inclui abrir uma nova)")
+duracao_consulta = registro.histograma(
+    "imoveis_consulta_duracao_segundos", "Tempo no banco por consulta de views.py", ("consulta",))
+espera_admissao = registro.histograma(
+    "imoveis_admissao_espera_segundos", "Tempo na fila do controle de admissão das requisições admitidas")
+linhas_consulta = registro.contador(
+    "imoveis_consulta_linhas_total", "Imóveis (ou grupos) retornados por consulta de views.py", ("consulta",))
+
+
+def conta_linhas(resultado):
+    """Quantas linhas uma função de views.py retornou, pelo formato do resultado."""
+    if resultado is None or isinstance(resultado, bool):
+        return 0
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, dict) and "imoveis" in resultado:
+        return len(resultado["imoveis"])
+    if isinstance(resultado, dict) and "mudancas" in resultado:
+        return len(resultado["mudancas"])
+    if isinstance(resultado, tuple) and resultado and isinstance(resultado[0], list):
+        return len(resultado[0])  # (resultados, erros) das operações em lote
+    return 1
+
+
+def mede_consulta(f):
+    """Decorador das funções de views.py: tempo e linhas, com o nome da função.
+
+    Nos geradores (iter_imoveis) só conta o tempo dentro do gerador, não o
+    de quem consome os lotes.
+    """
+    nome = f.__name__
+
+    if inspect.isgeneratorfunction(f):
+        @wraps(f)
+        def gerador(*args, **kwargs):
+            decorrido = 0.0
+            linhas = 0
+            lotes = f(*args, **kwargs)
+            try:
+                while True:
+                    inicio = time.perf_counter()
+                    try:
+                        lote = next(lotes)
+                    except StopIteration:
+                        return
+                    finally:
+                        decorrido += time.perf_counter() - inicio
+                    linhas += len(lote)
+                    yield lote
+            finally:
+                lotes.close()
+                duracao_consulta.observa(decorrido, nome)
+                linhas_consulta.inc(nome, n=linhas)
+        return gerador
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = None
+        try:
+            resultado = f(*args, **kwargs)
+            return resultado
+        finally:
+            duracao_consulta.observa(time.perf_counter() - inicio, nome)
+            linhas_consulta.inc(nome, n=conta_linhas(resultado))
+    return wrapper
@@ -0,0 +1,11 @@
+-- Troca as colunas TEXT por tipos com tamanho definido, o que permite
+-- indexá-las sem prefixo e guardar valor/data com os tipos corretos.
+ALTER TABLE imoveis
+    MODIFY logradouro VARCHAR(200) NOT NULL,
+    MODIFY tipo_logradouro VARCHAR(50),
+    MODIFY bairro VARCHAR(120),
+    MODIFY cidade VARCHAR(120) NOT NULL,
+    MODIFY cep VARCHAR(10),
+    MODIFY tipo VARCHAR(50),
+    MODIFY valor DECIMAL(14, 2),
+    MODIFY data_aquisicao DATE;
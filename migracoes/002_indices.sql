@@ -0,0 +1,5 @@
+-- Índices usados pelas listagens por cidade e por tipo (views.py) e pelas
+-- buscas que combinam tipo, cidade e faixa de valor.
+CREATE INDEX idx_imoveis_cidade ON imoveis (cidade);
+CREATE INDEX idx_imoveis_tipo ON imoveis (tipo);
+CREATE INDEX idx_imoveis_tipo_cidade_valor ON imoveis (tipo, cidade, valor);
@@ -0,0 +1,10 @@
+-- Progresso das cargas em massa (carregar.py). A linha de cada carga é
+-- atualizada na mesma transação de cada bloco inserido, então uma carga
+-- interrompida pode ser retomada sem duplicar nem perder linhas.
+CREATE TABLE carga_progresso (
+    carga VARCHAR(200) PRIMARY KEY,
+    linhas BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    indices TEXT,
+    concluida BOOLEAN NOT NULL DEFAULT FALSE,
+    atualizada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
@@ -0,0 +1,109 @@
+-- Tabela de resumo para GET /imoveis/estatisticas, no grão (cidade, tipo,
+-- ano de aquisição). Os triggers mantêm o resumo na mesma transação de cada
+-- escrita em imoveis. A mediana é estimada pelo histograma de faixas
+-- logarítmicas de 1% em imoveis_resumo_faixas.
+CREATE TABLE imoveis_resumo (
+    cidade VARCHAR(120) NOT NULL,
+    tipo VARCHAR(50) NOT NULL DEFAULT '',
+    ano SMALLINT NOT NULL DEFAULT 0,
+    quantidade BIGINT NOT NULL DEFAULT 0,
+    quantidade_valor BIGINT NOT NULL DEFAULT 0,
+    soma_valor DECIMAL(22, 2) NOT NULL DEFAULT 0,
+    min_valor DECIMAL(14, 2),
+    max_valor DECIMAL(14, 2),
+    PRIMARY KEY (cidade, tipo, ano)
+);
+
+CREATE TABLE imoveis_resumo_faixas (
+    cidade VARCHAR(120) NOT NULL,
+    tipo VARCHAR(50) NOT NULL DEFAULT '',
+    ano SMALLINT NOT NULL DEFAULT 0,
+    faixa INT NOT NULL,
+    quantidade BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (cidade, tipo, ano, faixa)
+);
+
+DELIMITER $$
+
+CREATE FUNCTION imoveis_faixa(v DECIMAL(14, 2)) RETURNS INT DETERMINISTIC
+RETURN IF(v > 0, FLOOR(LN(v) / LN(1.01)), -1)$$
+
+CREATE PROCEDURE imoveis_resumo_soma(IN p_cidade VARCHAR(120), IN p_tipo VARCHAR(50), IN p_data DATE, IN p_valor DECIMAL(14, 2))
+BEGIN
+    INSERT INTO imoveis_resumo (cidade, tipo, ano, quantidade, quantidade_valor, soma_valor, min_valor, max_valor)
+    VALUES (p_cidade, COALESCE(p_tipo, ''), COALESCE(YEAR(p_data), 0), 1, p_valor IS NOT NULL, COALESCE(p_valor, 0), p_valor, p_valor)
+    ON DUPLICATE KEY UPDATE
+        quantidade = quantidade + 1,
+        quantidade_valor = quantidade_valor + (p_valor IS NOT NULL),
+        soma_valor = soma_valor + COALESCE(p_valor, 0),
+        min_valor = IF(p_valor IS NULL, min_valor, LEAST(COALESCE(min_valor, p_valor), p_valor)),
+        max_valor = IF(p_valor IS NULL, max_valor, GREATEST(COALESCE(max_valor, p_valor), p_valor));
+    IF p_valor IS NOT NULL THEN
+        INSERT INTO imoveis_resumo_faixas (cidade, tipo, ano, faixa, quantidade)
+        VALUES (p_cidade, COALESCE(p_tipo, ''), COALESCE(YEAR(p_data), 0), imoveis_faixa(p_valor), 1)
+        ON DUPLICATE KEY UPDATE quantidade = quantidade + 1;
+    END IF;
+END$$
+
+CREATE PROCEDURE imoveis_resumo_subtrai(IN p_cidade VARCHAR(120), IN p_tipo VARCHAR(50), IN p_data DATE, IN p_valor DECIMAL(14, 2))
+BEGIN
+    DECLARE v_tipo VARCHAR(50) DEFAULT COALESCE(p_tipo, '');
+    DECLARE v_ano SMALLINT DEFAULT COALESCE(YEAR(p_data), 0);
+
+    UPDATE imoveis_resumo
+    SET quantidade = quantidade - 1,
+        quantidade_valor = quantidade_valor - (p_valor IS NOT NULL),
+        soma_valor = soma_valor - COALESCE(p_valor, 0)
+    WHERE cidade = p_cidade AND tipo = v_tipo AND ano = v_ano;
+
+    IF p_valor IS NOT NULL THEN
+        UPDATE imoveis_resumo_faixas SET quantidade = quantidade - 1
+        WHERE cidade = p_cidade AND tipo = v_tipo AND ano = v_ano AND faixa = imoveis_faixa(p_valor);
+        DELETE FROM imoveis_resumo_faixas
+        WHERE cidade = p_cidade AND tipo = v_tipo AND ano = v_ano AND faixa = imoveis_faixa(p_valor) AND quantidade <= 0;
+
+        -- mínimo e máximo só são recalculados quando o valor removido era um dos extremos
+        UPDATE imoveis_resumo r
+        JOIN (
+            SELECT MIN(valor) AS minimo, MAX(valor) AS maximo FROM imoveis
+            WHERE cidade = p_cidade AND COALESCE(tipo, '') = v_tipo AND COALESCE(YEAR(data_aquisicao), 0) = v_ano
+        ) atual
+        SET r.min_valor = atual.minimo, r.max_valor = atual.maximo
+        WHERE r.cidade = p_cidade AND r.tipo = v_tipo AND r.ano = v_ano
+          AND (r.min_valor = p_valor OR r.max_valor = p_valor);
+    END IF;
+
+    DELETE FROM imoveis_resumo WHERE cidade = p_cidade AND tipo = v_tipo AND ano = v_ano AND quantidade <= 0;
+END$$
+
+CREATE TRIGGER imoveis_resumo_insert AFTER INSERT ON imoveis FOR EACH ROW
+BEGIN
+    CALL imoveis_resumo_soma(NEW.cidade, NEW.tipo, NEW.data_aquisicao, NEW.valor);
+END$$
+
+CREATE TRIGGER imoveis_resumo_update AFTER UPDATE ON imoveis FOR EACH ROW
+BEGIN
+    IF NOT (OLD.cidade <=> NEW.cidade AND OLD.tipo <=> NEW.tipo
+            AND OLD.data_aquisicao <=> NEW.data_aquisicao AND OLD.valor <=> NEW.valor) THEN
+        CALL imoveis_resumo_subtrai(OLD.cidade, OLD.tipo, OLD.data_aquisicao, OLD.valor);
+        CALL imoveis_resumo_soma(NEW.cidade, NEW.tipo, NEW.data_aquisicao, NEW.valor);
+    END IF;
+END$$
+
+CREATE TRIGGER imoveis_resumo_delete AFTER DELETE ON imoveis FOR EACH ROW
+BEGIN
+    CALL imoveis_resumo_subtrai(OLD.cidade, OLD.tipo, OLD.data_aquisicao, OLD.valor);
+END$$
+
+DELIMITER ;
+
+INSERT INTO imoveis_resumo (cidade, tipo, ano, quantidade, quantidade_valor, soma_valor, min_valor, max_valor)
+SELECT cidade, COALESCE(tipo, ''), COALESCE(YEAR(data_aquisicao), 0), COUNT(*), COUNT(valor), COALESCE(SUM(valor), 0), MIN(valor), MAX(valor)
+FROM imoveis
+GROUP BY cidade, COALESCE(tipo, ''), COALESCE(YEAR(data_aquisicao), 0);
+
+INSERT INTO imoveis_resumo_faixas (cidade, tipo, ano, faixa, quantidade)
+SELECT cidade, COALESCE(tipo, ''), COALESCE(YEAR(data_aquisicao), 0), imoveis_faixa(valor), COUNT(*)
+FROM imoveis
+WHERE valor IS NOT NULL
+GROUP BY cidade, COALESCE(tipo, ''), COALESCE(YEAR(data_aquisicao), 0), imoveis_faixa(valor);
@@ -0,0 +1,3 @@
+-- Índice FULLTEXT para GET /imoveis/texto (busca por endereço com prefixo e
+-- relevância), no lugar de LIKE '%...%' que varre a tabela inteira.
+ALTER TABLE imoveis ADD FULLTEXT INDEX ft_imoveis_endereco (logradouro, bairro, cidade);
@@ -0,0 +1,27 @@
+-- Feed de mudanças (GET /imoveis/mudancas). As linhas gravadas já têm a
+-- versão global da migração 003; faltava lembrar das removidas. O trigger
+-- de DELETE passa a deixar em imoveis_removidos o id e a versão da remoção,
+-- na mesma transação. O índice em versao deixa a leitura "tudo depois do
+-- token" proporcional ao número de mudanças, não ao tamanho da tabela.
+CREATE TABLE imoveis_removidos (
+    id INT PRIMARY KEY,
+    versao BIGINT UNSIGNED NOT NULL,
+    removido_em TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    INDEX idx_removidos_versao (versao)
+);
+
+CREATE INDEX idx_imoveis_versao ON imoveis (versao);
+
+DROP TRIGGER imoveis_versao_delete;
+
+DELIMITER $$
+
+CREATE TRIGGER imoveis_versao_delete AFTER DELETE ON imoveis FOR EACH ROW
+BEGIN
+    UPDATE imoveis_estado SET versao = versao + 1, atualizado_em = CURRENT_TIMESTAMP(6) WHERE id = 1;
+    INSERT INTO imoveis_removidos (id, versao, removido_em)
+    VALUES (OLD.id, (SELECT versao FROM imoveis_estado WHERE id = 1), CURRENT_TIMESTAMP(6))
+    ON DUPLICATE KEY UPDATE versao = VALUES(versao), removido_em = VALUES(removido_em);
+END$$
+
+DELIMITER ;
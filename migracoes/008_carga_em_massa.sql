@@ -0,0 +1,29 @@
+-- Carga em massa sem o trabalho por linha dos triggers de INSERT. Com a
+-- variável de sessão @carga_em_massa definida (só o carregar.py faz isso),
+-- o trigger de versão não incrementa imoveis_estado a cada linha: a carga
+-- incrementa uma vez por bloco e todas as linhas do bloco recebem essa
+-- versão, o que mantém a ordem (versao, id) do feed de mudanças. O trigger
+-- do resumo também é pulado, e a carga reconstrói imoveis_resumo e
+-- imoveis_resumo_faixas uma vez no fim (views.reconstroi_resumo).
+DROP TRIGGER imoveis_versao_insert;
+DROP TRIGGER imoveis_resumo_insert;
+
+DELIMITER $$
+
+CREATE TRIGGER imoveis_versao_insert BEFORE INSERT ON imoveis FOR EACH ROW
+BEGIN
+    IF @carga_em_massa IS NULL THEN
+        UPDATE imoveis_estado SET versao = versao + 1, atualizado_em = CURRENT_TIMESTAMP(6) WHERE id = 1;
+    END IF;
+    SET NEW.versao = (SELECT versao FROM imoveis_estado WHERE id = 1);
+    SET NEW.atualizado_em = CURRENT_TIMESTAMP(6);
+END$$
+
+CREATE TRIGGER imoveis_resumo_insert AFTER INSERT ON imoveis FOR EACH ROW
+BEGIN
+    IF @carga_em_massa IS NULL THEN
+        CALL imoveis_resumo_soma(NEW.cidade, NEW.tipo, NEW.data_aquisicao, NEW.valor);
+    END IF;
+END$$
+
+DELIMITER ;
@@ -0,0 +1,188 @@
+"""Migrações versionadas do banco de dados.
+
+Cada arquivo em migracoes/ se chama NNN_descricao.sql e é aplicado uma única
+vez, em ordem. A versão aplicada fica registrada na tabela schema_version.
+
+Uso:
+    python migrar.py upgrade [--ate N]
+    python migrar.py status
+    python migrar.py verificar-indices
+    python migrar.py verificar-resumo [--reconstruir]
+"""
+import argparse
+import os
+import re
+import sys
+
+import views
+from armazenamento import usa_sqlite
+
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migracoes")
+
+SQL_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        versao INTEGER PRIMARY KEY,
+        nome VARCHAR(200) NOT NULL,
+        aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def listar_migracoes(diretorio=DIRETORIO_MIGRACOES):
+    """Retorna [(versao, nome, caminho)] das migrações, ordenadas pela versão."""
+    migracoes = []
+    for arquivo in os.listdir(diretorio):
+        encontrado = re.fullmatch(r"(\d+)_(\w+)\.sql", arquivo)
+        if encontrado:
+            migracoes.append((int(encontrado.group(1)), encontrado.group(2), os.path.join(diretorio, arquivo)))
+    migracoes.sort()
+    versoes = [versao for versao, _, _ in migracoes]
+    if len(versoes) != len(set(versoes)):
+        raise ValueError("há migrações com a mesma versão")
+    return migracoes
+
+
+def separar_comandos(sql):
+    """Separa um script em comandos, aceitando a diretiva DELIMITER do cliente mysql."""
+    comandos = []
+    delimitador = ";"
+    atual = []
+    for linha in sql.splitlines():
+        limpa = linha.strip()
+        if not atual and (not limpa or limpa.startswith("--")):
+            continue
+        if limpa.upper().startswith("DELIMITER "):
+            delimitador = limpa.split(None, 1)[1]
+            continue
+        atual.append(linha)
+        if limpa.endswith(delimitador):
+            comando = "\n".join(atual).strip()[:-len(delimitador)].strip()
+            if comando:
+                comandos.append(comando)
+            atual = []
+    resto = "\n".join(atual).strip()
+    if resto:
+        comandos.append(resto)
+    return comandos
+
+
+def versao_atual(conn):
+    cursor = conn.cursor()
+    cursor.execute(SQL_SCHEMA_VERSION)
+    cursor.execute("SELECT MAX(versao) FROM schema_version")
+    row = cursor.fetchone()
+    cursor.close()
+    return (row[0] or 0) if row else 0
+
+
+def upgrade(conn, ate=None, diretorio=DIRETORIO_MIGRACOES):
+    """Aplica, em ordem, as migrações pendentes até a versão `ate` (ou todas).
+
+    Retorna a lista de versões aplicadas. Como DDL no MySQL faz commit
+    implícito, cada migração é registrada logo após seus comandos rodarem.
+    """
+    atual = versao_atual(conn)
+    aplicadas = []
+    for versao, nome, caminho in listar_migracoes(diretorio):
+        if versao <= atual or (ate is not None and versao > ate):
+            continue
+        with open(caminho, encoding="utf-8") as arquivo:
+            comandos = separar_comandos(arquivo.read())
+        cursor = conn.cursor()
+        for comando in comandos:
+            cursor.execute(comando)
+        cursor.execute("INSERT INTO schema_version (versao, nome) VALUES (%s, %s)", (versao, nome))
+        conn.commit()
+        cursor.close()
+        aplicadas.append(versao)
+    return aplicadas
+
+
+def consultas_views(id, tipo, cidade):
+    """Consultas feitas por views.py que devem usar índice, com parâmetros de exemplo."""
+    return [
+        ("get_imovel_por_id", views.SQL_IMOVEL_POR_ID, (id,)),
+        ("get_imoveis_por_tipo", views.SQL_IMOVEIS_POR_TIPO, (tipo,)),
+        ("get_imoveis_por_cidade", views.SQL_IMOVEIS_POR_CIDADE, (cidade,)),
+        ("pagina_imoveis", *views.consulta_pagina(views.LIMITE_PADRAO_PAGINA, id)),
+        ("pagina_imoveis por tipo", *views.consulta_pagina(views.LIMITE_PADRAO_PAGINA, id, tipo=tipo)),
+        ("pagina_imoveis por cidade", *views.consulta_pagina(views.LIMITE_PADRAO_PAGINA, id, "a", cidade=cidade)),
+        ("busca_imoveis", *views.consulta_busca({"tipo": tipo, "cidade": cidade, "valor_min": 0, "ordenar": "valor"})),
+        ("mudancas_imoveis", *views.consultas_mudancas(0, id, views.LIMITE_MAXIMO_PAGINA)[0]),
+    ]
+
+
+def verificar_indices(conn):
+    """Roda EXPLAIN em cada consulta de views.py.
+
+    Retorna [(nome, indice_usado)]; indice_usado é None quando a consulta
+    faz varredura completa da tabela.
+    """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id, tipo, cidade FROM imoveis LIMIT 1")
+    exemplo = cursor.fetchone()
+    if exemplo is None:
+        cursor.close()
+        raise ValueError("a tabela imoveis está vazia; não há como checar os planos")
+
+    resultado = []
+    for nome, sql, params in consultas_views(exemplo["id"], exemplo["tipo"], exemplo["cidade"]):
+        cursor.execute("EXPLAIN " + sql, params)
+        plano = cursor.fetchall()
+        linha = next((p for p in plano if p.get("table") == "imoveis"), plano[0])
+        indice = linha.get("key") if linha.get("type") != "ALL" else None
+        resultado.append((nome, indice))
+    cursor.close()
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrações do banco de imóveis")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    cmd_upgrade = sub.add_parser("upgrade", help="aplica as migrações pendentes")
+    cmd_upgrade.add_argument("--ate", type=int, help="para nesta versão")
+    sub.add_parser("status", help="mostra a versão atual e as pendentes")
+    sub.add_parser("verificar-indices", help="confere com EXPLAIN se as consultas usam índice")
+    cmd_resumo = sub.add_parser("verificar-resumo", help="compara imoveis_resumo com a tabela imoveis")
+    cmd_resumo.add_argument("--reconstruir", action="store_true", help="recalcula o resumo do zero")
+    args = parser.parse_args(argv)
+
+    from servidor import connect_db
+    conn = connect_db()
+    if not conn:
+        print("Falha na conexão com o banco de dados")
+        return 1
+    if usa_sqlite(conn) and args.comando != "verificar-resumo":
+        print("O backend SQLite usa o esquema_sqlite.sql, aplicado ao abrir o banco; as migrações são do MySQL")
+        conn.close()
+        return 0
+    try:
+        if args.comando == "upgrade":
+            aplicadas = upgrade(conn, args.ate)
+            print(f"Migrações aplicadas: {aplicadas}" if aplicadas else "Nenhuma migração pendente")
+        elif args.comando == "status":
+            atual = versao_atual(conn)
+            pendentes = [versao for versao, _, _ in listar_migracoes() if versao > atual]
+            print(f"Versão atual: {atual}; pendentes: {pendentes}")
+        elif args.comando == "verificar-resumo":
+            if args.reconstruir:
+                views.reconstroi_resumo(conn)
+                print("Resumo reconstruído")
+            divergentes = views.verifica_resumo(conn)
+            for grupo, esperado, atual in divergentes:
+                print(f"{grupo}: esperado {esperado}, no resumo {atual}")
+            print(f"{len(divergentes)} grupos divergentes")
+            return 1 if divergentes else 0
+        else:
+            falhas = 0
+            for nome, indice in verificar_indices(conn):
+                print(f"{nome}: {indice or 'VARREDURA COMPLETA'}")
+                falhas += indice is None
+            return 1 if falhas else 0
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Campos do imóvel e a validação dos dados de escrita.
+
+Não há classe de modelo para as leituras: as linhas viram dicts simples
+(utils.rows_to_imoveis). Uma classe com __slots__ ocupa menos memória, mas
+nenhum dos encoders escreve os slots direto e ela não comporta os z_links
+nem as projeções de ?campos=, então as listagens ficavam mais lentas.
+"""
+import re
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+CAMPOS = ('logradouro', 'tipo_logradouro', 'bairro', 'cidade', 'cep', 'tipo', 'valor', 'data_aquisicao')
+COLUNAS = ('id',) + CAMPOS  # ordem das colunas de SELECT * FROM imoveis
+
+# tamanhos das colunas VARCHAR (migração 001)
+TAMANHOS = {'logradouro': 200, 'tipo_logradouro': 50, 'bairro': 120, 'cidade': 120, 'cep': 10, 'tipo': 50}
+NAO_NULOS = ('logradouro', 'cidade')
+VALOR_MAXIMO = Decimal('999999999999.99')  # DECIMAL(14, 2)
+CENTAVOS = Decimal('0.01')
+RE_CEP = re.compile(r"\d{5}(-?\d{3})?")
+
+
+class DadosInvalidos(ValueError):
+    """Os dados de um imóvel não passaram na validação; `erros` lista todos os problemas."""
+
+    def __init__(self, erros):
+        super().__init__("; ".join(erros))
+        self.erros = erros
+
+
+def imovel_de_dados(id, dados):
+    """O imóvel gravado numa escrita: o id e os campos de `dados` que pertencem ao modelo."""
+    imovel = {"id": id}
+    imovel.update((campo, dados[campo]) for campo in CAMPOS if campo in dados)
+    return imovel
+
+
+def _le_texto(campo, valor):
+    if valor is None:
+        return None, (f"o parâmetro {campo} não pode ser nulo" if campo in NAO_NULOS else None)
+    if not isinstance(valor, str):
+        return None, f"o parâmetro {campo} deve ser texto"
+    if campo in NAO_NULOS and not valor.strip():
+        return None, f"o parâmetro {campo} não pode ser vazio"
+    if len(valor) > TAMANHOS[campo]:
+        return None, f"o parâmetro {campo} deve ter no máximo {TAMANHOS[campo]} caracteres"
+    if campo == 'cep' and not RE_CEP.fullmatch(valor):
+        return None, "o parâmetro cep deve ter o formato 00000-000"
+    return valor, None
+
+def _le_valor(valor):
+    """Decimal com 2 casas, arredondado como o MySQL faz ao gravar em DECIMAL(14, 2)."""
+    if valor is None:
+        return None, None
+    if isinstance(valor, bool) or not isinstance(valor, (int, float, Decimal, str)):
+        return None, "o parâmetro valor deve ser um número"
+    try:
+        numero = Decimal(str(valor).strip())
+    except InvalidOperation:
+        return None, "o parâmetro valor deve ser um número"
+    if numero.is_finite():
+        numero = numero.quantize(CENTAVOS, ROUND_HALF_UP)
+    if not numero.is_finite() or abs(numero) > VALOR_MAXIMO:
+        return None, "o parâmetro valor deve ser um número de até 12 dígitos antes da vírgula"
+    return numero, None
+
+def _le_data(valor):
+    if valor is None:
+        return None, None
+    try:
+        if not isinstance(valor, str) or len(valor) != 10:
+            raise ValueError
+        return date.fromisoformat(valor), None
+    except ValueError:
+        return None, "o parâmetro data_aquisicao deve ser uma data AAAA-MM-DD"
+
+def valida(dados, parcial=False):
+    """Retorna (valores, erros): os campos de `dados` já convertidos para o que
+    o banco grava (valor em Decimal com 2 casas, data_aquisicao em date) e a
+    lista de todos os problemas (vazia se estiver tudo certo).
+
+    Sem `parcial` todos os campos são obrigatórios e chaves extras são
+    ignoradas; com `parcial` (PATCH) só os campos enviados são conferidos e
+    chaves desconhecidas são erro.
+    """
+    if not isinstance(dados, dict):
+        return {}, ["o corpo deve ser um objeto JSON"]
+    valores = {}
+    erros = []
+    if parcial:
+        erros.extend(f"o campo {chave} não existe" for chave in dados if chave not in CAMPOS and chave != 'id')
+        if not any(campo in dados for campo in CAMPOS):
+            erros.append("informe pelo menos um campo para atualizar")
+    for campo in CAMPOS:
+        if campo not in dados:
+            if not parcial:
+                erros.append(f"o parâmetro {campo} está faltando")
+            continue
+        if campo == 'valor':
+            valor, erro = _le_valor(dados[campo])
+        elif campo == 'data_aquisicao':
+            valor, erro = _le_data(dados[campo])
+        else:
+            valor, erro = _le_texto(campo, dados[campo])
+        if erro:
+            erros.append(erro)
+        else:
+            valores[campo] = valor
+    return valores, erros
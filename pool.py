@@ -0,0 +1,303 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from mysql.connector import Error
+
+from armazenamento import ERROS_BANCO
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera do pool."""
+
+
+class PoolConexoes:
+    """Pool de conexões reaproveitadas entre requisições.
+
+    `fabrica` é chamada para abrir uma conexão nova (deve retornar a conexão
+    ou None em caso de falha). O pool mantém no máximo `maximo` conexões
+    abertas, espera até `timeout` segundos por uma conexão livre, testa a
+    conexão ao emprestá-la se ela ficou ociosa por mais de `teste_ocioso`
+    segundos e descarta conexões com mais de `vida_maxima` segundos.
+    """
+
+    def __init__(self, fabrica, minimo=0, maximo=10, timeout=5.0, vida_maxima=1800.0, teste_ocioso=0.0):
+        if maximo < 1 or minimo < 0 or minimo > maximo:
+            raise ValueError("tamanhos do pool inválidos")
+        self.fabrica = fabrica
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.vida_maxima = vida_maxima
+        self.teste_ocioso = teste_ocioso
+
+        self._cond = threading.Condition()
+        self._livres = deque()  # (conn, devolvida_em), a mais recente no fim
+        self._criadas_em = {}
+        self._em_uso = 0
+
+        self.esperas = 0
+        self.timeouts = 0
+        self.criadas = 0
+        self.descartadas = 0
+
+    def _expirada(self, conn, agora):
+        return agora - self._criadas_em.get(conn, agora) > self.vida_maxima
+
+    def _viva(self, conn, devolvida_em, agora):
+        if agora - devolvida_em < self.teste_ocioso:
+            return True
+        try:
+            return bool(conn.is_connected())
+        except ERROS_BANCO:
+            return False
+
+    def _fechar(self, conn):
+        self._criadas_em.pop(conn, None)
+        self.descartadas += 1
+        try:
+            conn.close()
+        except ERROS_BANCO:
+            pass
+
+    def _criar(self):
+        """Abre uma conexão nova; o chamador já reservou a vaga em `_em_uso`."""
+        conn = None
+        try:
+            conn = self.fabrica()
+        finally:
+            if conn is None:
+                with self._cond:
+                    self._em_uso -= 1
+                    self._cond.notify()
+        if conn is not None:
+            self._criadas_em[conn] = time.monotonic()
+            self.criadas += 1
+        return conn
+
+    def emprestar(self):
+        """Retorna uma conexão do pool, abrindo uma nova se houver vaga.
+
+        Levanta PoolEsgotado se nenhuma conexão ficar livre dentro do timeout.
+        """
+        prazo = time.monotonic() + self.timeout
+        esperou = False
+        while True:
+            with self._cond:
+                while not self._livres and self._em_uso >= self.maximo:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        self.timeouts += 1
+                        raise PoolEsgotado("tempo de espera por conexão esgotado")
+                    if not esperou:
+                        esperou = True
+                        self.esperas += 1
+                    self._cond.wait(restante)
+                self._em_uso += 1
+                livre = self._livres.pop() if self._livres else None
+
+            if livre is None:
+                return self._criar()
+
+            conn, devolvida_em = livre
+            agora = time.monotonic()
+            if not self._expirada(conn, agora) and self._viva(conn, devolvida_em, agora):
+                return conn
+            with self._cond:
+                self._em_uso -= 1
+                self._fechar(conn)
+                self._cond.notify()
+
+    def devolver(self, conn, descartar=False):
+        """Devolve uma conexão emprestada, desfazendo transação pendente."""
+        if not descartar:
+            try:
+                if getattr(conn, "in_transaction", False):
+                    conn.rollback()
+            except ERROS_BANCO:
+                descartar = True
+        agora = time.monotonic()
+        with self._cond:
+            self._em_uso -= 1
+            if descartar or self._expirada(conn, agora):
+                self._fechar(conn)
+            else:
+                self._livres.append((conn, agora))
+            self._cond.notify()
+
+    def preencher(self):
+        """Abre conexões até que o pool tenha `minimo` conexões abertas."""
+        while True:
+            with self._cond:
+                if self._em_uso + len(self._livres) >= self.minimo:
+                    return
+                self._em_uso += 1
+            conn = self._criar()
+            if conn is None:
+                return
+            self.devolver(conn)
+
+    def esvaziar(self):
+        """Fecha todas as conexões ociosas."""
+        with self._cond:
+            while self._livres:
+                conn, _ = self._livres.popleft()
+                self._fechar(conn)
+            self._cond.notify_all()
+
+    def estatisticas(self):
+        with self._cond:
+            return {
+                "em_uso": self._em_uso,
+                "livres": len(self._livres),
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "esperas": self.esperas,
+                "timeouts": self.timeouts,
+                "criadas": self.criadas,
+                "descartadas": self.descartadas,
+            }
+
+
+class PoolConexoesAsync:
+    """Versão asyncio do PoolConexoes, para o servidor ASGI (servidor_async.py).
+
+    Mesmos parâmetros e estatísticas; `fabrica` é uma corrotina que retorna a
+    conexão (mysql.connector.aio) ou None em caso de falha.
+    """
+
+    def __init__(self, fabrica, minimo=0, maximo=10, timeout=5.0, vida_maxima=1800.0, teste_ocioso=0.0):
+        if maximo < 1 or minimo < 0 or minimo > maximo:
+            raise ValueError("tamanhos do pool inválidos")
+        self.fabrica = fabrica
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.vida_maxima = vida_maxima
+        self.teste_ocioso = teste_ocioso
+
+        self._cond = None  # criada no primeiro uso, dentro do event loop
+        self._livres = deque()
+        self._criadas_em = {}
+        self._em_uso = 0
+
+        self.esperas = 0
+        self.timeouts = 0
+        self.criadas = 0
+        self.descartadas = 0
+
+    @property
+    def _condicao(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _expirada(self, conn, agora):
+        return agora - self._criadas_em.get(conn, agora) > self.vida_maxima
+
+    async def _viva(self, conn, devolvida_em, agora):
+        if agora - devolvida_em < self.teste_ocioso:
+            return True
+        try:
+            return bool(await conn.is_connected())
+        except Error:
+            return False
+
+    async def _fechar(self, conn):
+        self._criadas_em.pop(conn, None)
+        self.descartadas += 1
+        try:
+            await conn.close()
+        except Error:
+            pass
+
+    async def _liberar_vaga(self):
+        async with self._condicao:
+            self._em_uso -= 1
+            self._condicao.notify()
+
+    async def _criar(self):
+        conn = None
+        try:
+            conn = await self.fabrica()
+        finally:
+            if conn is None:
+                await self._liberar_vaga()
+        if conn is not None:
+            self._criadas_em[conn] = time.monotonic()
+            self.criadas += 1
+        return conn
+
+    async def emprestar(self):
+        """Retorna uma conexão do pool; levanta PoolEsgotado após o timeout."""
+        prazo = time.monotonic() + self.timeout
+        esperou = False
+        while True:
+            async with self._condicao:
+                while not self._livres and self._em_uso >= self.maximo:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        self.timeouts += 1
+                        raise PoolEsgotado("tempo de espera por conexão esgotado")
+                    if not esperou:
+                        esperou = True
+                        self.esperas += 1
+                    try:
+                        await asyncio.wait_for(self._condicao.wait(), restante)
+                    except asyncio.TimeoutError:
+                        pass
+                self._em_uso += 1
+                livre = self._livres.pop() if self._livres else None
+
+            if livre is None:
+                return await self._criar()
+
+            conn, devolvida_em = livre
+            agora = time.monotonic()
+            if not self._expirada(conn, agora) and await self._viva(conn, devolvida_em, agora):
+                return conn
+            await self._fechar(conn)
+            await self._liberar_vaga()
+
+    async def devolver(self, conn, descartar=False):
+        """Devolve uma conexão emprestada, desfazendo transação pendente."""
+        if not descartar:
+            try:
+                if getattr(conn, "in_transaction", False):
+                    await conn.rollback()
+            except Error:
+                descartar = True
+        agora = time.monotonic()
+        if descartar or self._expirada(conn, agora):
+            await self._fechar(conn)
+        else:
+            self._livres.append((conn, agora))
+        await self._liberar_vaga()
+
+    async def preencher(self):
+        """Abre conexões até que o pool tenha `minimo` conexões abertas."""
+        while self._em_uso + len(self._livres) < self.minimo:
+            self._em_uso += 1
+            conn = await self._criar()
+            if conn is None:
+                return
+            await self.devolver(conn)
+
+    async def esvaziar(self):
+        """Fecha todas as conexões ociosas."""
+        while self._livres:
+            conn, _ = self._livres.popleft()
+            await self._fechar(conn)
+
+    def estatisticas(self):
+        return {
+            "em_uso": self._em_uso,
+            "livres": len(self._livres),
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "esperas": self.esperas,
+            "timeouts": self.timeouts,
+            "criadas": self.criadas,
+            "descartadas": self.descartadas,
+        }
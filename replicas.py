@@ -0,0 +1,200 @@
+"""Leituras nas réplicas do banco, escritas no primário.
+
+DB_REPLICAS lista as réplicas (host:porta no MySQL, caminho do arquivo no
+SQLite), cada uma com o seu pool. O servidor manda os GET para uma réplica
+saudável, escolhida por rodízio ou pela que tem menos conexões em uso
+(DB_REPLICAS_BALANCEAMENTO=rodizio|menos_ocupada); sem nenhuma saudável, a
+leitura vai para o primário.
+
+A saúde é conferida a cada DB_REPLICAS_INTERVALO segundos, pela própria
+requisição que encontra a verificação vencida: a réplica sai do rodízio se
+não responde, se a replicação parou ou se o atraso passa de
+DB_REPLICAS_ATRASO_MAXIMO segundos. Um erro de banco numa leitura também a
+tira do rodízio até a próxima verificação.
+
+Depois de uma escrita o cliente recebe o cookie imoveis_escrita, e as suas
+leituras ficam no primário por DB_LEITURA_PRIMARIO_SEGUNDOS: ele sempre lê
+o que acabou de gravar, mesmo que as réplicas ainda não tenham recebido.
+
+O cache de leituras só guarda o que foi lido no primário, para que uma
+leitura atrasada numa réplica não fique valendo para todos os clientes.
+"""
+import itertools
+import os
+import threading
+import time
+
+import armazenamento
+import pool as pool_conexoes
+from armazenamento import ERROS_BANCO, usa_sqlite
+
+COOKIE_ESCRITA = "imoveis_escrita"
+BALANCEAMENTOS = ("rodizio", "menos_ocupada")
+
+
+class ReplicaIndisponivel(Exception):
+    """A leitura falhou na réplica e deve ser refeita no primário."""
+
+
+def marca_replica(conn):
+    """Marca a conexão como de réplica: o que ela lê não entra no cache (veja cache.em_cache)."""
+    if conn is not None:
+        conn.de_replica = True
+    return conn
+
+
+def atraso_replica(conn):
+    """Segundos de atraso da réplica; None se a replicação estiver parada.
+
+    Um servidor que não é réplica (ou um arquivo SQLite) conta como sem
+    atraso: é assim que se testa localmente com duas instâncias independentes.
+    """
+    if usa_sqlite(conn):
+        return 0.0
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except ERROS_BANCO:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL anterior ao 8.0.22
+        estado = cursor.fetchone()
+    finally:
+        cursor.close()
+    if estado is None:
+        return 0.0
+    atraso = estado.get("Seconds_Behind_Source", estado.get("Seconds_Behind_Master"))
+    return None if atraso is None else float(atraso)
+
+
+class Replica:
+    def __init__(self, nome, pool):
+        self.nome = nome
+        self.pool = pool
+        self.saudavel = True
+        self.atraso = None
+        self.erro = None
+        self.verificada_em = None
+        self.leituras = 0
+        self.falhas = 0
+
+    def estatisticas(self):
+        return {
+            "nome": self.nome,
+            "saudavel": self.saudavel,
+            "atraso": self.atraso,
+            "erro": self.erro,
+            "leituras": self.leituras,
+            "falhas": self.falhas,
+            "pool": self.pool.estatisticas(),
+        }
+
+
+class Roteador:
+    """Escolhe a réplica de cada leitura e acompanha a saúde de cada uma."""
+
+    def __init__(self, replicas, balanceamento="rodizio", atraso_maximo=5.0, intervalo=5.0, janela_primario=10.0):
+        if balanceamento not in BALANCEAMENTOS:
+            raise ValueError(f"balanceamento deve ser um de: {', '.join(BALANCEAMENTOS)}")
+        self.replicas = list(replicas)
+        self.balanceamento = balanceamento
+        self.atraso_maximo = atraso_maximo
+        self.intervalo = intervalo
+        self.janela_primario = janela_primario
+        self._rodizio = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self):
+        return bool(self.replicas)
+
+    def fixado_no_primario(self, cookie):
+        """True se o cookie de escrita ainda está dentro da janela de leitura no primário."""
+        if not cookie:
+            return False
+        try:
+            return time.time() - float(cookie) < self.janela_primario
+        except ValueError:
+            return False
+
+    def verificar(self, replica):
+        """Confere se a réplica responde e se o atraso está dentro do limite."""
+        conn = None
+        try:
+            conn = replica.pool.emprestar()
+            if conn is None:
+                raise pool_conexoes.PoolEsgotado("falha ao conectar")
+            atraso = atraso_replica(conn)
+        except (pool_conexoes.PoolEsgotado, *ERROS_BANCO) as e:
+            if conn is not None:
+                replica.pool.devolver(conn, descartar=True)
+            replica.saudavel, replica.atraso, replica.erro = False, None, str(e)
+            return False
+        replica.pool.devolver(conn)
+        replica.atraso = atraso
+        if atraso is None:
+            replica.saudavel, replica.erro = False, "replicação parada"
+        elif atraso > self.atraso_maximo:
+            replica.saudavel, replica.erro = False, f"atraso de {atraso:.0f}s"
+        else:
+            replica.saudavel, replica.erro = True, None
+        return replica.saudavel
+
+    def _verificacoes_vencidas(self):
+        agora = time.monotonic()
+        vencidas = []
+        with self._lock:
+            for replica in self.replicas:
+                if replica.verificada_em is None or agora - replica.verificada_em >= self.intervalo:
+                    replica.verificada_em = agora  # só uma requisição faz cada verificação
+                    vencidas.append(replica)
+        for replica in vencidas:
+            self.verificar(replica)
+
+    def escolher(self):
+        """Réplica para a próxima leitura, ou None para ler do primário."""
+        self._verificacoes_vencidas()
+        saudaveis = [replica for replica in self.replicas if replica.saudavel]
+        if not saudaveis:
+            return None
+        if self.balanceamento == "menos_ocupada":
+            replica = min(saudaveis, key=lambda r: r.pool.estatisticas()["em_uso"])
+        else:
+            replica = saudaveis[next(self._rodizio) % len(saudaveis)]
+        replica.leituras += 1
+        return replica
+
+    def marcar_falha(self, replica, erro):
+        """Tira a réplica do rodízio até a próxima verificação."""
+        with self._lock:
+            replica.saudavel = False
+            replica.erro = str(erro)
+            replica.falhas += 1
+            replica.verificada_em = time.monotonic()
+
+    def estatisticas(self):
+        return [replica.estatisticas() for replica in self.replicas]
+
+
+def bancos_replicas(config):
+    """(nome, banco) de cada réplica em DB_REPLICAS, no backend de DB_BACKEND."""
+    nomes = [nome.strip() for nome in os.getenv("DB_REPLICAS", "").split(",") if nome.strip()]
+    backend = os.getenv("DB_BACKEND", "mysql")
+    bancos = []
+    for nome in nomes:
+        if backend == "sqlite":
+            bancos.append((nome, armazenamento.BancoSQLite(nome)))
+        else:
+            host, _, porta = nome.partition(":")
+            bancos.append((nome, armazenamento.BancoMySQL(dict(config, host=host, port=int(porta or config["port"])))))
+    return bancos
+
+
+def cria_roteador(config, cria_pool):
+    """Roteador das réplicas em DB_REPLICAS; `cria_pool(banco)` abre o pool de cada uma."""
+    return Roteador(
+        [Replica(nome, cria_pool(banco)) for nome, banco in bancos_replicas(config)],
+        balanceamento=os.getenv("DB_REPLICAS_BALANCEAMENTO", "rodizio"),
+        atraso_maximo=float(os.getenv("DB_REPLICAS_ATRASO_MAXIMO", 5)),
+        intervalo=float(os.getenv("DB_REPLICAS_INTERVALO", 5)),
+        janela_primario=float(os.getenv("DB_LEITURA_PRIMARIO_SEGUNDOS", 10)),
+    )
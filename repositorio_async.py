@@ -0,0 +1,155 @@
+"""Versões assíncronas (mysql.connector.aio) das consultas de views.py.
+
+O SQL e a montagem dos resultados vêm de views.py; aqui só muda a forma de
+falar com o banco, então os dois servidores respondem igual.
+"""
+import utils
+import cache
+import views
+from views import VersaoDivergente
+import modelos
+from modelos import DadosInvalidos, imovel_de_dados
+
+
+async def _consulta(conn, sql, params=(), uma=False):
+    cursor = await conn.cursor()
+    try:
+        await cursor.execute(sql, params)
+        if uma:
+            return await cursor.fetchone()
+        return await cursor.fetchall()
+    finally:
+        await cursor.close()
+
+async def _consulta_com_nomes(conn, sql, params, campos):
+    """Como _consulta, retornando também os nomes das colunas (utils.nomes_colunas)."""
+    cursor = await conn.cursor()
+    try:
+        await cursor.execute(sql, params)
+        rows = await cursor.fetchall()
+        return rows, utils.nomes_colunas(cursor, campos)
+    finally:
+        await cursor.close()
+
+async def _consulta_imoveis(conn, sql, params, campos):
+    rows, nomes = await _consulta_com_nomes(conn, sql, params, campos)
+    return utils.rows_to_imoveis(rows, nomes)
+
+async def listar_imoveis(conn, campos=None):
+    return await _consulta_imoveis(conn, views.projeta("SELECT * FROM imoveis", campos), (), campos)
+
+async def pagina_imoveis(conn, limite, cursor_pagina=None, tipo=None, cidade=None, campos=None):
+    limite = min(limite, views.LIMITE_MAXIMO_PAGINA)
+    id_cursor, direcao = None, "p"
+    if cursor_pagina is not None:
+        id_cursor, direcao = utils.decodifica_cursor(cursor_pagina)
+    sql, params = views.consulta_pagina(limite, id_cursor, direcao, tipo, cidade, campos)
+    rows, nomes = await _consulta_com_nomes(conn, sql, params, campos)
+    return views.resultado_pagina(rows, limite, direcao, cursor_pagina, nomes)
+
+async def busca_imoveis(conn, filtros):
+    return await _consulta_imoveis(conn, *views.consulta_busca(filtros), filtros.get('campos'))
+
+async def busca_texto(conn, q, limite, cursor_pagina=None, campos=None):
+    limite = min(limite, views.LIMITE_MAXIMO_PAGINA)
+    sql, params, deslocamento = views.consulta_busca_texto(q, limite, cursor_pagina, campos)
+    rows, nomes = await _consulta_com_nomes(conn, sql, params, campos)
+    return views.resultado_texto(rows, limite, deslocamento, nomes)
+
+async def estatisticas(conn, agrupar, cidade=None, tipo=None):
+    consulta_resumo, consulta_faixas = views.consultas_estatisticas(agrupar, cidade, tipo)
+    resumos = await _consulta(conn, *consulta_resumo)
+    linhas_faixas = await _consulta(conn, *consulta_faixas)
+    return views.resultado_estatisticas(agrupar, resumos, linhas_faixas)
+
+@cache.em_cache_async("imovel", lambda encontrado, id, campos=None: [cache.tag_id(id)])
+async def buscar_imovel(conn, id, campos=None):
+    rows, nomes = await _consulta_com_nomes(conn, views.projeta(views.SQL_IMOVEL_POR_ID, campos), (id,), campos)
+    if not rows:
+        return None
+    if nomes is not None:
+        return dict(zip(nomes, rows[0])), None
+    return utils.row_to_imovel(rows[0]), utils.row_versao(rows[0])
+
+async def get_imovel_por_id(conn, id, campos=None):
+    encontrado = await buscar_imovel(conn, id, campos)
+    if encontrado is None:
+        return None
+    return encontrado[0]
+
+async def versao_imovel(conn, id):
+    row = await _consulta(conn, "SELECT versao, atualizado_em FROM imoveis WHERE id=%s", (id,), uma=True)
+    return tuple(row) if row else None
+
+@cache.em_cache_async("tipo", lambda imoveis, tipo, campos=None: views._tags_listagem(imoveis, cache.tag_tipo(tipo)))
+async def get_imoveis_por_tipo(conn, tipo, campos=None):
+    return await _consulta_imoveis(conn, views.projeta(views.SQL_IMOVEIS_POR_TIPO, campos), (tipo,), campos)
+
+@cache.em_cache_async("cidade", lambda imoveis, cidade, campos=None: views._tags_listagem(imoveis, cache.tag_cidade(cidade)))
+async def get_imoveis_por_cidade(conn, cidade, campos=None):
+    return await _consulta_imoveis(conn, views.projeta(views.SQL_IMOVEIS_POR_CIDADE, campos), (cidade,), campos)
+
+async def cria_imovel_db(conn, dados):
+    """Mesmo contrato de views.cria_imovel_db."""
+    valores, erros = modelos.valida(dados)
+    if erros:
+        raise DadosInvalidos(erros)
+    cursor = await conn.cursor()
+    try:
+        await cursor.execute(views.SQL_INSERE_IMOVEL, tuple(valores[c] for c in views.CAMPOS_IMOVEL))
+        novo_id = cursor.lastrowid
+        await conn.commit()
+    finally:
+        await cursor.close()
+    await cache.invalidar_async(cache.tag_id(novo_id), cache.tag_tipo(valores["tipo"]), cache.tag_cidade(valores["cidade"]))
+    return imovel_de_dados(novo_id, valores)
+
+async def _executa_escrita(conn, sql, params):
+    """Executa um UPDATE/DELETE e retorna o número de linhas afetadas."""
+    cursor = await conn.cursor()
+    try:
+        await cursor.execute(sql, params)
+        return cursor.rowcount
+    finally:
+        await cursor.close()
+
+async def _nao_encontrado(conn, id, versao_esperada):
+    if versao_esperada is None or await versao_imovel(conn, id) is None:
+        return True
+    raise VersaoDivergente(id)
+
+async def atualiza_imovel(conn, id, data, versao_esperada=None):
+    """Mesmo contrato de views.atualiza_imovel."""
+    valores, erros = modelos.valida(data)
+    if erros:
+        raise DadosInvalidos(erros)
+    sql = views.SQL_ATUALIZA_IMOVEL
+    params = tuple(valores[campo] for campo in views.CAMPOS_IMOVEL) + (id,)
+    if versao_esperada is not None:
+        sql = views.SQL_ATUALIZA_IMOVEL.rstrip() + " AND versao=%s"
+        params += (versao_esperada,)
+    if await _executa_escrita(conn, sql, params) == 0 and await _nao_encontrado(conn, id, versao_esperada):
+        return None
+    await conn.commit()
+    await cache.invalidar_async(*views._tags_escrita(id, valores))
+    return imovel_de_dados(id, valores)
+
+async def atualiza_parcial_imovel(conn, id, data, versao_esperada=None):
+    """Mesmo contrato de views.atualiza_parcial_imovel."""
+    sql, params, valores = views.consulta_atualizacao_parcial(id, data, versao_esperada)
+    if await _executa_escrita(conn, sql, params) == 0 and await _nao_encontrado(conn, id, versao_esperada):
+        return None
+    await conn.commit()
+    await cache.invalidar_async(*views._tags_escrita(id, valores))
+    return imovel_de_dados(id, valores)
+
+async def delete_imovel(conn, id, versao_esperada=None):
+    """Mesmo contrato de views.delete_imovel."""
+    sql, params = "DELETE FROM imoveis WHERE id=%s", (id,)
+    if versao_esperada is not None:
+        sql, params = "DELETE FROM imoveis WHERE id=%s AND versao=%s", (id, versao_esperada)
+    if await _executa_escrita(conn, sql, params) == 0 and await _nao_encontrado(conn, id, versao_esperada):
+        return False
+    await conn.commit()
+    await cache.invalidar_async(cache.tag_id(id))
+    return True
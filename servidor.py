@@ -1,8 +1,20 @@
-from flask import Flask, jsonify, request, url_for, make_response
+from flask import Flask, Response, abort, g, jsonify, request, url_for, make_response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from functools import wraps
+from datetime import datetime, timezone
+import time
 import views
-import mysql.connector
-from mysql.connector import Error
+import admissao
+import armazenamento
+import pool as pool_conexoes
+import replicas
+import cache
+import compressao
+import consultas_lentas
+import exportar
+import metricas
+import utils
+from mysql.connector.constants import ClientFlag
 from dotenv import load_dotenv
 import os
 
@@ -14,74 +26,417 @@ config = {
     'password': os.getenv('DB_PASSWORD'),  
     'database': os.getenv('DB_NAME', 'db_escola'),  
     'port': int(os.getenv('DB_PORT', 3306)),  
-    'ssl_ca': os.getenv('SSL_CA_PATH')  
+    'ssl_ca': os.getenv('SSL_CA_PATH'),  
+    'time_zone': '+00:00',
+    # rowcount de UPDATE conta as linhas encontradas, mesmo sem mudança de valor
+    'client_flags': [ClientFlag.FOUND_ROWS]
 }
 
-def connect_db():
-    """Estabelece a conexão com o banco de dados usando as configurações fornecidas."""
+# MySQL com `config` ou SQLite embutido, conforme DB_BACKEND
+banco = armazenamento.cria_banco(config)
+
+def connect_db(destino=None):
+    """Estabelece a conexão com o banco de dados (o primário, ou `destino`, uma réplica)."""
     try:
-        conn = mysql.connector.connect(**config)
-        if conn.is_connected():
-            return conn
-    except Error as err:
+        return (destino or banco).conectar()
+    except armazenamento.ERROS_BANCO as err:
         print(f"Erro: {err}")
         return None
 
+def cria_pool(fabrica):
+    return pool_conexoes.PoolConexoes(
+        fabrica,
+        minimo=int(os.getenv('DB_POOL_MIN', 0)),
+        maximo=int(os.getenv('DB_POOL_MAX', 10)),
+        timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+        vida_maxima=float(os.getenv('DB_POOL_VIDA_MAXIMA', 1800)),
+        teste_ocioso=float(os.getenv('DB_POOL_TESTE_OCIOSO', 0))
+    )
+
+# o primário recebe as escritas; as leituras vão para as réplicas de DB_REPLICAS, se houver
+pool = cria_pool(lambda: connect_db())
+roteador = replicas.cria_roteador(config, lambda banco_replica: cria_pool(lambda: replicas.marca_replica(connect_db(banco_replica))))
+# limita quantas requisições usam o banco ao mesmo tempo; o resto espera na fila ou recebe 503
+controle_admissao = admissao.cria_controle()
+
+class ImoveisJSONProvider(DefaultJSONProvider):
+    """Serializa DATE como 'AAAA-MM-DD' e DECIMAL como número, como era com as colunas TEXT/REAL."""
+
+    @staticmethod
+    def default(o):
+        try:
+            return utils.json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
+class ImoveisJSONProviderRapido(ImoveisJSONProvider):
+    """Mesma saída do ImoveisJSONProvider, gerada pelo orjson.
+
+    Só as chamadas no formato compacto das respostas usam o orjson; as demais
+    (indentação do modo debug, separadores padrão) e o que o orjson recusa
+    continuam no json da biblioteca padrão.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs == {"separators": (",", ":")} and self.sort_keys and self.ensure_ascii:
+            try:
+                return utils.json_rapido(obj)
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+PROVEDORES_JSON = {'padrao': ImoveisJSONProvider, 'orjson': ImoveisJSONProviderRapido}
+
+def provedor_json():
+    """Escolhe o provedor pela variável JSON_PROVIDER (orjson por padrão, se instalado)."""
+    nome = os.getenv('JSON_PROVIDER', 'orjson' if utils.orjson is not None else 'padrao')
+    if nome == 'orjson' and utils.orjson is None:
+        raise RuntimeError("JSON_PROVIDER=orjson requer o pacote orjson")
+    return PROVEDORES_JSON[nome]
+
 app = Flask(__name__)
+app.json = provedor_json()(app)
+
+@app.before_request
+def inicia_cronometro():
+    g.inicio = time.perf_counter()
+
+@app.after_request
+def registra_requisicao(resposta):
+    """Conta a requisição e o tempo até os cabeçalhos, pelo molde da rota (/imoveis/<int:id>)."""
+    rota = request.url_rule.rule if request.url_rule else "nao_encontrada"
+    metricas.requisicoes.inc(rota, request.method, resposta.status_code)
+    if 'inicio' in g:
+        metricas.duracao_requisicao.observa(time.perf_counter() - g.inicio, rota, request.method)
+    return resposta
+
+@app.after_request
+def comprime_resposta(resposta):
+    return compressao.aplica(resposta, compressao.escolhe(request.accept_encodings))
+
+METODOS_LEITURA = ('GET', 'HEAD')
+
+def leitura_em_replica():
+    """Réplica para esta requisição: só GET/HEAD, e não logo depois de uma escrita do mesmo cliente."""
+    if not roteador.ativo or request.method not in METODOS_LEITURA:
+        return None
+    if roteador.fixado_no_primario(request.cookies.get(replicas.COOKIE_ESCRITA)):
+        return None
+    return roteador.escolher()
+
+def com_conexao(origem, f, args, kwargs, na_replica=False):
+    """Chama f(conn, ...) com uma conexão de `origem` e a devolve no fim.
+
+    Na réplica os erros de banco levantam ReplicaIndisponivel (a conexão é
+    descartada) para a leitura ser refeita no primário; no primário viram
+    respostas 500/503.
+    """
+    conn = None
+    try:
+        inicio = time.perf_counter()
+        conn = origem.emprestar()
+        metricas.conexao_banco.observa(time.perf_counter() - inicio)
+        if not conn:
+            if na_replica:
+                raise replicas.ReplicaIndisponivel("falha na conexão com a réplica")
+            return jsonify({"erro": "Falha na conexão com o banco de dados"}), 500
+        resposta = f(conn, *args, **kwargs)
+        if getattr(resposta, 'is_streamed', False):
+            # a conexão só volta ao pool quando o corpo terminar de ser enviado
+            resposta.call_on_close(lambda c=conn: origem.devolver(c))
+            conn = None
+        return resposta
+    except (pool_conexoes.PoolEsgotado, *armazenamento.ERROS_BANCO) as e:
+        if na_replica:
+            if conn:
+                origem.devolver(conn, descartar=True)
+                conn = None
+            raise replicas.ReplicaIndisponivel(str(e)) from e
+        if isinstance(e, pool_conexoes.PoolEsgotado):
+            return jsonify({"erro": "Nenhuma conexão com o banco de dados disponível"}), 503
+        return jsonify({"erro": f"Erro no banco de dados: {e}"}), 500
+    finally:
+        if conn:
+            origem.devolver(conn)
+
+# listagens sem limite: as primeiras a esperar (e a serem descartadas) quando o banco está cheio
+LISTAGENS_COMPLETAS = ('listar_imoveis', 'get_imoveis_por_tipo', 'get_imoveis_por_cidade')
+
+def prioridade_requisicao():
+    """Escritas e GET por id primeiro; listagens completas e exportação por último."""
+    if request.method not in METODOS_LEITURA or 'id' in (request.view_args or {}):
+        return admissao.ALTA
+    if request.endpoint == 'exportar_imoveis':
+        return admissao.BAIXA
+    if request.endpoint in LISTAGENS_COMPLETAS and not pedido_paginado():
+        return admissao.BAIXA
+    return admissao.NORMAL
+
+def acessa_banco(f, args, kwargs):
+    replica = leitura_em_replica()
+    if replica is not None:
+        try:
+            return com_conexao(replica.pool, f, args, kwargs, na_replica=True)
+        except replicas.ReplicaIndisponivel as e:
+            roteador.marcar_falha(replica, e)
+    return com_conexao(pool, f, args, kwargs)
 
 def db_connection_handler(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        conn = None
         try:
-            conn = connect_db()
-            if not conn:
-                return jsonify({"erro": "Falha na conexão com o banco de dados"}), 500
-            return f(conn, *args, **kwargs)
-        except Error as e:
-            return jsonify({"erro": f"Erro no banco de dados: {e}"}), 500
+            espera = controle_admissao.entrar(prioridade_requisicao())
+        except admissao.Sobrecarga as e:
+            resposta = jsonify({"erro": "Servidor sobrecarregado, tente novamente em instantes"})
+            resposta.headers['Retry-After'] = str(e.retry_after)
+            return resposta, 503
+        metricas.espera_admissao.observa(espera)
+        inicio = time.perf_counter()
+        liberar = True
+        try:
+            resposta = acessa_banco(f, args, kwargs)
+            if getattr(resposta, 'is_streamed', False):
+                # como a conexão, a vaga só é liberada quando o corpo terminar de ser enviado
+                resposta.call_on_close(lambda: controle_admissao.sair(time.perf_counter() - inicio))
+                liberar = False
+            return resposta
         finally:
-            if conn and conn.is_connected():
-                conn.close()
+            if liberar:
+                controle_admissao.sair(time.perf_counter() - inicio)
+    return decorated_function
+
+@app.after_request
+def fixa_leituras_no_primario(resposta):
+    """Depois de uma escrita bem-sucedida, marca o cliente para ler do primário por um tempo."""
+    if roteador.ativo and request.method not in METODOS_LEITURA and resposta.status_code < 400:
+        resposta.set_cookie(replicas.COOKIE_ESCRITA, repr(time.time()), max_age=int(roteador.janela_primario) + 1,
+                            httponly=True, samesite='Lax')
+    return resposta
+
+def em_utc(momento):
+    """As colunas TIMESTAMP são lidas em UTC (time_zone da conexão)."""
+    if not isinstance(momento, datetime):
+        return None
+    return momento.replace(tzinfo=momento.tzinfo or timezone.utc)
+
+def pedido_condicional():
+    return 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+
+def nao_modificado(etag, modificado_em):
+    """Avalia If-None-Match e If-Modified-Since; o primeiro tem precedência."""
+    if 'If-None-Match' in request.headers:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and modificado_em:
+        return modificado_em.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def com_validadores(resposta, etag, modificado_em):
+    resposta.set_etag(etag)
+    if modificado_em:
+        resposta.last_modified = modificado_em
+    return resposta
+
+def etag_imovel(id, versao):
+    return f"{id}-{versao[0]}"
+
+def versao_if_match(id):
+    """Versão exigida pelo If-Match, ou None se a escrita não é condicional."""
+    if 'If-Match' not in request.headers or request.if_match.star_tag:
+        return None
+    for etag in request.if_match.as_set():
+        prefixo, _, numero = etag.partition('-')
+        if prefixo == str(id) and numero.isdigit():
+            return int(numero)
+    raise views.VersaoDivergente(id)
+
+def colecao_condicional(f):
+    """Usa a versão global da tabela como ETag/Last-Modified das listagens e responde 304 quando nada mudou.
+
+    Com compressão, o corpo comprimido fica em compressao.corpos_colecao com a
+    URL e o ETag (que traz a versão) na chave: repetir o pedido sem escritas
+    no meio não serializa nem comprime de novo.
+    """
+    @wraps(f)
+    def decorated_function(conn, *args, **kwargs):
+        versao = views.versao_colecao(conn)
+        if not versao:
+            return f(conn, *args, **kwargs)
+        etag = f"c{versao[0]}"
+        if request.accept_mimetypes.best == 'application/x-ndjson':
+            etag += "-ndjson"
+        # só valores já validados entram no ETag: o texto cru pode ter aspas
+        if 'links' in request.args:
+            etag += "-" + modo_links()
+        if 'campos' in request.args:
+            etag += "-" + ".".join(campos_pedido())
+        modificado_em = em_utc(versao[1])
+        if nao_modificado(etag, modificado_em):
+            return com_validadores(make_response('', 304), etag, modificado_em)
+        codificacao = compressao.escolhe(request.accept_encodings)
+        chave = (request.url, etag, codificacao)
+        if codificacao:
+            achou, guardada = compressao.corpos_colecao.obter(chave)
+            if achou:
+                corpo, mimetype, codificada = guardada
+                resposta = com_validadores(Response(corpo, mimetype=mimetype), etag, modificado_em)
+                resposta.vary.add('Accept-Encoding')
+                return compressao.marca(resposta, codificacao) if codificada else resposta
+        resposta = make_response(f(conn, *args, **kwargs))
+        if resposta.status_code == 200:
+            com_validadores(resposta, etag, modificado_em)
+            if codificacao and not resposta.is_streamed:
+                compressao.aplica(resposta, codificacao)
+                codificada = 'Content-Encoding' in resposta.headers
+                compressao.corpos_colecao.guardar(chave, (resposta.get_data(), resposta.mimetype, codificada))
+        return resposta
     return decorated_function
 
+MODOS_LINKS = ('none', 'self', 'full')
+
+def modo_links(padrao='self'):
+    """O ?links= pedido, ou 400 se não for um de MODOS_LINKS."""
+    modo = request.args.get('links', padrao)
+    if modo not in MODOS_LINKS:
+        abort(make_response(jsonify({"Erro": "links deve ser none, self ou full"}), 400))
+    return modo
+
+def gerador_links(padrao='self'):
+    """Retorna uma função id -> z_links, ou None com ?links=none.
+
+    O url_for roda uma vez por requisição para montar os modelos; cada linha
+    só concatena o id. ?links=self|full escolhe entre só o self e o conjunto
+    completo (self, update, delete, collection).
+    """
+    modo = modo_links(padrao)
+    if modo == 'none':
+        return None
+    prefixo = url_for('get_imovel_por_id', id=0, _external=True)[:-1]
+    if modo == 'self':
+        return lambda id: {'self': {'href': f"{prefixo}{id}", 'method': 'GET'}}
+    colecao = {'href': url_for('listar_imoveis', _external=True), 'method': 'GET'}
+
+    def completo(id):
+        href = f"{prefixo}{id}"
+        return {
+            'self': {'href': href, 'method': 'GET'},
+            'update': {'href': href, 'method': 'PUT'},
+            'delete': {'href': href, 'method': 'DELETE'},
+            'collection': dict(colecao)
+        }
+    return completo
+
+def campos_pedido():
+    """Colunas pedidas em ?campos= (validadas por views.le_campos), ou None."""
+    try:
+        return views.le_campos(request.args.get('campos'))
+    except ValueError as e:
+        abort(make_response(jsonify({"Erro": str(e)}), 400))
+
+def com_links(imoveis, links):
+    if links is not None:
+        for imovel in imoveis:
+            imovel['z_links'] = links(imovel['id'])
+    return imoveis
+
+def pedido_streaming():
+    if request.args.get('stream') == '1':
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def listagem_streaming(conn, **filtros):
+    """Envia a listagem completa aos poucos, como array JSON ou NDJSON."""
+    ndjson = request.accept_mimetypes.best == 'application/x-ndjson'
+
+    links = gerador_links()
+    campos = campos_pedido()
+
+    def itens():
+        for lote in views.iter_imoveis(conn, campos=campos, **filtros):
+            # mesmo formato compacto das outras respostas (e o caminho rápido do orjson)
+            yield [app.json.dumps(imovel, separators=(",", ":")) for imovel in com_links(lote, links)]
+
+    def corpo_ndjson():
+        for lote in itens():
+            yield "\n".join(lote) + "\n"
+
+    def corpo_json():
+        yield "["
+        primeiro = True
+        for lote in itens():
+            yield ("" if primeiro else ",") + ",".join(lote)
+            primeiro = False
+        yield "]"
+
+    if ndjson:
+        return Response(stream_with_context(corpo_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(corpo_json()), mimetype='application/json')
+
+def pedido_paginado():
+    return 'limite' in request.args or 'apos' in request.args
+
+def listagem_paginada(conn, endpoint, **filtros):
+    """Responde uma página da listagem, com links next/prev em z_links."""
+    try:
+        limite = int(request.args.get('limite', views.LIMITE_PADRAO_PAGINA))
+        if limite < 1:
+            raise ValueError
+        pagina = views.pagina_imoveis(conn, limite, request.args.get('apos'), campos=campos_pedido(), **filtros)
+    except ValueError:
+        return jsonify({"Erro": "parâmetros de paginação inválidos"}), 400
+    limite = min(limite, views.LIMITE_MAXIMO_PAGINA)
+    com_links(pagina['imoveis'], gerador_links())
+
+    opcoes = {'links': request.args.get('links'), 'campos': request.args.get('campos')}
+    z_links = {'self': {'href': url_for(endpoint, limite=limite, apos=request.args.get('apos'), _external=True, **opcoes, **filtros), 'method': 'GET'}}
+    if pagina['proximo']:
+        z_links['next'] = {'href': url_for(endpoint, limite=limite, apos=pagina['proximo'], _external=True, **opcoes, **filtros), 'method': 'GET'}
+    if pagina['anterior']:
+        z_links['prev'] = {'href': url_for(endpoint, limite=limite, apos=pagina['anterior'], _external=True, **opcoes, **filtros), 'method': 'GET'}
+    return jsonify({'imoveis': pagina['imoveis'], 'z_links': z_links})
+
 @app.route("/imoveis", methods=["GET"])
 @db_connection_handler
+@colecao_condicional
 def listar_imoveis(conn):
-    imoveis = views.listar_imoveis(conn)
-    for imovel in imoveis:
-        imovel['z_links'] = {
-            'self': {
-                'href': url_for('get_imovel_por_id', id=imovel['id'], _external=True), 'method': 'GET'
-            }
-        }
-    return jsonify(imoveis)
+    if pedido_streaming():
+        return listagem_streaming(conn)
+    if pedido_paginado():
+        return listagem_paginada(conn, 'listar_imoveis')
+    imoveis = views.listar_imoveis(conn, campos_pedido())
+    return jsonify(com_links(imoveis, gerador_links()))
     
 
 @app.route("/imoveis/<int:id>", methods=["GET"])
 @db_connection_handler
 def get_imovel_por_id(conn, id):
-    imovel = views.get_imovel_por_id(conn, id)
-    if imovel is None:
+    campos = campos_pedido()
+    if campos is None and pedido_condicional():
+        versao = views.versao_imovel(conn, id)
+        if versao and nao_modificado(etag_imovel(id, versao), em_utc(versao[1])):
+            return com_validadores(make_response('', 304), etag_imovel(id, versao), em_utc(versao[1]))
+
+    encontrado = views.buscar_imovel(conn, id, campos)
+    if encontrado is None:
         return jsonify({"mensagem": "imóvel não encontrado"}), 404
-    
-    imovel['z_links'] = {
-        'self': {'href': url_for('get_imovel_por_id', id=id, _external=True), 'method': 'GET'},
-        'update': {'href': url_for('atualiza_imoveis', id=id, _external=True), 'method': 'PUT'},
-        'delete': {'href': url_for('delete_imovel', id=id, _external=True), 'method': 'DELETE'},
-        'collection': {'href': url_for('listar_imoveis', _external=True), 'method': 'GET'}
-    }
-    
-    return jsonify(imovel)
+    imovel, versao = encontrado
+    links = gerador_links('full')
+    if links is not None:
+        imovel['z_links'] = links(id)
+
+    resposta = jsonify(imovel)
+    if versao:
+        com_validadores(resposta, etag_imovel(id, versao), em_utc(versao[1]))
+    return resposta
         
 @app.route("/imoveis", methods=["POST"])
 @db_connection_handler
 def cria_imovel(conn):
-    dados = request.get_json()
-    imovel_criado = views.cria_imovel_db(conn, dados)
-    if len(imovel_criado) == 1:
-        return jsonify({"Erro": f"o parâmetro {imovel_criado[0]} está faltando"}), 400
-    
+    try:
+        imovel_criado = views.cria_imovel_db(conn, request.get_json(silent=True))
+    except views.DadosInvalidos as e:
+        return jsonify({"Erro": e.erros}), 400
+
+
     location_url = url_for('get_imovel_por_id', id=imovel_criado['id'], _external=True)
 
     imovel_criado['z_links'] = {'self': {'href': location_url, 'method': 'GET'}}
@@ -90,52 +445,276 @@ def cria_imovel(conn):
     response.headers['Location'] = location_url
     return response
 
+@app.route("/imoveis/busca", methods=["GET"])
+@db_connection_handler
+@colecao_condicional
+def busca_imoveis(conn):
+    filtros, erros = views.le_filtros_busca(request.args)
+    if erros:
+        return jsonify({"Erro": erros}), 400
+    imoveis = views.busca_imoveis(conn, filtros)
+    return jsonify(com_links(imoveis, gerador_links()))
+
+@app.route("/imoveis/texto", methods=["GET"])
+@db_connection_handler
+@colecao_condicional
+def busca_texto(conn):
+    q = request.args.get('q', '')
+    try:
+        limite = int(request.args.get('limite', views.LIMITE_PADRAO_PAGINA))
+        if limite < 1:
+            raise ValueError("limite deve ser um inteiro positivo")
+        pagina = views.busca_texto(conn, q, limite, request.args.get('apos'), campos_pedido())
+    except ValueError as e:
+        return jsonify({"Erro": str(e)}), 400
+    limite = min(limite, views.LIMITE_MAXIMO_PAGINA)
+
+    com_links(pagina['imoveis'], gerador_links())
+    opcoes = {'links': request.args.get('links'), 'campos': request.args.get('campos')}
+    z_links = {'self': {'href': url_for('busca_texto', q=q, limite=limite, apos=request.args.get('apos'), _external=True, **opcoes), 'method': 'GET'}}
+    if pagina['proximo']:
+        z_links['next'] = {'href': url_for('busca_texto', q=q, limite=limite, apos=pagina['proximo'], _external=True, **opcoes), 'method': 'GET'}
+    if pagina['anterior']:
+        z_links['prev'] = {'href': url_for('busca_texto', q=q, limite=limite, apos=pagina['anterior'], _external=True, **opcoes), 'method': 'GET'}
+    return jsonify({'imoveis': pagina['imoveis'], 'z_links': z_links})
+
+@app.route("/imoveis/estatisticas", methods=["GET"])
+@db_connection_handler
+@colecao_condicional
+def estatisticas_imoveis(conn):
+    agrupar = [coluna for coluna in request.args.get('agrupar', 'cidade').split(',') if coluna]
+    try:
+        resultado = views.estatisticas(conn, agrupar, request.args.get('cidade'), request.args.get('tipo'))
+    except ValueError as e:
+        return jsonify({"Erro": str(e)}), 400
+    return jsonify(resultado)
+
 @app.route("/imoveis/tipo/<tipo>", methods=["GET"])
 @db_connection_handler
+@colecao_condicional
 def get_imoveis_por_tipo(conn, tipo):
-    imoveis = views.get_imoveis_por_tipo(conn, tipo)
-    for imovel in imoveis:
-        imovel['z_links'] = {'self':{'href': url_for('get_imovel_por_id', id=imovel['id'], _external=True),'method': 'GET'}}
-    
-    return jsonify(imoveis)
+    if pedido_streaming():
+        return listagem_streaming(conn, tipo=tipo)
+    if pedido_paginado():
+        return listagem_paginada(conn, 'get_imoveis_por_tipo', tipo=tipo)
+    imoveis = views.get_imoveis_por_tipo(conn, tipo, campos_pedido())
+    return jsonify(com_links(imoveis, gerador_links()))
 
 
 
 @app.route("/imoveis/cidade/<cidade>", methods=["GET"])
 @db_connection_handler
+@colecao_condicional
 def get_imoveis_por_cidade(conn, cidade):
-    imoveis = views.get_imoveis_por_cidade(conn, cidade)
-    for imovel in imoveis:
-        imovel['z_links'] = {'self': {'href': url_for('get_imovel_por_id', id=imovel['id'], _external=True),'method': 'GET'}}
-    return jsonify(imoveis)
+    if pedido_streaming():
+        return listagem_streaming(conn, cidade=cidade)
+    if pedido_paginado():
+        return listagem_paginada(conn, 'get_imoveis_por_cidade', cidade=cidade)
+    imoveis = views.get_imoveis_por_cidade(conn, cidade, campos_pedido())
+    return jsonify(com_links(imoveis, gerador_links()))
+
+
+@app.route("/imoveis/exportar", methods=["GET"])
+@db_connection_handler
+def exportar_imoveis(conn):
+    """Exporta os imóveis filtrados (mesmos filtros de /imoveis/busca, sem limite) em streaming."""
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in exportar.FORMATOS:
+        return jsonify({"Erro": f"formato deve ser um de: {', '.join(exportar.FORMATOS)}"}), 400
+    if not exportar.disponivel(formato):
+        return jsonify({"Erro": "o formato parquet requer o pacote pyarrow no servidor"}), 501
+    filtros, erros = views.le_filtros_busca(request.args)
+    if erros:
+        return jsonify({"Erro": erros}), 400
+    tipo = exportar.FORMATOS[formato]
+    resposta = Response(stream_with_context(exportar.exporta(conn, formato, filtros)), mimetype=tipo.mimetype)
+    resposta.headers['Content-Disposition'] = f'attachment; filename="imoveis.{tipo.extensao}"'
+    return resposta
+
+@app.route("/imoveis/mudancas", methods=["GET"])
+@db_connection_handler
+def mudancas_imoveis(conn):
+    """Feed de mudanças: o que foi gravado ou removido depois de ?desde=<token>."""
+    campos = campos_pedido()
+    try:
+        limite = int(request.args.get('limite', views.LIMITE_MAXIMO_PAGINA))
+        if limite < 1:
+            raise ValueError
+        resultado = views.mudancas_imoveis(conn, limite, request.args.get('desde'), campos)
+    except ValueError:
+        return jsonify({"Erro": "parâmetros desde ou limite inválidos"}), 400
+    return jsonify(resultado)
+
 
+LOTE_MAXIMO = int(os.getenv('LOTE_MAXIMO', 10000))
+# Um lote tudo_ou_nada é uma transação só, e desde a primeira linha ela segura
+# o lock da linha de imoveis_estado (migração 003): todas as outras escritas
+# esperam o commit. O limite mantém essa espera curta; lotes maiores vão em
+# melhor_esforco, que confirma e solta o lock a cada bloco.
+LOTE_MAXIMO_TUDO_OU_NADA = int(os.getenv('LOTE_MAXIMO_TUDO_OU_NADA', 1000))
+
+def pedido_lote(chave):
+    """Lê (itens, tudo_ou_nada) do corpo e de ?modo=; levanta ValueError se inválidos."""
+    modo = request.args.get('modo', 'tudo_ou_nada')
+    if modo not in ('tudo_ou_nada', 'melhor_esforco'):
+        raise ValueError(f"modo {modo} inválido")
+    dados = request.get_json(silent=True)
+    if isinstance(dados, dict):
+        dados = dados.get(chave)
+    if not isinstance(dados, list) or not dados:
+        raise ValueError(f"o corpo deve ser uma lista não vazia (ou {{\"{chave}\": [...]}})")
+    if len(dados) > LOTE_MAXIMO:
+        raise ValueError(f"o lote tem mais de {LOTE_MAXIMO} itens")
+    if modo == 'tudo_ou_nada' and len(dados) > LOTE_MAXIMO_TUDO_OU_NADA:
+        raise ValueError(f"no modo tudo_ou_nada o lote vai até {LOTE_MAXIMO_TUDO_OU_NADA} itens; "
+                         "use ?modo=melhor_esforco para lotes maiores")
+    return dados, modo == 'tudo_ou_nada'
+
+def resposta_lote(resultados, erros, status, incluir_links=True):
+    imoveis = [{'indice': indice, 'id': id} for indice, id in resultados]
+    if incluir_links:
+        com_links(imoveis, gerador_links())
+    if erros and not resultados:
+        status = 400
+    return jsonify({'imoveis': imoveis, 'erros': erros}), status
+
+@app.route("/imoveis/lote", methods=["POST"])
+@db_connection_handler
+def cria_imoveis_lote(conn):
+    try:
+        itens, tudo_ou_nada = pedido_lote('imoveis')
+    except ValueError as e:
+        return jsonify({"Erro": str(e)}), 400
+    criados, erros = views.cria_imoveis_lote(conn, itens, tudo_ou_nada)
+    return resposta_lote(criados, erros, 201)
+
+@app.route("/imoveis/lote", methods=["PUT"])
+@db_connection_handler
+def atualiza_imoveis_lote(conn):
+    try:
+        itens, tudo_ou_nada = pedido_lote('imoveis')
+    except ValueError as e:
+        return jsonify({"Erro": str(e)}), 400
+    atualizados, erros = views.atualiza_imoveis_lote(conn, itens, tudo_ou_nada)
+    return resposta_lote(atualizados, erros, 200)
+
+@app.route("/imoveis/lote", methods=["DELETE"])
+@db_connection_handler
+def delete_imoveis_lote(conn):
+    try:
+        ids, tudo_ou_nada = pedido_lote('ids')
+    except ValueError as e:
+        return jsonify({"Erro": str(e)}), 400
+    removidos, erros = views.delete_imoveis_lote(conn, ids, tudo_ou_nada)
+    return resposta_lote(removidos, erros, 200, incluir_links=False)
 
 @app.route("/imoveis/<int:id>", methods=["PUT"])
 @db_connection_handler
 def atualiza_imoveis(conn, id):
-    data = request.get_json()
-    imovel = views.atualiza_imovel(conn, id, data)
+    data = request.get_json(silent=True)
+    try:
+        imovel = views.atualiza_imovel(conn, id, data, versao_if_match(id))
+    except views.VersaoDivergente:
+        return jsonify({"mensagem": "o imóvel foi alterado por outra requisição"}), 412
+    except views.DadosInvalidos as e:
+        return jsonify({"Erro": e.erros}), 400
     if imovel is None:
         return jsonify({"mensagem": "imóvel não encontrado"}), 404
-    if len(imovel) == 1:
-        return jsonify({"Erro": f"o parâmetro {imovel[0]} está faltando"}), 400
-
-    imovel['z_links'] = {
-        'self': {'href': url_for('get_imovel_por_id', id=id, _external=True),'method': 'GET'},
-        'update': {'href': url_for('atualiza_imoveis', id=id, _external=True),'method': 'PUT'},
-        'delete': {'href': url_for('delete_imovel', id=id, _external=True),'method': 'DELETE'},
-        'collection': {'href': url_for('listar_imoveis', _external=True),'method': 'GET'}
-    }
+
+    com_links([imovel], gerador_links('full'))
+    return jsonify(imovel)
+
+
+@app.route("/imoveis/<int:id>", methods=["PATCH"])
+@db_connection_handler
+def atualiza_parcial_imovel(conn, id):
+    data = request.get_json(silent=True)
+    try:
+        imovel = views.atualiza_parcial_imovel(conn, id, data, versao_if_match(id))
+    except views.VersaoDivergente:
+        return jsonify({"mensagem": "o imóvel foi alterado por outra requisição"}), 412
+    except views.DadosInvalidos as e:
+        return jsonify({"Erro": e.erros}), 400
+    if imovel is None:
+        return jsonify({"mensagem": "imóvel não encontrado"}), 404
+
+    com_links([imovel], gerador_links('full'))
     return jsonify(imovel)
 
 
 @app.route("/imoveis/<int:id>", methods=["DELETE"])
 @db_connection_handler
 def delete_imovel(conn, id):
-    sucesso = views.delete_imovel(conn, id)
+    try:
+        sucesso = views.delete_imovel(conn, id, versao_if_match(id))
+    except views.VersaoDivergente:
+        return jsonify({"mensagem": "o imóvel foi alterado por outra requisição"}), 412
     if not sucesso:
         return jsonify({"mensagem": "imóvel não encontrado"}), 404
     return jsonify({"mensagem": "imóvel removido com sucesso."}), 200
 
+@app.route("/admin/estatisticas", methods=["GET"])
+def estatisticas():
+    return jsonify({"pool": pool.estatisticas(), "cache": cache.cache_imoveis.estatisticas(),
+                    "replicas": roteador.estatisticas(), "admissao": controle_admissao.estatisticas()})
+
+@app.route("/admin/consultas", methods=["GET"])
+def consultas_mais_lentas():
+    """As formas de consulta com maior tempo total e maior p99 desde o início do processo."""
+    try:
+        n = int(request.args.get('n', 10))
+        if n < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"Erro": "o parâmetro n deve ser um inteiro positivo"}), 400
+    registro = consultas_lentas.registro_consultas
+    return jsonify({
+        "limite_ms": registro.limite * 1000,
+        "por_total": registro.mais_lentas(n, "total"),
+        "por_p99": registro.mais_lentas(n, "p99"),
+    })
+
+AJUDA_POOL = {
+    "esperas": "Empréstimos que esperaram uma conexão ser devolvida",
+    "timeouts": "Empréstimos que desistiram após DB_POOL_TIMEOUT",
+    "criadas": "Conexões abertas pelo pool",
+    "descartadas": "Conexões fechadas por erro, idade ou teste ocioso",
+}
+
+@metricas.registro.coletor
+def metricas_pool_e_cache():
+    estado = pool.estatisticas()
+    coletadas = [
+        ("imoveis_pool_conexoes", "gauge", "Conexões do pool por estado",
+         [({"estado": "em_uso"}, estado["em_uso"]), ({"estado": "livre"}, estado["livres"])]),
+        ("imoveis_pool_conexoes_maximo", "gauge", "Tamanho máximo do pool", [({}, estado["maximo"])]),
+    ]
+    for chave, ajuda in AJUDA_POOL.items():
+        coletadas.append((f"imoveis_pool_{chave}_total", "counter", ajuda, [({}, estado[chave])]))
+    if roteador.ativo:
+        # uma família por métrica, com uma amostra por réplica
+        coletadas.append(("imoveis_replica_saudavel", "gauge", "1 se a réplica está recebendo leituras",
+                          [({"replica": r.nome}, int(r.saudavel)) for r in roteador.replicas]))
+        coletadas.append(("imoveis_replica_atraso_segundos", "gauge", "Atraso da réplica na última verificação",
+                          [({"replica": r.nome}, r.atraso) for r in roteador.replicas if r.atraso is not None]))
+    admissao_estado = controle_admissao.estatisticas()
+    coletadas.append(("imoveis_admissao_em_execucao", "gauge", "Requisições acessando o banco",
+                      [({}, admissao_estado["em_execucao"])]))
+    coletadas.append(("imoveis_admissao_fila", "gauge", "Requisições esperando vaga, por prioridade",
+                      [({"prioridade": nome}, n) for nome, n in admissao_estado["fila"].items()]))
+    coletadas.append(("imoveis_admissao_descartadas_total", "counter", "Requisições respondidas com 503 pelo controle de admissão",
+                      [({"motivo": motivo}, n) for motivo, n in admissao_estado["descartadas"].items()]))
+    estado_cache = cache.cache_imoveis.estatisticas()
+    if "acertos" in estado_cache:
+        coletadas.append(("imoveis_cache_consultas_total", "counter", "Leituras do cache de imóveis",
+                          [({"resultado": "acerto"}, estado_cache["acertos"]),
+                           ({"resultado": "falta"}, estado_cache["faltas"])]))
+    return coletadas
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(metricas.registro.texto(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == '__main__':
+    pool.preencher()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,329 @@
+"""Servidor ASGI da API de imóveis, com driver MySQL assíncrono.
+
+Roda com qualquer servidor ASGI, por exemplo:
+
+    uvicorn servidor_async:app --workers 4
+
+Responde as mesmas rotas de leitura e escrita de servidor.py (listagens com
+paginação, busca, busca textual, estatísticas e o CRUD de um imóvel) com os
+mesmos formatos de JSON. Streaming, requisições condicionais e as rotas de
+lote continuam só no servidor Flask.
+"""
+import json
+import os
+import re
+from urllib.parse import parse_qs, quote, urlencode
+
+import mysql.connector.aio
+from mysql.connector import Error
+from mysql.connector.constants import ClientFlag
+from dotenv import load_dotenv
+
+import cache
+from modelos import DadosInvalidos
+import pool as pool_conexoes
+import repositorio_async as repositorio
+import utils
+import views
+
+load_dotenv('.cred')
+
+if os.getenv('DB_BACKEND', 'mysql') != 'mysql':
+    # o driver assíncrono é o do MySQL; com SQLite use o servidor.py
+    raise RuntimeError("servidor_async.py requer DB_BACKEND=mysql")
+
+config = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME', 'db_escola'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'ssl_ca': os.getenv('SSL_CA_PATH'),
+    'time_zone': '+00:00',
+    'client_flags': [ClientFlag.FOUND_ROWS]
+}
+
+async def connect_db():
+    """Abre uma conexão assíncrona com o banco de dados."""
+    try:
+        conn = await mysql.connector.aio.connect(**config)
+        if await conn.is_connected():
+            return conn
+    except Error as err:
+        print(f"Erro: {err}")
+        return None
+
+pool = pool_conexoes.PoolConexoesAsync(
+    lambda: connect_db(),
+    minimo=int(os.getenv('DB_POOL_MIN', 0)),
+    maximo=int(os.getenv('DB_POOL_MAX', 10)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+    vida_maxima=float(os.getenv('DB_POOL_VIDA_MAXIMA', 1800)),
+    teste_ocioso=float(os.getenv('DB_POOL_TESTE_OCIOSO', 0))
+)
+
+
+class Requisicao:
+    """O que os handlers precisam do escopo ASGI: método, caminho, query e corpo."""
+
+    def __init__(self, scope, corpo):
+        self.metodo = scope['method']
+        self.caminho = scope['path']
+        self.args = {chave: valores[0] for chave, valores in parse_qs(scope.get('query_string', b'').decode()).items()}
+        self.corpo = corpo
+        headers = dict(scope.get('headers') or [])
+        host = headers.get(b'host', b'').decode() or '%s:%s' % tuple(scope.get('server') or ('localhost', 80))
+        self.base = f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}"
+
+    def url(self, caminho, **params):
+        """URL absoluta, como url_for(..., _external=True); parâmetros None são omitidos."""
+        query = urlencode({chave: valor for chave, valor in params.items() if valor is not None}, safe="!$'()*,/:;?@")
+        return self.base + caminho + ("?" + query if query else "")
+
+    def link_imovel(self, id):
+        return {'self': {'href': self.url(f"/imoveis/{id}"), 'method': 'GET'}}
+
+    def json(self):
+        try:
+            return json.loads(self.corpo)
+        except ValueError:
+            return None
+
+
+class Resposta:
+    def __init__(self, dados, status=200, headers=()):
+        self.corpo = (utils.json_compacto(dados) + "\n").encode()
+        self.status = status
+        self.headers = [(b'content-type', b'application/json')] + [(k.encode(), v.encode()) for k, v in headers]
+
+
+MODOS_LINKS = ('none', 'self', 'full')
+
+def gerador_links(req, padrao='self'):
+    """Como servidor.gerador_links: uma função id -> z_links, ou None com ?links=none.
+
+    Levanta ValueError se ?links= não for none, self ou full.
+    """
+    modo = req.args.get('links', padrao)
+    if modo not in MODOS_LINKS:
+        raise ValueError("links deve ser none, self ou full")
+    if modo == 'none':
+        return None
+    if modo == 'self':
+        return req.link_imovel
+    return lambda id: links_imovel(req, id)
+
+def com_links(imoveis, links):
+    if links is not None:
+        for imovel in imoveis:
+            imovel['z_links'] = links(imovel['id'])
+    return imoveis
+
+def pagina_com_links(req, pagina, caminho, limite, links, **params):
+    com_links(pagina['imoveis'], links)
+    opcoes = {'links': req.args.get('links'), 'campos': req.args.get('campos')}
+    z_links = {'self': {'href': req.url(caminho, **params, limite=limite, apos=req.args.get('apos'), **opcoes), 'method': 'GET'}}
+    if pagina['proximo']:
+        z_links['next'] = {'href': req.url(caminho, **params, limite=limite, apos=pagina['proximo'], **opcoes), 'method': 'GET'}
+    if pagina['anterior']:
+        z_links['prev'] = {'href': req.url(caminho, **params, limite=limite, apos=pagina['anterior'], **opcoes), 'method': 'GET'}
+    return Resposta({'imoveis': pagina['imoveis'], 'z_links': z_links})
+
+async def listagem(conn, req, caminho, busca_completa, **filtros):
+    """`busca_completa(campos)` lê a listagem inteira quando não há paginação."""
+    try:
+        campos = views.le_campos(req.args.get('campos'))
+        links = gerador_links(req)
+    except ValueError as e:
+        return Resposta({"Erro": str(e)}, 400)
+    if 'limite' in req.args or 'apos' in req.args:
+        try:
+            limite = int(req.args.get('limite', views.LIMITE_PADRAO_PAGINA))
+            if limite < 1:
+                raise ValueError
+            pagina = await repositorio.pagina_imoveis(conn, limite, req.args.get('apos'), campos=campos, **filtros)
+        except ValueError:
+            return Resposta({"Erro": "parâmetros de paginação inválidos"}, 400)
+        return pagina_com_links(req, pagina, caminho, min(limite, views.LIMITE_MAXIMO_PAGINA), links)
+    return Resposta(com_links(await busca_completa(campos), links))
+
+def links_imovel(req, id):
+    return {
+        'self': {'href': req.url(f"/imoveis/{id}"), 'method': 'GET'},
+        'update': {'href': req.url(f"/imoveis/{id}"), 'method': 'PUT'},
+        'delete': {'href': req.url(f"/imoveis/{id}"), 'method': 'DELETE'},
+        'collection': {'href': req.url("/imoveis"), 'method': 'GET'}
+    }
+
+
+async def listar_imoveis(conn, req):
+    return await listagem(conn, req, "/imoveis", lambda campos: repositorio.listar_imoveis(conn, campos))
+
+async def get_imoveis_por_tipo(conn, req, tipo):
+    return await listagem(conn, req, f"/imoveis/tipo/{quote(tipo)}", lambda campos: repositorio.get_imoveis_por_tipo(conn, tipo, campos), tipo=tipo)
+
+async def get_imoveis_por_cidade(conn, req, cidade):
+    return await listagem(conn, req, f"/imoveis/cidade/{quote(cidade)}", lambda campos: repositorio.get_imoveis_por_cidade(conn, cidade, campos), cidade=cidade)
+
+async def get_imovel_por_id(conn, req, id):
+    try:
+        campos = views.le_campos(req.args.get('campos'))
+        links = gerador_links(req, 'full')
+    except ValueError as e:
+        return Resposta({"Erro": str(e)}, 400)
+    imovel = await repositorio.get_imovel_por_id(conn, int(id), campos)
+    if imovel is None:
+        return Resposta({"mensagem": "imóvel não encontrado"}, 404)
+    return Resposta(com_links([imovel], links)[0])
+
+async def cria_imovel(conn, req):
+    try:
+        imovel_criado = await repositorio.cria_imovel_db(conn, req.json())
+    except DadosInvalidos as e:
+        return Resposta({"Erro": e.erros}, 400)
+    location_url = req.url(f"/imoveis/{imovel_criado['id']}")
+    imovel_criado['z_links'] = {'self': {'href': location_url, 'method': 'GET'}}
+    return Resposta(imovel_criado, 201, [('location', location_url)])
+
+async def atualiza_imoveis(conn, req, id):
+    id = int(id)
+    try:
+        links = gerador_links(req, 'full')
+        imovel = await repositorio.atualiza_imovel(conn, id, req.json())
+    except DadosInvalidos as e:
+        return Resposta({"Erro": e.erros}, 400)
+    except ValueError as e:
+        return Resposta({"Erro": str(e)}, 400)
+    if imovel is None:
+        return Resposta({"mensagem": "imóvel não encontrado"}, 404)
+    return Resposta(com_links([imovel], links)[0])
+
+async def atualiza_parcial_imovel(conn, req, id):
+    id = int(id)
+    try:
+        links = gerador_links(req, 'full')
+        imovel = await repositorio.atualiza_parcial_imovel(conn, id, req.json())
+    except DadosInvalidos as e:
+        return Resposta({"Erro": e.erros}, 400)
+    except ValueError as e:
+        return Resposta({"Erro": str(e)}, 400)
+    if imovel is None:
+        return Resposta({"mensagem": "imóvel não encontrado"}, 404)
+    return Resposta(com_links([imovel], links)[0])
+
+async def delete_imovel(conn, req, id):
+    if not await repositorio.delete_imovel(conn, int(id)):
+        return Resposta({"mensagem": "imóvel não encontrado"}, 404)
+    return Resposta({"mensagem": "imóvel removido com sucesso."})
+
+async def busca_imoveis(conn, req):
+    filtros, erros = views.le_filtros_busca(req.args)
+    if erros:
+        return Resposta({"Erro": erros}, 400)
+    try:
+        links = gerador_links(req)
+    except ValueError as e:
+        return Resposta({"Erro": str(e)}, 400)
+    return Resposta(com_links(await repositorio.busca_imoveis(conn, filtros), links))
+
+async def busca_texto(conn, req):
+    q = req.args.get('q', '')
+    try:
+        limite = int(req.args.get('limite', views.LIMITE_PADRAO_PAGINA))
+        if limite < 1:
+            raise ValueError("limite deve ser um inteiro positivo")
+        links = gerador_links(req)
+        pagina = await repositorio.busca_texto(conn, q, limite, req.args.get('apos'), views.le_campos(req.args.get('campos')))
+    except ValueError as e:
+        return Resposta({"Erro": str(e)}, 400)
+    return pagina_com_links(req, pagina, "/imoveis/texto", min(limite, views.LIMITE_MAXIMO_PAGINA), links, q=q)
+
+async def estatisticas_imoveis(conn, req):
+    agrupar = [coluna for coluna in req.args.get('agrupar', 'cidade').split(',') if coluna]
+    try:
+        resultado = await repositorio.estatisticas(conn, agrupar, req.args.get('cidade'), req.args.get('tipo'))
+    except ValueError as e:
+        return Resposta({"Erro": str(e)}, 400)
+    return Resposta(resultado)
+
+async def estatisticas(req):
+    return Resposta({"pool": pool.estatisticas(), "cache": cache.cache_imoveis.estatisticas()})
+
+
+# (método, caminho, handler, usa_banco); a ordem importa só entre caminhos que se sobrepõem
+ROTAS = [
+    ("GET", r"/imoveis", listar_imoveis, True),
+    ("POST", r"/imoveis", cria_imovel, True),
+    ("GET", r"/imoveis/busca", busca_imoveis, True),
+    ("GET", r"/imoveis/texto", busca_texto, True),
+    ("GET", r"/imoveis/estatisticas", estatisticas_imoveis, True),
+    ("GET", r"/imoveis/tipo/(?P<tipo>[^/]+)", get_imoveis_por_tipo, True),
+    ("GET", r"/imoveis/cidade/(?P<cidade>[^/]+)", get_imoveis_por_cidade, True),
+    ("GET", r"/imoveis/(?P<id>\d+)", get_imovel_por_id, True),
+    ("PUT", r"/imoveis/(?P<id>\d+)", atualiza_imoveis, True),
+    ("PATCH", r"/imoveis/(?P<id>\d+)", atualiza_parcial_imovel, True),
+    ("DELETE", r"/imoveis/(?P<id>\d+)", delete_imovel, True),
+    ("GET", r"/admin/estatisticas", estatisticas, False),
+]
+_ROTAS = [(metodo, re.compile(caminho + "$"), handler, usa_banco) for metodo, caminho, handler, usa_banco in ROTAS]
+
+def encontra_rota(metodo, caminho):
+    """Retorna (handler, usa_banco, parametros) ou a Resposta de erro 404/405."""
+    caminho_existe = False
+    for metodo_rota, padrao, handler, usa_banco in _ROTAS:
+        encontrado = padrao.match(caminho)
+        if encontrado:
+            if metodo_rota == metodo:
+                return handler, usa_banco, encontrado.groupdict()
+            caminho_existe = True
+    if caminho_existe:
+        return Resposta({"Erro": "método não permitido"}, 405)
+    return Resposta({"Erro": "recurso não encontrado"}, 404)
+
+async def despacha(req):
+    rota = encontra_rota(req.metodo, req.caminho)
+    if isinstance(rota, Resposta):
+        return rota
+    handler, usa_banco, parametros = rota
+    if not usa_banco:
+        return await handler(req, **parametros)
+    conn = None
+    try:
+        conn = await pool.emprestar()
+        if not conn:
+            return Resposta({"erro": "Falha na conexão com o banco de dados"}, 500)
+        return await handler(conn, req, **parametros)
+    except pool_conexoes.PoolEsgotado:
+        return Resposta({"erro": "Nenhuma conexão com o banco de dados disponível"}, 503)
+    except Error as e:
+        return Resposta({"erro": f"Erro no banco de dados: {e}"}, 500)
+    finally:
+        if conn:
+            await pool.devolver(conn)
+
+async def _lifespan(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            await pool.preencher()
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await pool.esvaziar()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    corpo = b''
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get('body', b'')
+        if not mensagem.get('more_body'):
+            break
+    resposta = await despacha(Requisicao(scope, corpo))
+    headers = resposta.headers + [(b'content-length', str(len(resposta.corpo)).encode())]
+    await send({'type': 'http.response.start', 'status': resposta.status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': resposta.corpo})
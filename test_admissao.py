@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+import admissao
+from admissao import ALTA, BAIXA, NORMAL, ControleAdmissao, Sobrecarga
+
+
+def espera_fila(controle, tamanho):
+    prazo = time.monotonic() + 2
+    while sum(controle.estatisticas()["fila"].values()) != tamanho:
+        assert time.monotonic() < prazo, "a fila não chegou ao tamanho esperado"
+        time.sleep(0.001)
+
+
+def em_thread(controle, prioridade, resultados):
+    def entra():
+        try:
+            controle.entrar(prioridade)
+            resultados.append(prioridade)
+            controle.sair()
+        except Sobrecarga as e:
+            resultados.append(e.motivo)
+    thread = threading.Thread(target=entra)
+    thread.start()
+    return thread
+
+
+def test_admite_ate_o_limite_sem_esperar():
+    controle = ControleAdmissao(limite=2)
+
+    assert controle.entrar() == 0.0
+    assert controle.entrar() == 0.0
+    assert controle.estatisticas()["em_execucao"] == 2
+
+    controle.sair()
+    controle.sair()
+    assert controle.estatisticas()["em_execucao"] == 0
+
+
+def test_fila_cheia_responde_na_hora():
+    controle = ControleAdmissao(limite=1, fila_maxima=0, espera_maxima=5)
+    controle.entrar()
+
+    inicio = time.monotonic()
+    with pytest.raises(Sobrecarga) as erro:
+        controle.entrar()
+
+    assert time.monotonic() - inicio < 0.5
+    assert erro.value.motivo == "fila_cheia"
+    assert erro.value.retry_after >= 1
+    assert controle.estatisticas()["descartadas"]["fila_cheia"] == 1
+
+
+def test_prazo_na_fila():
+    controle = ControleAdmissao(limite=1, espera_maxima=0.02)
+    controle.entrar()
+
+    with pytest.raises(Sobrecarga) as erro:
+        controle.entrar()
+
+    assert erro.value.motivo == "prazo"
+    estado = controle.estatisticas()
+    assert estado["fila"]["normal"] == 0
+    assert estado["descartadas"]["prazo"] == 1
+
+
+def test_vaga_vai_para_a_maior_prioridade():
+    controle = ControleAdmissao(limite=1, espera_maxima=2)
+    controle.entrar()
+    ordem = []
+
+    threads = [em_thread(controle, BAIXA, ordem)]
+    espera_fila(controle, 1)
+    threads.append(em_thread(controle, NORMAL, ordem))
+    espera_fila(controle, 2)
+    threads.append(em_thread(controle, ALTA, ordem))
+    espera_fila(controle, 3)
+
+    controle.sair()
+    for thread in threads:
+        thread.join()
+
+    assert ordem == [ALTA, NORMAL, BAIXA]
+    assert controle.estatisticas()["em_execucao"] == 0
+
+
+def test_escrita_toma_o_lugar_de_uma_listagem_com_a_fila_cheia():
+    controle = ControleAdmissao(limite=1, fila_maxima=1, espera_maxima=2)
+    controle.entrar()
+    resultados = []
+
+    listagem = em_thread(controle, BAIXA, resultados)
+    espera_fila(controle, 1)
+    escrita = em_thread(controle, ALTA, resultados)
+    listagem.join()
+    espera_fila(controle, 1)
+    with pytest.raises(Sobrecarga):
+        controle.entrar(BAIXA)  # a fila continua cheia, agora com a escrita
+
+    controle.sair()
+    escrita.join()
+
+    assert resultados == ["preterida", ALTA]
+    assert controle.estatisticas()["descartadas"] == {"fila_cheia": 1, "prazo": 0, "preterida": 1}
+
+
+def test_limite_zero_desliga(monkeypatch):
+    monkeypatch.setenv("DB_ADMISSAO_LIMITE", "0")
+    controle = admissao.cria_controle()
+
+    for _ in range(100):
+        controle.entrar()
+    assert controle.estatisticas()["em_execucao"] == 0
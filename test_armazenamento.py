@@ -0,0 +1,164 @@
+import threading
+from datetime import date, datetime
+
+import pytest
+
+import armazenamento
+import cache
+import views
+
+@pytest.fixture(autouse=True)
+def cache_vazio():
+    cache.cache_imoveis.limpar()
+    yield
+    cache.cache_imoveis.limpar()
+
+
+def test_views_no_sqlite(banco, novo):
+    conn = banco.conectar()
+    views.cria_imovel_db(conn, novo)
+    views.cria_imovel_db(conn, dict(novo, logradouro="Avenida Paulista", cidade="São Paulo", valor=900000.0))
+
+    imovel, versao = views.buscar_imovel(conn, 1)
+    assert dict(imovel) == dict(novo, id=1, data_aquisicao=date(2022, 1, 15))
+    assert versao[0] == 1 and isinstance(versao[1], datetime)
+
+    pagina = views.pagina_imoveis(conn, 1, campos=("id", "cidade"))
+    assert [dict(i) for i in pagina["imoveis"]] == [{"id": 1, "cidade": "Campinas"}]
+    assert views.pagina_imoveis(conn, 1, pagina["proximo"])["imoveis"][0]["id"] == 2
+
+    encontrados = views.busca_texto(conn, "paul", 10)["imoveis"]
+    assert [i["id"] for i in encontrados] == [2]
+    assert views.busca_imoveis(conn, {"valor_min": 300000, "ordenar": "id", "limite": 10})[0]["id"] == 2
+
+    assert views.atualiza_parcial_imovel(conn, 1, {"valor": 100000.0}, versao_esperada=1) is not None
+    with pytest.raises(views.VersaoDivergente):
+        views.delete_imovel(conn, 1, versao_esperada=1)
+    assert views.versao_imovel(conn, 1)[0] == 3
+    assert views.versao_colecao(conn)[0] == 3
+
+    assert views.delete_imovel(conn, 2) is True
+    assert views.delete_imovel(conn, 2) is False
+    assert views.estatisticas(conn, ["cidade"]) == [
+        {"cidade": "Campinas", "quantidade": 1, "media": 100000.0, "minimo": 100000.0, "maximo": 100000.0, "mediana": 100000.0}
+    ]
+    assert views.verifica_resumo(conn) == []
+
+
+def test_lotes_no_sqlite(banco, novo):
+    conn = banco.conectar()
+
+    criados, erros = views.cria_imoveis_lote(conn, [novo, dict(novo, cidade="Sorocaba")])
+    assert (criados, erros) == ([(0, 1), (1, 2)], [])
+
+    atualizados, erros = views.atualiza_imoveis_lote(conn, [dict(novo, id=2, valor=1.0), dict(novo, id=9)], tudo_ou_nada=False)
+    assert atualizados == [(0, 2)]
+    assert erros == [{"indice": 1, "erros": ["imóvel não encontrado"]}]
+    assert views.get_imovel_por_id(conn, 2)["valor"] == 1.0
+
+    assert views.delete_imoveis_lote(conn, [1]) == ([(0, 1)], [])
+    assert views.verifica_resumo(conn) == []
+
+
+def test_conexao_por_thread_em_wal(banco):
+    conn = banco.conectar()
+    principal = banco.conexao_da_thread()
+    outras = []
+
+    def usa():
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM imoveis WHERE id > %s", (0,))
+        outras.append((banco.conexao_da_thread(), cursor.fetchone()[0]))
+        banco.fechar_da_thread()
+
+    thread = threading.Thread(target=usa)
+    thread.start()
+    thread.join()
+
+    assert outras[0][0] is not principal
+    assert outras[0][1] == 0
+    assert principal.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert principal.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+def test_servidor_com_sqlite(cliente_sqlite, novo):
+    client = cliente_sqlite
+
+    resposta = client.post("/imoveis", json=novo)
+    assert resposta.status_code == 201
+
+    resposta = client.get("/imoveis/1")
+    assert resposta.get_json()["data_aquisicao"] == "2022-01-15"
+    assert client.get("/imoveis/1", headers={"If-None-Match": resposta.headers["ETag"]}).status_code == 304
+    assert client.get("/imoveis/texto?q=flores").get_json()["imoveis"][0]["id"] == 1
+    assert client.get("/imoveis/estatisticas").get_json()[0]["quantidade"] == 1
+    assert client.put("/imoveis/7", json=novo).status_code == 404
+
+
+def test_cria_banco_pelo_ambiente(monkeypatch, tmp_path):
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "x.db"))
+    assert isinstance(armazenamento.cria_banco({}), armazenamento.BancoSQLite)
+
+    monkeypatch.setenv("DB_BACKEND", "mysql")
+    assert isinstance(armazenamento.cria_banco({}), armazenamento.BancoMySQL)
+
+    monkeypatch.setenv("DB_BACKEND", "oracle")
+    with pytest.raises(RuntimeError):
+        armazenamento.cria_banco({})
+
+
+def test_feed_de_mudancas_no_sqlite(banco, novo):
+    conn = banco.conectar()
+    for cidade in ("Campinas", "Sorocaba", "Santos"):
+        views.cria_imovel_db(conn, dict(novo, cidade=cidade))
+
+    inicio = views.mudancas_imoveis(conn, 2)
+    assert [(m["acao"], m["id"]) for m in inicio["mudancas"]] == [("gravado", 1), ("gravado", 2)]
+    assert inicio["mais"] is True
+    resto = views.mudancas_imoveis(conn, 2, inicio["proximo"])
+    assert [m["id"] for m in resto["mudancas"]] == [3] and resto["mais"] is False
+
+    views.atualiza_parcial_imovel(conn, 1, {"valor": 1.0})
+    views.delete_imovel(conn, 2)
+    delta = views.mudancas_imoveis(conn, 100, resto["proximo"])
+    assert [(m["acao"], m["id"]) for m in delta["mudancas"]] == [("gravado", 1), ("removido", 2)]
+    assert delta["mudancas"][0]["imovel"]["valor"] == 1.0
+    assert delta["mudancas"][1]["versao"] == views.versao_colecao(conn)[0]
+
+    vazio = views.mudancas_imoveis(conn, 100, delta["proximo"])
+    assert vazio == {"mudancas": [], "proximo": delta["proximo"], "mais": False}
+
+    projetado = views.mudancas_imoveis(conn, 100, resto["proximo"], campos=views.le_campos("valor"))
+    assert [(m["acao"], m["id"], m["versao"]) for m in projetado["mudancas"]] == [
+        (m["acao"], m["id"], m["versao"]) for m in delta["mudancas"]]
+    assert projetado["mudancas"][0]["imovel"] == {"id": 1, "valor": 1.0}
+    assert projetado["proximo"] == delta["proximo"]
+
+
+def test_escrita_responde_os_valores_gravados(cliente_sqlite, novo):
+    client = cliente_sqlite
+
+    criado = client.post("/imoveis", json=dict(novo, valor=" 1e3 ")).get_json()
+    assert criado["valor"] == 1000.0
+    assert client.get("/imoveis/1").get_json()["valor"] == 1000.0
+
+    alterado = client.patch("/imoveis/1", json={"valor": "123.456"}).get_json()
+    assert alterado["valor"] == 123.46
+    assert client.get("/imoveis/1").get_json()["valor"] == 123.46
+
+
+def test_reconstruir_resumo_muda_o_etag_das_estatisticas(cliente_sqlite, banco, novo):
+    client = cliente_sqlite
+    client.post("/imoveis", json=novo)
+    antes = client.get("/imoveis/estatisticas", headers={"Accept-Encoding": "gzip"})
+
+    conn = banco.conectar()
+    conn.cursor().execute("DELETE FROM imoveis_resumo")  # resumo fora de sincronia, sem passar pelos triggers
+    conn.commit()
+    views.reconstroi_resumo(conn)
+
+    depois = client.get("/imoveis/estatisticas", headers={"If-None-Match": antes.headers["ETag"], "Accept-Encoding": "gzip"})
+    assert depois.status_code == 200
+    assert depois.headers["ETag"] != antes.headers["ETag"]
+    assert views.verifica_resumo(conn) == []
@@ -0,0 +1,95 @@
+import itertools
+import json
+from unittest.mock import MagicMock
+import benchmark
+import carregar
+import views
+
+
+def test_percentil_e_resumo():
+    latencias = [i / 1000 for i in range(1, 101)]
+
+    resumo = benchmark.resume(reversed(latencias), 2, 2.0)
+
+    assert resumo == {"requisicoes": 100, "erros": 2, "rps": 50.0, "p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0, "max_ms": 100.0}
+    assert benchmark.resume([], 0, 1.0)["p95_ms"] is None
+
+
+def test_linhas_sinteticas_ampliam_o_imoveis_sql():
+    base = list(carregar.ler("imoveis.sql"))
+
+    linhas = list(benchmark.linhas_sinteticas(base, 2500))
+
+    assert len(linhas) == 2500
+    assert linhas[:1000] == base
+    assert linhas[1000][0] == base[0][0] + " 1"
+    assert {linha[0] for linha in linhas[1000:2000]}.isdisjoint(linha[0] for linha in base)
+    assert linhas[1000][6] != base[0][6]
+
+
+def test_semear_recusa_tabela_com_outros_dados():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchone.side_effect = [(1000,), None]
+
+    try:
+        benchmark.semear(mock_conn, 100000)
+        assert False, "deveria recusar"
+    except ValueError as e:
+        assert "1000 linhas" in str(e)
+
+
+def test_mede_rotas_de_escrita_com_os_ids_criados():
+    chamadas = []
+    proximo_id = itertools.count(1)
+
+    def cliente(metodo, caminho, corpo=None):
+        chamadas.append((metodo, caminho))
+        if metodo == "POST":
+            return 201, json.dumps({"id": next(proximo_id)}).encode()
+        return 200, b"{}"
+
+    contexto = benchmark.Contexto({"ids": [1], "tipos": ["casa"], "cidades": ["Campinas"], "palavras": ["Rua"]})
+    rotas = benchmark.escolhe_rotas(["criar", "remover"])
+    resultados = benchmark.roda(rotas, contexto, lambda: cliente, clientes=2, segundos=0.05, relatorio=lambda msg: None)
+
+    criados = resultados["criar"]["requisicoes"]
+    assert criados > 0
+    # cada imóvel criado é removido uma única vez, e o DELETE para quando acabam
+    assert resultados["remover"]["requisicoes"] == criados
+    removidos = [caminho for metodo, caminho in chamadas if metodo == "DELETE"]
+    assert len(set(removidos)) == criados
+    assert resultados["criar"]["erros"] == 0
+
+
+def test_comparar_aponta_regressoes():
+    base = {"rotas": {"item": {"rps": 1000, "p50_ms": 2.0, "p95_ms": 5.0, "p99_ms": 9.0},
+                      "pagina": {"rps": 500, "p50_ms": 4.0, "p95_ms": 10.0, "p99_ms": 20.0}}}
+    atual = {"rotas": {"item": {"rps": 1050, "p50_ms": 2.0, "p95_ms": 5.2, "p99_ms": 9.0},
+                       "pagina": {"rps": 400, "p50_ms": 4.0, "p95_ms": 10.0, "p99_ms": 20.0},
+                       "nova": {"rps": 1, "p50_ms": 1.0, "p95_ms": 1.0, "p99_ms": 1.0}}}
+
+    linhas, regressoes = benchmark.comparar(atual, base)
+
+    assert regressoes == ["pagina"]
+    assert ("pagina", "rps", 500, 400, -0.2) in linhas
+    assert not [linha for linha in linhas if linha[0] == "nova"]
+
+
+def test_todas_as_rotas_respondem_no_app(cliente_sqlite, banco, novo):
+    conn = banco.conectar()
+    views.cria_imoveis_lote(conn, [dict(novo, logradouro=f"Rua das Flores {i}") for i in range(5)])
+
+    def cliente(metodo, caminho, corpo=None):
+        resposta = cliente_sqlite.open(caminho, method=metodo, json=corpo)
+        return resposta.status_code, resposta.get_data()
+
+    contexto = benchmark.Contexto(benchmark.amostra_do_servidor(cliente))
+    for rota in benchmark.ROTAS:
+        pedido = rota.gera(contexto)
+        assert pedido is not None, rota.nome
+        status, corpo = cliente(*pedido)
+        assert status < 400, (rota.nome, status, corpo)
+        if rota.depois is not None:
+            rota.depois(contexto, status, corpo)
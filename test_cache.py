@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+import cache
+from cache import CacheMemoria, CacheRedis
+
+
+def test_lru_despeja_menos_usada():
+    c = CacheMemoria(max_entradas=2)
+    c.guardar("a", 1)
+    c.guardar("b", 2)
+    c.obter("a")
+    c.guardar("c", 3)
+
+    assert c.obter("b") == (False, None)
+    assert c.obter("a") == (True, 1)
+    assert c.obter("c") == (True, 3)
+    assert c.estatisticas()["despejos"] == 1
+
+
+def test_limite_de_bytes():
+    c = CacheMemoria(max_entradas=100, max_bytes=300)
+    c.guardar("a", "x" * 200)
+    c.guardar("b", "y" * 200)
+
+    assert c.obter("a") == (False, None)
+    assert c.obter("b")[0]
+    assert c.estatisticas()["bytes"] <= 300
+
+
+def test_ttl_expira():
+    c = CacheMemoria(ttl=10)
+    with patch("cache.time.monotonic", return_value=100.0):
+        c.guardar("a", 1)
+    with patch("cache.time.monotonic", return_value=105.0):
+        assert c.obter("a") == (True, 1)
+    with patch("cache.time.monotonic", return_value=111.0):
+        assert c.obter("a") == (False, None)
+
+
+def test_invalidar_por_tag_e_isolamento():
+    c = CacheMemoria()
+    c.guardar("tipo:casa", [{"id": 1}, {"id": 2}], ["tipo:casa", "id:1", "id:2"])
+    c.guardar("cidade:Campinas", [{"id": 3}], ["cidade:Campinas", "id:3"])
+
+    _, valor = c.obter("tipo:casa")
+    valor[0]["z_links"] = {}
+    assert c.obter("tipo:casa") == (True, [{"id": 1}, {"id": 2}])
+
+    c.invalidar(["id:2"])
+
+    assert c.obter("tipo:casa") == (False, None)
+    assert c.obter("cidade:Campinas")[0]
+    stats = c.estatisticas()
+    assert (stats["acertos"], stats["faltas"]) == (3, 1)
+
+
+class RedisFalso:
+    """Implementa só os comandos usados por CacheRedis."""
+
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def set(self, chave, valor, ex=None):
+        self.dados[chave] = valor
+
+    def sadd(self, chave, membro):
+        self.dados.setdefault(chave, set()).add(membro)
+
+    def expire(self, chave, ttl):
+        pass
+
+    def smembers(self, chave):
+        return set(self.dados.get(chave, ()))
+
+    def delete(self, *chaves):
+        for chave in chaves:
+            self.dados.pop(chave, None)
+
+    def scan_iter(self, padrao):
+        return [chave for chave in self.dados if chave.startswith(padrao.rstrip("*"))]
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+
+def test_cache_redis_compartilhado():
+    cliente = RedisFalso()
+    processo_a = CacheRedis(cliente)
+    processo_b = CacheRedis(cliente)
+
+    processo_a.guardar("imovel:(1,)", {"id": 1}, ["id:1"])
+    assert processo_b.obter("imovel:(1,)") == (True, {"id": 1})
+
+    processo_b.invalidar(["id:1"])
+    assert processo_a.obter("imovel:(1,)") == (False, None)
+
+
+def test_cache_redis_nao_trava_o_event_loop(monkeypatch):
+    """Com o Redis, em_cache_async chama o cliente síncrono fora da thread do loop."""
+    threads = []
+
+    class RedisLento(RedisFalso):
+        def get(self, chave):
+            threads.append(threading.get_ident())
+            return super().get(chave)
+
+        def execute(self):
+            threads.append(threading.get_ident())
+
+    monkeypatch.setattr(cache, "cache_imoveis", CacheRedis(RedisLento()))
+
+    @cache.em_cache_async("imovel", lambda valor, id: [cache.tag_id(id)])
+    async def busca(conn, id):
+        return {"id": id}
+
+    async def cenario():
+        loop = threading.get_ident()
+        assert await busca(None, 1) == {"id": 1}
+        assert await busca(None, 1) == {"id": 1}
+        await cache.invalidar_async(cache.tag_id(1))
+        return loop
+
+    loop = asyncio.run(cenario())
+    assert len(threads) == 3 and loop not in threads
+    assert cache.cache_imoveis.obter("imovel:(1,)") == (False, None)
@@ -0,0 +1,99 @@
+import json
+from unittest.mock import MagicMock
+import carregar
+import views
+
+
+def test_ler_sql_com_aspas_e_null(tmp_path):
+    arquivo = tmp_path / "imoveis.sql"
+    arquivo.write_text(
+        "CREATE TABLE IF NOT EXISTS imoveis (id INTEGER);\n"
+        "INSERT INTO imoveis (logradouro, tipo_logradouro, bairro, cidade, cep, tipo, valor, data_aquisicao) "
+        "VALUES ('D''Avila Street', 'Rua', 'Centro, Sul', 'Campinas', NULL, 'casa', 250000.5, '2022-01-15');\n"
+        "COMMIT;\n"
+    )
+
+    assert list(carregar.ler(str(arquivo))) == [
+        ("D'Avila Street", "Rua", "Centro, Sul", "Campinas", None, "casa", "250000.5", "2022-01-15")
+    ]
+
+
+def test_converter_ida_e_volta(tmp_path):
+    linhas = list(carregar.ler("imoveis.sql"))
+    destino = tmp_path / "imoveis.ndjson"
+
+    assert carregar.converter(linhas, str(destino)) == 1000
+    assert list(carregar.ler(str(destino))) == linhas
+
+
+INDICES = [
+    ("ft_imoveis_endereco", "logradouro, bairro, cidade", "FULLTEXT"),
+    ("idx_imoveis_cidade", "cidade", "BTREE"),
+    ("idx_imoveis_tipo_cidade_valor", "tipo, cidade, valor", "BTREE"),
+]
+
+def nova_conexao(progresso, *indices_existentes):
+    """Cada consulta a information_schema devolve o próximo de indices_existentes."""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchone.return_value = progresso
+    mock_cursor.fetchall.side_effect = list(indices_existentes)
+    return mock_conn, mock_cursor
+
+
+def test_carregar_em_blocos_removendo_e_recriando_indices():
+    mock_conn, mock_cursor = nova_conexao((0, None, False), INDICES, [])
+    linhas = [tuple(str(i) for _ in views.CAMPOS_IMOVEL) for i in range(5)]
+
+    inseridas, _ = carregar.carregar(mock_conn, iter(linhas), "teste", tamanho_lote=2, relatorio=lambda msg: None)
+
+    assert inseridas == 5
+    assert [len(c.args[1]) for c in mock_cursor.executemany.call_args_list] == [2, 2, 1]
+    comandos = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    remove = comandos.index(
+        "ALTER TABLE imoveis DROP INDEX ft_imoveis_endereco, DROP INDEX idx_imoveis_cidade, DROP INDEX idx_imoveis_tipo_cidade_valor"
+    )
+    recria = comandos.index("ALTER TABLE imoveis ADD INDEX idx_imoveis_cidade (cidade), ADD INDEX idx_imoveis_tipo_cidade_valor (tipo, cidade, valor)")
+    recria_fulltext = comandos.index("ALTER TABLE imoveis ADD FULLTEXT INDEX ft_imoveis_endereco (logradouro, bairro, cidade)")
+    assert remove < recria < recria_fulltext
+    mock_cursor.execute.assert_any_call("UPDATE carga_progresso SET linhas = linhas + %s WHERE carga = %s", (2, "teste"))
+
+    # os triggers de INSERT ficam desligados: uma versão por bloco e o resumo refeito no fim
+    assert comandos.index("SET @carga_em_massa = 1") < comandos.index(views.SQL_NOVA_VERSAO)
+    assert comandos.count(views.SQL_NOVA_VERSAO) == 4
+    desliga = comandos.index("SET @carga_em_massa = NULL")
+    reconstroi = comandos.index("DELETE FROM imoveis_resumo")
+    assert recria_fulltext < desliga < reconstroi
+    ultima_versao = len(comandos) - 1 - comandos[::-1].index(views.SQL_NOVA_VERSAO)
+    assert ultima_versao > reconstroi  # o resumo novo não fica sob o ETag de antes dele
+    assert comandos[-2] == "UPDATE carga_progresso SET concluida = TRUE WHERE carga = %s"
+
+
+def test_carregar_retoma_do_progresso_salvo():
+    indices = [["idx_imoveis_cidade", "cidade", "BTREE"]]
+    mock_conn, mock_cursor = nova_conexao((3, json.dumps(indices), False), [])
+    linhas = [tuple(str(i) for _ in views.CAMPOS_IMOVEL) for i in range(5)]
+
+    inseridas, _ = carregar.carregar(mock_conn, iter(linhas), "teste", tamanho_lote=10, relatorio=lambda msg: None)
+
+    assert inseridas == 2
+    assert mock_cursor.executemany.call_args.args[1] == linhas[3:]
+    comandos = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert not any("DROP INDEX" in comando for comando in comandos)
+    assert "ALTER TABLE imoveis ADD INDEX idx_imoveis_cidade (cidade)" in comandos
+
+
+def test_carregar_retomada_nao_recria_indices_existentes():
+    """A carga parou depois de recriar os índices, antes de ser marcada como concluída"""
+    indices = [list(indice) for indice in INDICES]
+    mock_conn, mock_cursor = nova_conexao((5, json.dumps(indices), False), INDICES[1:])
+    linhas = [tuple(str(i) for _ in views.CAMPOS_IMOVEL) for i in range(5)]
+
+    assert carregar.carregar(mock_conn, iter(linhas), "teste", relatorio=lambda msg: None)[0] == 0
+
+    comandos = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert [c for c in comandos if c.startswith("ALTER TABLE")] == [
+        "ALTER TABLE imoveis ADD FULLTEXT INDEX ft_imoveis_endereco (logradouro, bairro, cidade)"
+    ]
+    mock_cursor.execute.assert_any_call("UPDATE carga_progresso SET concluida = TRUE WHERE carga = %s", ("teste",))
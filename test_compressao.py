@@ -0,0 +1,36 @@
+import gzip
+
+from flask import Response
+from werkzeug.http import parse_accept_header
+
+import compressao
+
+
+def test_escolhe_pela_qualidade_e_pela_preferencia():
+    assert compressao.escolhe(parse_accept_header("gzip, deflate")) == "gzip"
+    assert compressao.escolhe(parse_accept_header("identity")) is None
+    assert compressao.escolhe(parse_accept_header("gzip;q=0")) is None
+    assert compressao.escolhe(parse_accept_header("*")) == compressao.CODIFICACOES[0]
+
+
+def test_comprime_fluxo_gera_um_gzip_valido():
+    partes = ["[", '{"id":1}', "", b',{"id":2}', "]"]
+    comprimido = b"".join(compressao.comprime_fluxo(iter(partes), "gzip"))
+    assert gzip.decompress(comprimido) == b'[{"id":1},{"id":2}]'
+    assert gzip.decompress(compressao.comprime(b"x" * 5000, "gzip")) == b"x" * 5000
+
+
+def test_aplica_respeita_limite_e_tipo():
+    pequena = Response(b"{}", mimetype="application/json")
+    assert "Content-Encoding" not in compressao.aplica(pequena, "gzip").headers
+    assert pequena.headers["Vary"] == "Accept-Encoding"
+
+    grande = Response(b"[" + b"1," * 2000 + b"1]", mimetype="application/json")
+    grande.set_etag("c7")
+    compressao.aplica(grande, "gzip")
+    assert grande.headers["Content-Encoding"] == "gzip"
+    assert grande.headers["ETag"] == 'W/"c7"'
+    assert grande.content_length == len(grande.get_data()) < 4002
+
+    binaria = Response(b"x" * 5000, mimetype="application/octet-stream")
+    assert "Content-Encoding" not in compressao.aplica(binaria, "gzip").headers
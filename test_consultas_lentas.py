@@ -0,0 +1,53 @@
+import logging
+
+import pytest
+
+import consultas_lentas
+import views
+
+
+@pytest.fixture
+def registro(monkeypatch):
+    registro = consultas_lentas.RegistroConsultas(limite=0.0)
+    monkeypatch.setattr(consultas_lentas, "registro_consultas", registro)
+    return registro
+
+
+def test_normaliza_forma():
+    assert consultas_lentas.normaliza("SELECT * FROM imoveis\n  WHERE cidade = %s AND id IN (%s, %s, %s) LIMIT 10") == \
+        "SELECT * FROM imoveis WHERE cidade = ? AND id IN (?...) LIMIT ?"
+    assert consultas_lentas.normaliza("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)") == \
+        "INSERT INTO t (a, b) VALUES (?...), ..."
+    assert consultas_lentas.normaliza("SELECT 'a''b', col1 FROM t") == "SELECT ?, col1 FROM t"
+
+
+def test_consulta_lenta_loga_e_captura_plano(banco, registro, caplog):
+    conn = banco.conectar()
+    views.cria_imovel_db(conn, {"logradouro": "Rua A", "tipo_logradouro": "Rua", "bairro": "Centro", "cidade": "Campinas",
+                                "cep": "13000-000", "tipo": "casa", "valor": 1.0, "data_aquisicao": "2022-01-15"})
+
+    with caplog.at_level(logging.WARNING, logger="imoveis.consultas_lentas"):
+        assert len(views.get_imoveis_por_cidade(conn, "Campinas")) == 1
+        views.get_imoveis_por_cidade(conn, "Sorocaba")
+
+    mensagem = next(r.getMessage() for r in caplog.records if "WHERE cidade" in r.getMessage())
+    assert "1 linhas" in mensagem and "em get_imoveis_por_cidade" in mensagem and "'Campinas'" in mensagem
+
+    forma = next(f for f in registro.mais_lentas(50) if "WHERE cidade" in f["sql"])
+    assert forma["execucoes"] == 2 and forma["lentas"] == 2 and forma["linhas"] == 1
+    assert forma["plano"] and "detail" in forma["plano"][0]
+    assert forma["p99_ms"] <= forma["maximo_ms"] <= forma["total_ms"]
+
+
+def test_parametros_ocultos_e_consultas_rapidas(banco, registro, caplog):
+    registro.ocultar_parametros = True
+    conn = banco.conectar()
+    with caplog.at_level(logging.WARNING, logger="imoveis.consultas_lentas"):
+        views.versao_imovel(conn, 42)
+    assert "<ocultos>" in caplog.text and "42" not in caplog.text.split("parametros:")[1]
+
+    registro.limite = 60.0
+    caplog.clear()
+    views.versao_imovel(conn, 43)
+    assert caplog.text == ""
+    assert registro.mais_lentas(1, "p99")[0]["execucoes"] == 2
@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+from datetime import date
+
+import pytest
+
+import exportar
+import servidor
+import views
+
+@pytest.fixture
+def novo(novo):
+    return dict(novo, valor=250000.5)
+
+@pytest.fixture
+def conn(banco, novo):
+    conn = banco.conectar()
+    views.cria_imoveis_lote(conn, [novo, dict(novo, cidade="São Paulo", tipo="apartamento"), dict(novo, valor=1.0)])
+    return conn
+
+
+def test_csv_com_filtros_em_lotes(conn):
+    filtros, _ = views.le_filtros_busca({"cidade": "Campinas", "campos": "cidade,valor"})
+    partes = list(exportar.exporta(conn, "csv", filtros, tamanho_lote=1))
+    assert len(partes) == 2
+    linhas = list(csv.reader(io.StringIO(b"".join(partes).decode())))
+    assert linhas == [["id", "cidade", "valor"], ["1", "Campinas", "250000.5"], ["3", "Campinas", "1.0"]]
+
+
+def test_ndjson_sem_links(conn, novo):
+    filtros, _ = views.le_filtros_busca({"valor_min": "100"})
+    linhas = b"".join(exportar.exporta(conn, "ndjson", filtros)).decode().splitlines()
+    primeiro = json.loads(linhas[0])
+    assert primeiro == dict(novo, id=1)
+    assert json.loads(linhas[1])["cidade"] == "São Paulo"
+    assert len(linhas) == 2
+
+
+def test_parquet(conn):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    filtros, _ = views.le_filtros_busca({})
+    partes = list(exportar.exporta(conn, "parquet", filtros, tamanho_lote=1))
+    assert len(partes) == 4  # um pedaço por lote e o rodapé
+
+    arquivo = pyarrow_parquet.ParquetFile(io.BytesIO(b"".join(partes)))
+    assert arquivo.metadata.num_row_groups == 3
+    tabela = arquivo.read()
+    assert tabela.column("id").to_pylist() == [1, 2, 3]
+    assert tabela.column("valor").to_pylist() == [250000.5, 250000.5, 1.0]
+    assert tabela.column("data_aquisicao").to_pylist()[0] == date(2022, 1, 15)
+
+
+def test_cli_grava_arquivo(conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(servidor, "banco", conn.banco)
+    destino = tmp_path / "saida.ndjson"
+    assert exportar.main([str(destino), "--tipo", "apartamento"]) == 0
+    assert [json.loads(linha)["id"] for linha in destino.read_text().splitlines()] == [2]
@@ -0,0 +1,61 @@
+import pytest
+
+import metricas
+
+
+def test_histograma_acumula_faixas():
+    registro = metricas.Registro()
+    duracao = registro.histograma("x_segundos", "Duração", ("rota",), limites=(0.1, 1.0))
+    duracao.observa(0.05, "/a")
+    duracao.observa(0.5, "/a")
+    duracao.observa(3.0, "/a")
+
+    texto = registro.texto()
+    assert "# TYPE x_segundos histogram" in texto
+    assert 'x_segundos_bucket{rota="/a",le="0.1"} 1' in texto
+    assert 'x_segundos_bucket{rota="/a",le="1.0"} 2' in texto
+    assert 'x_segundos_bucket{rota="/a",le="+Inf"} 3' in texto
+    assert 'x_segundos_sum{rota="/a"} 3.55' in texto
+    assert 'x_segundos_count{rota="/a"} 3' in texto
+
+
+def test_contador_escapa_rotulos_e_coletores():
+    registro = metricas.Registro()
+    total = registro.contador("y_total", "Total", ("nome",))
+    total.inc('a"b\\c')
+    total.inc('a"b\\c', n=2)
+    registro.coletor(lambda: [("z", "gauge", "Z", [({"estado": "livre"}, 4)])])
+
+    texto = registro.texto()
+    assert 'y_total{nome="a\\"b\\\\c"} 3' in texto
+    assert 'z{estado="livre"} 4' in texto
+
+
+def test_mede_consulta_tempo_e_linhas():
+    metricas.registro.limpar()
+
+    @metricas.mede_consulta
+    def consulta_teste(conn):
+        return {"imoveis": [1, 2, 3], "proximo": None}
+
+    @metricas.mede_consulta
+    def lotes_teste(conn):
+        yield [1, 2]
+        yield [3]
+
+    @metricas.mede_consulta
+    def falha_teste(conn):
+        raise RuntimeError("banco fora")
+
+    consulta_teste(None)
+    assert list(lotes_teste(None)) == [[1, 2], [3]]
+    with pytest.raises(RuntimeError):
+        falha_teste(None)
+
+    assert metricas.duracao_consulta.contagem("consulta_teste") == 1
+    assert metricas.linhas_consulta.valor("consulta_teste") == 3
+    assert metricas.duracao_consulta.contagem("lotes_teste") == 1
+    assert metricas.linhas_consulta.valor("lotes_teste") == 3
+    assert metricas.duracao_consulta.contagem("falha_teste") == 1
+    assert metricas.linhas_consulta.valor("falha_teste") == 0
+    metricas.registro.limpar()
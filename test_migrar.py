@@ -0,0 +1,87 @@
+import pytest
+from unittest.mock import MagicMock
+import migrar
+
+
+def test_listar_migracoes_em_ordem(tmp_path):
+    (tmp_path / "010_depois.sql").write_text("SELECT 1;")
+    (tmp_path / "002_antes.sql").write_text("SELECT 1;")
+    (tmp_path / "leia-me.txt").write_text("")
+
+    assert [(versao, nome) for versao, nome, _ in migrar.listar_migracoes(str(tmp_path))] == [(2, "antes"), (10, "depois")]
+
+
+def test_migracoes_do_repositorio_tem_versoes_unicas():
+    versoes = [versao for versao, _, _ in migrar.listar_migracoes()]
+    assert versoes[:2] == [1, 2]
+
+
+def test_separar_comandos_com_delimiter():
+    sql = """
+-- comentário
+CREATE INDEX a ON imoveis (cidade);
+DELIMITER $$
+CREATE TRIGGER t BEFORE INSERT ON imoveis FOR EACH ROW
+BEGIN
+    SET NEW.cep = TRIM(NEW.cep);
+END$$
+DELIMITER ;
+CREATE INDEX b ON imoveis (tipo);
+"""
+    comandos = migrar.separar_comandos(sql)
+
+    assert comandos[0] == "CREATE INDEX a ON imoveis (cidade)"
+    assert comandos[1].startswith("CREATE TRIGGER t") and comandos[1].endswith("END")
+    assert "SET NEW.cep = TRIM(NEW.cep);" in comandos[1]
+    assert comandos[2] == "CREATE INDEX b ON imoveis (tipo)"
+
+
+def test_upgrade_aplica_somente_pendentes(tmp_path):
+    (tmp_path / "001_um.sql").write_text("CREATE TABLE um (id INT);")
+    (tmp_path / "002_dois.sql").write_text("CREATE TABLE dois (id INT);\nCREATE TABLE tres (id INT);")
+    (tmp_path / "003_quatro.sql").write_text("CREATE TABLE quatro (id INT);")
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchone.return_value = (1,)
+
+    aplicadas = migrar.upgrade(mock_conn, ate=2, diretorio=str(tmp_path))
+
+    assert aplicadas == [2]
+    executados = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert "CREATE TABLE um (id INT)" not in executados
+    assert "CREATE TABLE dois (id INT)" in executados
+    assert "CREATE TABLE tres (id INT)" in executados
+    assert "CREATE TABLE quatro (id INT)" not in executados
+    mock_cursor.execute.assert_any_call("INSERT INTO schema_version (versao, nome) VALUES (%s, %s)", (2, "dois"))
+    assert mock_conn.commit.call_count == 1
+
+
+def test_verificar_indices_aponta_varredura_completa():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchone.return_value = {"id": 1, "tipo": "casa", "cidade": "Campinas"}
+    planos = {
+        "get_imovel_por_id": [{"table": "imoveis", "type": "const", "key": "PRIMARY"}],
+        "get_imoveis_por_tipo": [{"table": "imoveis", "type": "ref", "key": "idx_imoveis_tipo"}],
+        "get_imoveis_por_cidade": [{"table": "imoveis", "type": "ALL", "key": None}],
+    }
+    mock_cursor.fetchall.side_effect = list(planos.values()) + [[{"table": "imoveis", "type": "range", "key": "PRIMARY"}]] * 5
+
+    resultado = dict(migrar.verificar_indices(mock_conn))
+
+    assert resultado["get_imovel_por_id"] == "PRIMARY"
+    assert resultado["get_imoveis_por_tipo"] == "idx_imoveis_tipo"
+    assert resultado["get_imoveis_por_cidade"] is None
+    mock_cursor.execute.assert_any_call("EXPLAIN SELECT * FROM imoveis WHERE cidade =%s", ("Campinas",))
+
+
+def test_carga_em_massa_desliga_so_os_triggers_de_insert():
+    caminho = dict((versao, caminho) for versao, _, caminho in migrar.listar_migracoes())[8]
+    with open(caminho, encoding="utf-8") as arquivo:
+        comandos = migrar.separar_comandos(arquivo.read())
+
+    assert comandos[:2] == ["DROP TRIGGER imoveis_versao_insert", "DROP TRIGGER imoveis_resumo_insert"]
+    assert [c.split()[2] for c in comandos[2:]] == ["imoveis_versao_insert", "imoveis_resumo_insert"]
+    assert all("IF @carga_em_massa IS NULL THEN" in c for c in comandos[2:])
@@ -0,0 +1,66 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import modelos
+import utils
+
+LINHA = (1, 'Nicole Common', 'Travessa', 'Lake Danielle', 'Judymouth', '85184', 'casa em condominio', Decimal('488423.52'), '2017-07-29')
+DADOS = {"logradouro": "Rua A", "tipo_logradouro": "Rua", "bairro": "Centro", "cidade": "Teste",
+         "cep": "12345-678", "tipo": "casa", "valor": 1000.5, "data_aquisicao": "2025-01-01"}
+
+
+def test_linhas_viram_dicts_na_ordem_das_colunas():
+    imovel, = utils.rows_to_imoveis([LINHA + (3, None)])  # versao e atualizado_em ficam de fora
+
+    assert imovel == dict(zip(modelos.COLUNAS, LINHA))
+    assert utils.rows_to_imoveis([(1, "Judymouth")], ("id", "cidade")) == [{"id": 1, "cidade": "Judymouth"}]
+    assert json.loads(json.dumps(imovel, default=utils.json_default))["valor"] == 488423.52
+
+def test_imovel_de_dados_ignora_chaves_fora_do_modelo():
+    assert modelos.imovel_de_dados(7, {"cidade": "Teste", "piscina": True}) == {"id": 7, "cidade": "Teste"}
+
+def test_valida_dados_completos():
+    valores, erros = modelos.valida(DADOS)
+    assert erros == []
+    assert valores == dict(DADOS, valor=Decimal("1000.50"), data_aquisicao=date(2025, 1, 1))
+
+    valores, erros = modelos.valida(dict(DADOS, cep="12345", valor="1000.50", bairro=None))
+    assert erros == []
+    assert valores["bairro"] is None
+
+@pytest.mark.parametrize("enviado, gravado", [
+    (" 1e3 ", Decimal("1000.00")),
+    ("123.456", Decimal("123.46")),   # como o DECIMAL(14, 2) do MySQL arredonda
+    (0.125, Decimal("0.13")),
+    (250000, Decimal("250000.00")),
+])
+def test_valida_converte_valor_para_o_que_o_banco_grava(enviado, gravado):
+    valores, erros = modelos.valida({"valor": enviado}, parcial=True)
+    assert erros == []
+    assert str(valores["valor"]) == str(gravado)
+
+def test_valida_lista_todos_os_problemas():
+    dados = dict(DADOS, cidade=" ", cep="12.345", valor=True, data_aquisicao="2025-02-30", tipo="x" * 51)
+    del dados["bairro"]
+
+    valores, erros = modelos.valida(dados)
+    assert erros == [
+        "o parâmetro bairro está faltando",
+        "o parâmetro cidade não pode ser vazio",
+        "o parâmetro cep deve ter o formato 00000-000",
+        "o parâmetro tipo deve ter no máximo 50 caracteres",
+        "o parâmetro valor deve ser um número",
+        "o parâmetro data_aquisicao deve ser uma data AAAA-MM-DD",
+    ]
+    assert "cidade" not in valores
+
+def test_valida_parcial():
+    assert modelos.valida({"valor": 10}, parcial=True) == ({"valor": Decimal("10.00")}, [])
+    assert modelos.valida({"valor": 1e13, "piscina": True}, parcial=True)[1] == [
+        "o campo piscina não existe",
+        "o parâmetro valor deve ser um número de até 12 dígitos antes da vírgula",
+    ]
+    assert modelos.valida({}, parcial=True) == ({}, ["informe pelo menos um campo para atualizar"])
@@ -0,0 +1,102 @@
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from mysql.connector import Error
+from pool import PoolConexoes, PoolEsgotado
+
+
+def nova_fabrica():
+    criadas = []
+    def fabrica():
+        conn = MagicMock()
+        conn.in_transaction = False
+        criadas.append(conn)
+        return conn
+    return fabrica, criadas
+
+
+def test_reaproveita_conexao_devolvida():
+    fabrica, criadas = nova_fabrica()
+    pool = PoolConexoes(fabrica, maximo=2)
+
+    conn = pool.emprestar()
+    pool.devolver(conn)
+
+    assert pool.emprestar() is conn
+    assert len(criadas) == 1
+
+
+def test_timeout_quando_pool_cheio():
+    fabrica, _ = nova_fabrica()
+    pool = PoolConexoes(fabrica, maximo=1, timeout=0.05)
+    pool.emprestar()
+
+    with pytest.raises(PoolEsgotado):
+        pool.emprestar()
+
+    stats = pool.estatisticas()
+    assert stats["em_uso"] == 1
+    assert stats["esperas"] == 1
+    assert stats["timeouts"] == 1
+
+
+def test_espera_conexao_ser_devolvida():
+    fabrica, criadas = nova_fabrica()
+    pool = PoolConexoes(fabrica, maximo=1, timeout=2)
+    conn = pool.emprestar()
+
+    threading.Timer(0.05, pool.devolver, args=(conn,)).start()
+
+    assert pool.emprestar() is conn
+    assert len(criadas) == 1
+
+
+def test_descarta_conexao_morta_no_emprestimo():
+    fabrica, criadas = nova_fabrica()
+    pool = PoolConexoes(fabrica, maximo=2)
+    conn = pool.emprestar()
+    pool.devolver(conn)
+    conn.is_connected.return_value = False
+
+    nova = pool.emprestar()
+
+    assert nova is not conn
+    conn.close.assert_called_once()
+    assert pool.estatisticas()["descartadas"] == 1
+
+
+def test_recicla_conexao_apos_vida_maxima():
+    fabrica, criadas = nova_fabrica()
+    pool = PoolConexoes(fabrica, maximo=2, vida_maxima=10)
+
+    with patch("pool.time.monotonic", return_value=100.0):
+        conn = pool.emprestar()
+        pool.devolver(conn)
+    with patch("pool.time.monotonic", return_value=200.0):
+        nova = pool.emprestar()
+
+    assert nova is not conn
+    conn.close.assert_called_once()
+
+
+def test_devolver_desfaz_transacao_e_descarta_se_falhar():
+    fabrica, _ = nova_fabrica()
+    pool = PoolConexoes(fabrica, maximo=1)
+    conn = pool.emprestar()
+    conn.in_transaction = True
+    conn.rollback.side_effect = Error("conexão perdida")
+
+    pool.devolver(conn)
+
+    assert pool.estatisticas()["livres"] == 0
+    conn.close.assert_called_once()
+
+
+def test_preencher_abre_minimo():
+    fabrica, criadas = nova_fabrica()
+    pool = PoolConexoes(fabrica, minimo=3, maximo=5)
+
+    pool.preencher()
+
+    assert len(criadas) == 3
+    assert pool.estatisticas()["livres"] == 3
@@ -0,0 +1,170 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+import cache
+import compressao
+import pool as pool_conexoes
+import replicas
+import servidor
+import views
+
+class PoolFalso:
+    def __init__(self, conn=None, em_uso=0):
+        self.conn = conn
+        self.em_uso = em_uso
+        self.descartadas = 0
+
+    def emprestar(self):
+        return self.conn
+
+    def devolver(self, conn, descartar=False):
+        self.descartadas += descartar
+
+    def estatisticas(self):
+        return {"em_uso": self.em_uso}
+
+
+def conexao_mysql(estado):
+    conn = MagicMock()
+    conn.dialeto = "mysql"
+    conn.cursor.return_value.fetchone.return_value = estado
+    return conn
+
+
+def replica_verificada(nome, pool):
+    replica = replicas.Replica(nome, pool)
+    replica.verificada_em = time.monotonic()
+    return replica
+
+
+def test_rodizio_alterna_entre_as_saudaveis():
+    a, b, c = (replica_verificada(nome, PoolFalso()) for nome in "abc")
+    b.saudavel = False
+    roteador = replicas.Roteador([a, b, c], intervalo=60)
+
+    assert [roteador.escolher().nome for _ in range(4)] == ["a", "c", "a", "c"]
+    assert (a.leituras, b.leituras, c.leituras) == (2, 0, 2)
+
+
+def test_menos_ocupada_escolhe_o_pool_com_menos_conexoes_em_uso():
+    a = replica_verificada("a", PoolFalso(em_uso=3))
+    b = replica_verificada("b", PoolFalso(em_uso=1))
+    roteador = replicas.Roteador([a, b], balanceamento="menos_ocupada", intervalo=60)
+
+    assert roteador.escolher() is b
+
+
+def test_sem_replica_saudavel_le_do_primario():
+    a = replica_verificada("a", PoolFalso())
+    roteador = replicas.Roteador([a], intervalo=60)
+    roteador.marcar_falha(a, "conexão recusada")
+
+    assert roteador.escolher() is None
+    assert roteador.estatisticas()[0]["falhas"] == 1
+
+
+@pytest.mark.parametrize("estado, saudavel", [
+    ({"Seconds_Behind_Source": 2}, True),
+    ({"Seconds_Behind_Source": 30}, False),
+    ({"Seconds_Behind_Source": None}, False),   # replicação parada
+    ({"Seconds_Behind_Master": 1}, True),
+])
+def test_verificacao_pelo_atraso(estado, saudavel):
+    replica = replicas.Replica("a", PoolFalso(conexao_mysql(estado)))
+    roteador = replicas.Roteador([replica], atraso_maximo=5)
+
+    assert roteador.verificar(replica) is saudavel
+    assert replica.saudavel is saudavel
+
+
+def test_verificacao_de_replica_fora_do_ar():
+    replica = replicas.Replica("a", PoolFalso(None))
+    roteador = replicas.Roteador([replica])
+
+    assert roteador.escolher() is None
+    assert replica.erro == "falha ao conectar"
+
+
+def test_cookie_de_escrita_vale_pela_janela():
+    roteador = replicas.Roteador([], janela_primario=10)
+
+    assert roteador.fixado_no_primario(repr(time.time() - 5))
+    assert not roteador.fixado_no_primario(repr(time.time() - 15))
+    assert not roteador.fixado_no_primario("lixo")
+    assert not roteador.fixado_no_primario(None)
+
+
+@pytest.fixture
+def replica(cliente_sqlite, banco, cria_banco, novo, monkeypatch):
+    """O servidor com `banco` como primário e uma réplica em outro arquivo SQLite."""
+    copia = cria_banco("replica.db")
+    # dados diferentes nos dois arquivos mostram de onde veio cada leitura
+    views.cria_imovel_db(banco.conectar(), novo)
+    views.cria_imovel_db(copia.conectar(), dict(novo, cidade="Sorocaba"))
+
+    replica = replicas.Replica("replica.db", pool_conexoes.PoolConexoes(
+        lambda: replicas.marca_replica(servidor.connect_db(copia))))
+    monkeypatch.setattr(servidor, "roteador", replicas.Roteador([replica], intervalo=60))
+    monkeypatch.setattr(cache, "cache_imoveis", cache.CacheMemoria())
+    compressao.corpos_colecao.limpar()
+    yield replica
+    compressao.corpos_colecao.limpar()
+
+
+def cidades(resposta):
+    return [imovel["cidade"] for imovel in resposta.get_json()]
+
+
+def test_leituras_na_replica_e_escritas_no_primario(replica, novo):
+    client = servidor.app.test_client()
+
+    assert cidades(client.get("/imoveis")) == ["Sorocaba"]
+    assert replica.leituras == 1
+
+    resposta = client.post("/imoveis", json=dict(novo, cidade="Jundiaí"))
+    assert resposta.status_code == 201
+    assert replicas.COOKIE_ESCRITA in resposta.headers["Set-Cookie"]
+
+    # o mesmo cliente lê o que gravou; os outros continuam na réplica
+    assert cidades(client.get("/imoveis")) == ["Campinas", "Jundiaí"]
+    assert cidades(servidor.app.test_client().get("/imoveis")) == ["Sorocaba"]
+    assert replica.leituras == 2
+
+
+def test_leitura_volta_ao_primario_quando_a_replica_falha(replica, monkeypatch):
+    monkeypatch.setattr(replica.pool, "fabrica", lambda: None)
+    replica.verificada_em = time.monotonic()  # a verificação passou; a falha vem na leitura
+    client = servidor.app.test_client()
+
+    assert cidades(client.get("/imoveis")) == ["Campinas"]
+    assert not replica.saudavel
+    assert client.get("/admin/estatisticas").get_json()["replicas"][0]["falhas"] == 1
+    assert "imoveis_replica_saudavel{replica=\"replica.db\"} 0" in client.get("/metrics").get_data(as_text=True)
+
+
+def test_leitura_atrasada_na_replica_nao_entra_no_cache(replica, novo):
+    escritor = servidor.app.test_client()
+    outro = servidor.app.test_client()
+
+    assert escritor.put("/imoveis/1", json=dict(novo, cidade="Jundiaí")).status_code == 200
+    # a réplica ainda não recebeu a alteração
+    assert outro.get("/imoveis/1").get_json()["cidade"] == "Sorocaba"
+    assert escritor.get("/imoveis/1").get_json()["cidade"] == "Jundiaí"
+    # o que o primário leu fica no cache e vale também para quem está na réplica
+    assert outro.get("/imoveis/1").get_json()["cidade"] == "Jundiaí"
+
+
+def test_metricas_de_varias_replicas_numa_familia_so(monkeypatch):
+    a, b = replica_verificada("a", PoolFalso()), replica_verificada("b", PoolFalso())
+    a.atraso, b.atraso, b.saudavel = 0.5, 30.0, False
+    monkeypatch.setattr(servidor, "roteador", replicas.Roteador([a, b]))
+
+    texto = servidor.app.test_client().get("/metrics").get_data(as_text=True)
+
+    assert texto.count("# TYPE imoveis_replica_saudavel gauge") == 1
+    assert texto.count("# HELP imoveis_replica_atraso_segundos ") == 1
+    assert 'imoveis_replica_saudavel{replica="a"} 1' in texto
+    assert 'imoveis_replica_saudavel{replica="b"} 0' in texto
+    assert 'imoveis_replica_atraso_segundos{replica="b"} 30.0' in texto
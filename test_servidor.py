@@ -1,5 +1,12 @@
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
 import pytest
 import views
+import utils
+import servidor
+import cache
 from unittest.mock import patch, MagicMock
 from servidor import app
 
@@ -9,6 +16,20 @@ def client():
     with app.test_client() as client:
         yield client
 
+@pytest.fixture(autouse=True)
+def pool_vazio():
+    """Evita que um teste receba a conexão mockada de outro teste guardada no pool"""
+    servidor.pool.esvaziar()
+    yield
+    servidor.pool.esvaziar()
+
+@pytest.fixture(autouse=True)
+def cache_vazio():
+    """Evita que um teste leia do cache o resultado de outro teste"""
+    cache.cache_imoveis.limpar()
+    yield
+    cache.cache_imoveis.limpar()
+
 @patch("servidor.connect_db")  
 def test_get_imoveis(mock_connect_db, client):
     """Testa a rota GET /imoveis sem acessar o banco de dados real"""
@@ -164,7 +185,7 @@ def test_atualiza_imoveis_sucesso(mock_connect_db, client):
         WHERE id=%s
     """, (
         "Rua Nova", "Avenida", "Centro", "São Paulo", "01000-000",
-        "apartamento", 500000.0, "2023-01-01", 1
+        "apartamento", Decimal("500000.00"), date(2023, 1, 1), 1
     ))
     mock_conn.commit.assert_called_once()
 
@@ -180,7 +201,7 @@ def test_atualiza_imoveis_nao_encontrado(mock_connect_db, client):
     mock_connect_db.return_value = mock_conn
 
     
-    mock_cursor.fetchall.return_value = []
+    mock_cursor.rowcount = 0
 
     
     dados_atualizados = {
@@ -201,7 +222,11 @@ def test_atualiza_imoveis_nao_encontrado(mock_connect_db, client):
     assert response.get_json() == {"mensagem": "imóvel não encontrado"}
 
     
-    mock_cursor.execute.assert_called_once_with("SELECT * FROM imoveis WHERE id=%s", (999,))
+    mock_cursor.execute.assert_called_once_with(views.SQL_ATUALIZA_IMOVEL, (
+        "Rua Nova", "Avenida", "Centro", "São Paulo", "01000-000",
+        "apartamento", Decimal("500000.00"), date(2023, 1, 1), 999
+    ))
+    mock_conn.commit.assert_not_called()
     mock_conn.commit.assert_not_called()
 
 
@@ -237,8 +262,8 @@ def test_cria_imovel_db(mock_connect_db):
             "North Garyville",
             "93354",
             "casa em condominio",
-            260069.89,
-            "2021-11-30"
+            Decimal("260069.89"),
+            date(2021, 11, 30)
         )
     )
     mock_conn.commit.assert_called_once()
@@ -363,7 +388,7 @@ def test_delete_imovel_nao_encontrado(mock_connect_db, client):
     mock_connect_db.return_value = mock_conn
 
     
-    mock_cursor.fetchall.return_value = []
+    mock_cursor.rowcount = 0
 
     response = client.delete("/imoveis/999")
 
@@ -372,7 +397,7 @@ def test_delete_imovel_nao_encontrado(mock_connect_db, client):
     assert response.get_json() == {"mensagem": "imóvel não encontrado"}
 
     
-    mock_cursor.execute.assert_called_once_with("SELECT * FROM imoveis WHERE id=%s", (999,))
+    mock_cursor.execute.assert_called_once_with("DELETE FROM imoveis WHERE id=%s", (999,))
     mock_conn.commit.assert_not_called()
 
 @patch("servidor.connect_db")
@@ -412,14 +437,35 @@ def test_cria_imovel_retorna_header_location(mock_connect_db, client):
     mock_connect_db.return_value = mock_conn
     mock_cursor.lastrowid = 101
 
-    novo_imovel_data = {"logradouro": "Rua TDD", "tipo": "casa", "cidade": "Teste", "valor": 1, "data_aquisicao": "2025-01-01", "tipo_logradouro":"Rua", "bairro": "Centro", "cep":"123456"}
+    novo_imovel_data = {"logradouro": "Rua TDD", "tipo": "casa", "cidade": "Teste", "valor": 1, "data_aquisicao": "2025-01-01", "tipo_logradouro":"Rua", "bairro": "Centro", "cep":"12345-678"}
 
     response = client.post("/imoveis", json=novo_imovel_data)
 
     assert response.status_code == 201
     assert "Location" in response.headers
     assert response.headers["Location"] == "http://localhost/imoveis/101"
-    
+
+@patch("servidor.connect_db")
+def test_cria_imovel_lista_todos_os_erros(mock_connect_db, client):
+    """Testa se POST /imoveis devolve todos os campos inválidos de uma vez, sem tocar no banco"""
+    mock_conn = MagicMock()
+    mock_connect_db.return_value = mock_conn
+
+    novo_imovel_data = {"logradouro": "Rua TDD", "tipo": "casa", "cidade": "Teste", "valor": "caro", "data_aquisicao": "01/01/2025", "tipo_logradouro": "Rua", "cep": "1234"}
+
+    response = client.post("/imoveis", json=novo_imovel_data)
+
+    assert response.status_code == 400
+    assert response.get_json() == {"Erro": [
+        "o parâmetro bairro está faltando",
+        "o parâmetro cep deve ter o formato 00000-000",
+        "o parâmetro valor deve ser um número",
+        "o parâmetro data_aquisicao deve ser uma data AAAA-MM-DD",
+    ]}
+    mock_conn.cursor.assert_not_called()
+
+    assert client.post("/imoveis", data="[]", content_type="application/json").get_json() == {"Erro": ["o corpo deve ser um objeto JSON"]}
+
 @patch("servidor.connect_db")
 def test_listar_imoveis_retorna_links_em_cada_item(mock_connect_db, client):
     """Testa se GET /imoveis retorna uma lista onde cada item tem seu link HATEOAS."""
@@ -599,3 +645,876 @@ def test_lista_imoveis_por_cidade_retorna_links(mock_connect_db, client):
     assert "z_links" in imovel2
     assert imovel2["z_links"]["self"]["href"] == "http://localhost/imoveis/2"
     assert imovel2["z_links"]["self"]["method"] == "GET"
+
+
+@patch("servidor.connect_db")
+def test_listar_imoveis_paginado(mock_connect_db, client):
+    """Testa GET /imoveis?limite= retornando a página e o link para a próxima"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+
+    mock_cursor.fetchall.return_value = [
+        (1, 'Nicole Common', 'Travessa', 'Lake Danielle', 'Judymouth', '85184', 'casa em condominio', 488423.52, '2017-07-29'),
+        (2, 'Price Prairie', 'Travessa', 'Colonton', 'North Garyville', '93354', 'casa em condominio', 260069.89, '2021-11-30'),
+        (3, 'Taylor Ranch', 'Avenida', 'West Jennashire', 'Katherinefurt', '51116', 'apartamento', 815969.92, '2020-04-24'),
+    ]
+
+    response = client.get("/imoveis?limite=2")
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert [imovel["id"] for imovel in data["imoveis"]] == [1, 2]
+    assert data["imoveis"][0]["z_links"]["self"]["href"] == "http://localhost/imoveis/1"
+    assert "prev" not in data["z_links"]
+    mock_cursor.execute.assert_called_with("SELECT * FROM imoveis ORDER BY id ASC LIMIT %s", (3,))
+
+    proximo = data["z_links"]["next"]["href"]
+    mock_cursor.execute.reset_mock()
+    mock_cursor.fetchall.return_value = [
+        (3, 'Taylor Ranch', 'Avenida', 'West Jennashire', 'Katherinefurt', '51116', 'apartamento', 815969.92, '2020-04-24'),
+    ]
+
+    response = client.get(proximo)
+    data = response.get_json()
+
+    assert [imovel["id"] for imovel in data["imoveis"]] == [3]
+    assert "next" not in data["z_links"]
+    assert "prev" in data["z_links"]
+    mock_cursor.execute.assert_called_with("SELECT * FROM imoveis WHERE id > %s ORDER BY id ASC LIMIT %s", (2, 3))
+
+
+@patch("servidor.connect_db")
+def test_lista_imovel_por_cidade_pagina_anterior(mock_connect_db, client):
+    """Testa a navegação para a página anterior em /imoveis/cidade/<cidade>"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+
+    mock_cursor.fetchall.return_value = [
+        (5, 'Rua A', 'Rua', 'Bairro A', 'Campinas', '13000-000', 'casa', 250000, '2022-01-15'),
+        (4, 'Avenida B', 'Avenida', 'Bairro B', 'Campinas', '13000-111', 'apartamento', 500000, '2021-05-20'),
+    ]
+
+    cursor_anterior = utils.codifica_cursor(6, "a")
+    response = client.get(f"/imoveis/cidade/Campinas?limite=2&apos={cursor_anterior}")
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert [imovel["id"] for imovel in data["imoveis"]] == [4, 5]
+    assert "next" in data["z_links"]
+    assert "prev" not in data["z_links"]
+    mock_cursor.execute.assert_called_with(
+        "SELECT * FROM imoveis WHERE cidade = %s AND id < %s ORDER BY id DESC LIMIT %s", ("Campinas", 6, 3)
+    )
+
+
+@patch("servidor.connect_db")
+def test_paginacao_limita_tamanho_e_rejeita_cursor_invalido(mock_connect_db, client):
+    """Testa o tamanho máximo da página e a rejeição de parâmetros inválidos"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = []
+
+    response = client.get("/imoveis/tipo/casa?limite=100000")
+    assert response.status_code == 200
+    assert mock_cursor.execute.call_args[0][1] == ("casa", views.LIMITE_MAXIMO_PAGINA + 1)
+
+    assert client.get("/imoveis?apos=nao-e-cursor").status_code == 400
+    assert client.get("/imoveis?limite=0").status_code == 400
+
+
+@patch("servidor.connect_db")
+def test_listar_imoveis_stream_json(mock_connect_db, client):
+    """Testa GET /imoveis?stream=1 lendo o cursor em lotes com fetchmany"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+
+    mock_cursor.fetchmany.side_effect = [
+        [(1, 'Rua das Flores', 'Rua', 'Jardim', 'Campinas', '13000-000', 'casa', 250000, '2022-01-15')],
+        [(2, 'Avenida Principal', 'Avenida', 'Centro', 'São Paulo', '01000-000', 'apartamento', 500000, '2021-05-20')],
+        [],
+    ]
+
+    response = client.get("/imoveis?stream=1")
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert [imovel["id"] for imovel in data] == [1, 2]
+    assert data[1]["z_links"]["self"]["href"] == "http://localhost/imoveis/2"
+    mock_conn.cursor.assert_called_with(buffered=False)
+    mock_cursor.fetchall.assert_not_called()
+
+    assert servidor.pool.estatisticas()["em_uso"] == 1
+    response.close()
+    assert servidor.pool.estatisticas()["em_uso"] == 0
+
+
+@patch("servidor.connect_db")
+def test_lista_imovel_por_tipo_stream_ndjson(mock_connect_db, client):
+    """Testa GET /imoveis/tipo/<tipo> com Accept: application/x-ndjson"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+
+    mock_cursor.fetchmany.side_effect = [
+        [
+            (1, 'Nicole Common', 'Travessa', 'Lake Danielle', 'Judymouth', '85184', 'casa', 488423.52, '2017-07-29'),
+            (2, 'Price Prairie', 'Travessa', 'Colonton', 'North Garyville', '93354', 'casa', 260069.89, '2021-11-30'),
+        ],
+        [],
+    ]
+
+    response = client.get("/imoveis/tipo/casa", headers={"Accept": "application/x-ndjson"})
+    linhas = response.get_data(as_text=True).splitlines()
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(linha)["id"] for linha in linhas] == [1, 2]
+    mock_cursor.execute.assert_called_with("SELECT * FROM imoveis WHERE tipo = %s", ("casa",))
+    compactas = [json.dumps(json.loads(linha), sort_keys=True, separators=(",", ":")) for linha in linhas]
+    assert linhas == compactas
+
+
+@patch("servidor.connect_db")
+def test_get_imovel_com_colunas_date_e_decimal(mock_connect_db, client):
+    """Testa que DATE e DECIMAL (schema migrado) saem no mesmo formato de antes"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchone.return_value = (
+        2, 'Price Prairie', 'Travessa', 'Colonton', 'North Garyville',
+        '93354', 'casa em condominio', Decimal("260069.89"), date(2021, 11, 30)
+    )
+
+    data = client.get("/imoveis/2").get_json()
+
+    assert data["valor"] == 260069.89
+    assert data["data_aquisicao"] == "2021-11-30"
+
+
+@patch("servidor.connect_db")
+def test_get_imovel_por_id_usa_cache_ate_atualizacao(mock_connect_db, client):
+    """Testa que leituras repetidas saem do cache e que o PUT invalida a entrada"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchone.return_value = (
+        1, "Rua Velha", "Rua", "Centro", "São Paulo", "01000-000", "apartamento", 400000.0, "2020-01-01"
+    )
+
+    assert client.get("/imoveis/1").get_json()["logradouro"] == "Rua Velha"
+    assert client.get("/imoveis/1").get_json()["logradouro"] == "Rua Velha"
+    assert mock_cursor.execute.call_count == 1
+
+    mock_cursor.fetchall.return_value = [mock_cursor.fetchone.return_value]
+    mock_cursor.fetchone.return_value = (
+        1, "Rua Nova", "Avenida", "Centro", "São Paulo", "01000-000", "apartamento", 500000.0, "2023-01-01"
+    )
+    client.put("/imoveis/1", json={
+        "logradouro": "Rua Nova", "tipo_logradouro": "Avenida", "bairro": "Centro", "cidade": "São Paulo",
+        "cep": "01000-000", "tipo": "apartamento", "valor": 500000.0, "data_aquisicao": "2023-01-01"
+    })
+
+    assert client.get("/imoveis/1").get_json()["logradouro"] == "Rua Nova"
+    assert cache.cache_imoveis.estatisticas()["acertos"] == 1
+
+
+@patch("servidor.connect_db")
+def test_get_imovel_por_id_etag_e_304(mock_connect_db, client):
+    """Testa ETag/Last-Modified no GET /imoveis/<id> e o 304 sem buscar a linha inteira"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    atualizado_em = datetime(2025, 3, 1, 12, 30, 15, 123456)
+    mock_cursor.fetchone.return_value = (
+        2, 'Price Prairie', 'Travessa', 'Colonton', 'North Garyville',
+        '93354', 'casa em condominio', 260069.89, '2021-11-30', 7, atualizado_em
+    )
+
+    response = client.get("/imoveis/2")
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"2-7"'
+    assert response.headers["Last-Modified"] == "Sat, 01 Mar 2025 12:30:15 GMT"
+
+    mock_cursor.execute.reset_mock()
+    mock_cursor.fetchone.return_value = (7, atualizado_em)
+
+    response = client.get("/imoveis/2", headers={"If-None-Match": '"2-7"'})
+
+    assert response.status_code == 304
+    assert response.data == b""
+    mock_cursor.execute.assert_called_once_with("SELECT versao, atualizado_em FROM imoveis WHERE id=%s", (2,))
+
+    response = client.get("/imoveis/2", headers={"If-Modified-Since": "Sat, 01 Mar 2025 12:30:15 GMT"})
+    assert response.status_code == 304
+
+
+@patch("servidor.connect_db")
+def test_listar_imoveis_etag_da_colecao(mock_connect_db, client):
+    """Testa que a listagem usa a versão global da tabela como ETag"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchone.return_value = (42, datetime(2025, 3, 1, 12, 0, 0))
+    mock_cursor.fetchall.return_value = [
+        (1, 'Rua A', 'Rua', 'Bairro A', 'Campinas', '13000-000', 'casa', 250000, '2022-01-15'),
+    ]
+
+    response = client.get("/imoveis/cidade/Campinas")
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"c42"'
+
+    mock_cursor.fetchall.reset_mock()
+    response = client.get("/imoveis", headers={"If-None-Match": '"c42"'})
+
+    assert response.status_code == 304
+    mock_cursor.fetchall.assert_not_called()
+
+    mock_cursor.fetchone.return_value = (43, datetime(2025, 3, 1, 12, 5, 0))
+    assert client.get("/imoveis", headers={"If-None-Match": '"c42"'}).status_code == 200
+
+
+@patch("servidor.connect_db")
+def test_atualiza_imoveis_if_match_divergente(mock_connect_db, client):
+    """Testa o PUT condicional: sem SELECT prévio e 412 quando a versão mudou"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.rowcount = 0
+    mock_cursor.fetchone.return_value = (6, datetime(2025, 3, 1, 12, 0, 0))
+
+    dados = {
+        "logradouro": "Rua Nova", "tipo_logradouro": "Avenida", "bairro": "Centro", "cidade": "São Paulo",
+        "cep": "01000-000", "tipo": "apartamento", "valor": 500000.0, "data_aquisicao": "2023-01-01"
+    }
+    response = client.put("/imoveis/1", json=dados, headers={"If-Match": '"1-5"'})
+
+    assert response.status_code == 412
+    primeira_chamada = mock_cursor.execute.call_args_list[0]
+    assert primeira_chamada.args[0].rstrip().endswith("WHERE id=%s AND versao=%s")
+    assert primeira_chamada.args[1][-2:] == (1, 5)
+    mock_conn.commit.assert_not_called()
+
+    assert client.put("/imoveis/1", json=dados, headers={"If-Match": '"9-5"'}).status_code == 412
+
+
+@patch("servidor.connect_db")
+def test_delete_imovel_if_match(mock_connect_db, client):
+    """Testa o DELETE condicional em um único comando"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.rowcount = 1
+
+    response = client.delete("/imoveis/3", headers={"If-Match": '"3-8"'})
+
+    assert response.status_code == 200
+    mock_cursor.execute.assert_called_once_with("DELETE FROM imoveis WHERE id=%s AND versao=%s", (3, 8))
+    mock_conn.commit.assert_called_once()
+
+
+@patch("servidor.connect_db")
+def test_atualiza_parcial_imovel(mock_connect_db, client):
+    """Testa PATCH /imoveis/<id> com um UPDATE só das colunas enviadas"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.rowcount = 1
+
+    response = client.patch("/imoveis/4", json={"valor": 510000.0, "tipo": "casa"})
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert {k: data[k] for k in ("id", "tipo", "valor")} == {"id": 4, "tipo": "casa", "valor": 510000.0}
+    assert data["z_links"]["self"]["href"] == "http://localhost/imoveis/4"
+    mock_cursor.execute.assert_called_once_with("UPDATE imoveis SET tipo=%s, valor=%s WHERE id=%s", ("casa", 510000.0, 4))
+    mock_conn.commit.assert_called_once()
+
+    mock_cursor.rowcount = 0
+    assert client.patch("/imoveis/5", json={"valor": 1}).status_code == 404
+
+    response = client.patch("/imoveis/4", json={"valor": 1, "piscina": True})
+    assert response.status_code == 400
+    assert response.get_json() == {"Erro": ["o campo piscina não existe"]}
+    assert client.patch("/imoveis/4", json={}).status_code == 400
+
+
+@patch("servidor.connect_db")
+def test_listagem_links_none_e_full(mock_connect_db, client):
+    """Testa ?links=none|self|full nas listagens"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = [
+        (3, 'Rua A', 'Rua', 'Bairro A', 'Campinas', '13000-000', 'casa', 250000, '2022-01-15'),
+    ]
+
+    assert "z_links" not in client.get("/imoveis?links=none").get_json()[0]
+    assert client.get("/imoveis/tipo/casa?links=full").get_json()[0]["z_links"] == {
+        "self": {"href": "http://localhost/imoveis/3", "method": "GET"},
+        "update": {"href": "http://localhost/imoveis/3", "method": "PUT"},
+        "delete": {"href": "http://localhost/imoveis/3", "method": "DELETE"},
+        "collection": {"href": "http://localhost/imoveis", "method": "GET"}
+    }
+    data = client.get("/imoveis?limite=1&links=none").get_json()
+    assert "z_links" not in data["imoveis"][0]
+    assert data["z_links"]["self"]["href"] == "http://localhost/imoveis?limite=1&links=none"
+
+    response = client.get("/imoveis?links=todos")
+    assert response.status_code == 400
+    assert response.get_json() == {"Erro": "links deve ser none, self ou full"}
+
+
+@patch("servidor.connect_db")
+def test_provedor_json_rapido_gera_os_mesmos_bytes(mock_connect_db, client):
+    """Testa que o provedor com orjson responde exatamente os bytes do provedor padrão"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = [
+        (1, 'Rua São João', 'Rua', 'Conceição', 'São Paulo', '01000-000', 'apartamento', Decimal('488423.52'), date(2017, 7, 29)),
+        (2, 'Praça 😀', 'Praça', 'Sé', 'Niterói', '24000-000', None, None, None),
+    ]
+    provedor_atual = app.json
+    try:
+        app.json = servidor.ImoveisJSONProvider(app)
+        esperado = client.get("/imoveis").data
+        app.json = servidor.ImoveisJSONProviderRapido(app)
+        assert client.get("/imoveis").data == esperado
+    finally:
+        app.json = provedor_atual
+
+
+@patch("servidor.connect_db")
+def test_campos_seleciona_so_as_colunas_pedidas(mock_connect_db, client):
+    """Testa ?campos= com lista explícita de colunas e dicts montados pelo cursor.description"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.description = [("id",), ("cidade",), ("valor",)]
+    mock_cursor.fetchall.return_value = [(3, "Campinas", Decimal("250000.00"))]
+
+    response = client.get("/imoveis/tipo/casa?campos=valor,cidade&links=none")
+
+    assert response.status_code == 200
+    assert response.get_json() == [{"id": 3, "cidade": "Campinas", "valor": 250000.0}]
+    mock_cursor.execute.assert_called_with("SELECT id, cidade, valor FROM imoveis WHERE tipo =%s", ("casa",))
+
+    data = client.get("/imoveis?campos=cidade,valor&limite=1").get_json()
+    assert data["imoveis"][0]["cidade"] == "Campinas"
+    assert data["z_links"]["self"]["href"] == "http://localhost/imoveis?limite=1&campos=cidade,valor"
+    mock_cursor.execute.assert_called_with("SELECT id, cidade, valor FROM imoveis ORDER BY id ASC LIMIT %s", (2,))
+
+    mock_cursor.description = [("id",), ("cep",)]
+    mock_cursor.fetchone.return_value = (3, "13000-000")
+    response = client.get("/imoveis/3?campos=cep")
+    assert response.get_json()["cep"] == "13000-000"
+    assert "ETag" not in response.headers
+    mock_cursor.execute.assert_called_with("SELECT id, cep FROM imoveis WHERE id =%s", (3,))
+
+
+@patch("servidor.connect_db")
+def test_campos_invalidos(mock_connect_db, client):
+    """Testa que ?campos= só aceita colunas da lista branca"""
+    mock_connect_db.return_value = MagicMock()
+
+    response = client.get("/imoveis?campos=id,senha,valor;drop")
+    assert response.status_code == 400
+    assert response.get_json()["Erro"].startswith("campos inválidos: senha, valor;drop")
+
+    response = client.get("/imoveis/busca?campos=senha")
+    assert response.status_code == 400
+
+
+IMOVEL_LOTE = {
+    "logradouro": "Rua A", "tipo_logradouro": "Rua", "bairro": "Centro", "cidade": "Campinas",
+    "cep": "13000-000", "tipo": "casa", "valor": 250000, "data_aquisicao": "2022-01-15"
+}
+
+
+@patch("servidor.connect_db")
+def test_cria_imoveis_lote(mock_connect_db, client):
+    """Testa POST /imoveis/lote com um único INSERT de várias linhas e um commit"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.lastrowid = 50
+
+    response = client.post("/imoveis/lote", json=[IMOVEL_LOTE, {**IMOVEL_LOTE, "cidade": "Sorocaba"}])
+    data = response.get_json()
+
+    assert response.status_code == 201
+    assert [(imovel["indice"], imovel["id"]) for imovel in data["imoveis"]] == [(0, 50), (1, 51)]
+    assert data["imoveis"][1]["z_links"]["self"]["href"] == "http://localhost/imoveis/51"
+    assert data["erros"] == []
+    sql, linhas = mock_cursor.executemany.call_args.args
+    assert sql == views.SQL_INSERE_IMOVEL
+    assert [linha[3] for linha in linhas] == ["Campinas", "Sorocaba"]
+    mock_conn.commit.assert_called_once()
+
+
+@patch("servidor.connect_db")
+def test_cria_imoveis_lote_tudo_ou_nada_valida_antes(mock_connect_db, client):
+    """Testa que um item inválido impede todo o lote e que os erros vêm por item"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    incompleto = {k: v for k, v in IMOVEL_LOTE.items() if k not in ("cep", "valor")}
+
+    response = client.post("/imoveis/lote", json={"imoveis": [IMOVEL_LOTE, incompleto]})
+
+    assert response.status_code == 400
+    assert response.get_json()["erros"] == [
+        {"indice": 1, "erros": ["o parâmetro cep está faltando", "o parâmetro valor está faltando"]}
+    ]
+    mock_cursor.executemany.assert_not_called()
+
+    mock_cursor.lastrowid = 7
+    response = client.post("/imoveis/lote?modo=melhor_esforco", json=[incompleto, IMOVEL_LOTE])
+    data = response.get_json()
+
+    assert response.status_code == 201
+    assert [imovel["id"] for imovel in data["imoveis"]] == [7]
+    assert data["erros"][0]["indice"] == 0
+
+
+@patch("servidor.connect_db")
+def test_atualiza_imoveis_lote_id_inexistente(mock_connect_db, client):
+    """Testa PUT /imoveis/lote: no modo tudo ou nada um id inexistente desfaz o lote"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = [(1,)]
+
+    itens = [{**IMOVEL_LOTE, "id": 1}, {**IMOVEL_LOTE, "id": 2}]
+    response = client.put("/imoveis/lote", json=itens)
+
+    assert response.status_code == 400
+    assert response.get_json()["erros"] == [{"indice": 1, "erros": ["imóvel não encontrado"]}]
+    mock_conn.commit.assert_not_called()
+    mock_conn.rollback.assert_called()
+
+    response = client.put("/imoveis/lote?modo=melhor_esforco", json=itens)
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert [imovel["id"] for imovel in data["imoveis"]] == [1]
+    update = mock_cursor.execute.call_args
+    assert update.args[0].startswith("UPDATE imoveis i JOIN (SELECT %s AS id")
+    assert update.args[1][0] == 1
+
+
+@patch("servidor.connect_db")
+def test_delete_imoveis_lote(mock_connect_db, client):
+    """Testa DELETE /imoveis/lote com um único DELETE ... IN"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = [(3,), (4,)]
+
+    response = client.delete("/imoveis/lote", json={"ids": [3, 4]})
+
+    assert response.status_code == 200
+    assert [imovel["id"] for imovel in response.get_json()["imoveis"]] == [3, 4]
+    mock_cursor.execute.assert_called_with("DELETE FROM imoveis WHERE id IN (%s, %s)", (3, 4))
+    mock_conn.commit.assert_called_once()
+
+    assert client.delete("/imoveis/lote", json={"ids": [3, 3]}).status_code == 400
+    assert client.delete("/imoveis/lote?modo=qualquer", json=[3]).status_code == 400
+
+
+@patch("servidor.connect_db")
+def test_lote_tudo_ou_nada_tem_limite_menor(mock_connect_db, client, monkeypatch):
+    """Testa que um lote tudo ou nada acima do limite é recusado antes de abrir a transação"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = [(3,), (4,), (5,)]
+    monkeypatch.setattr(servidor, "LOTE_MAXIMO_TUDO_OU_NADA", 2)
+
+    response = client.delete("/imoveis/lote", json={"ids": [3, 4, 5]})
+
+    assert response.status_code == 400
+    assert "melhor_esforco" in response.get_json()["Erro"]
+    mock_cursor.execute.assert_not_called()
+
+    response = client.delete("/imoveis/lote?modo=melhor_esforco", json={"ids": [3, 4, 5]})
+    assert response.status_code == 200
+
+
+@patch("servidor.connect_db")
+def test_busca_imoveis_filtros_combinados(mock_connect_db, client):
+    """Testa GET /imoveis/busca montando um único SELECT parametrizado"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = [
+        (2, 'Avenida B', 'Avenida', 'Bairro B', 'Campinas', '13000-111', 'casa', 500000, '2021-05-20'),
+    ]
+
+    response = client.get(
+        "/imoveis/busca?tipo=casa&cidade=Campinas&valor_min=100000&valor_max=600000"
+        "&data_min=2020-01-01&ordenar=valor&ordem=desc&limite=5"
+    )
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data[0]["id"] == 2
+    assert data[0]["z_links"]["self"]["href"] == "http://localhost/imoveis/2"
+    mock_cursor.execute.assert_called_with(
+        "SELECT * FROM imoveis WHERE tipo = %s AND cidade = %s AND valor >= %s AND valor <= %s"
+        " AND data_aquisicao >= %s ORDER BY valor DESC, id DESC LIMIT %s",
+        ("casa", "Campinas", Decimal("100000"), Decimal("600000"), date(2020, 1, 1), 5)
+    )
+
+
+@patch("servidor.connect_db")
+def test_busca_imoveis_parametros_invalidos(mock_connect_db, client):
+    """Testa que a busca rejeita ordenação fora da lista e valores mal formatados"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+
+    response = client.get("/imoveis/busca?ordenar=valor;DROP TABLE imoveis&valor_min=barato&data_max=ontem")
+
+    assert response.status_code == 400
+    assert len(response.get_json()["Erro"]) == 3
+    mock_cursor.fetchall.assert_not_called()
+
+
+def faixa(valor):
+    return math.floor(math.log(valor) / math.log(views.RAZAO_FAIXAS))
+
+
+@patch("servidor.connect_db")
+def test_estatisticas_por_cidade_do_resumo(mock_connect_db, client):
+    """Testa GET /imoveis/estatisticas lendo só as tabelas de resumo"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.side_effect = [
+        [("Campinas", 3, 3, Decimal("900000.00"), Decimal("100000.00"), Decimal("500000.00"))],
+        [("Campinas", faixa(100000), 1), ("Campinas", faixa(300000), 1), ("Campinas", faixa(500000), 1)],
+    ]
+
+    response = client.get("/imoveis/estatisticas?agrupar=cidade&tipo=casa")
+
+    assert response.status_code == 200
+    [grupo] = response.get_json()
+    assert grupo["cidade"] == "Campinas"
+    assert grupo["quantidade"] == 3
+    assert grupo["media"] == 300000.0
+    assert (grupo["minimo"], grupo["maximo"]) == (100000.0, 500000.0)
+    assert abs(grupo["mediana"] - 300000) / 300000 < 0.006
+    consultas = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert all("FROM imoveis " not in consulta for consulta in consultas)
+    mock_cursor.execute.assert_any_call(
+        "SELECT cidade, SUM(quantidade), SUM(quantidade_valor), SUM(soma_valor), MIN(min_valor), MAX(max_valor) "
+        "FROM imoveis_resumo WHERE tipo = %s GROUP BY cidade ORDER BY cidade", ("casa",)
+    )
+
+
+def test_estatisticas_agrupamento_invalido(client):
+    with patch("servidor.connect_db"):
+        response = client.get("/imoveis/estatisticas?agrupar=logradouro")
+    assert response.status_code == 400
+
+
+@patch("servidor.connect_db")
+def test_etag_da_colecao_so_usa_opcoes_validadas(mock_connect_db, client):
+    """Testa que ?links= e ?campos= inválidos dão 400, e não um ETag com aspas (500)"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchone.return_value = (42, datetime(2025, 3, 1, 12, 0, 0))
+
+    assert client.get("/imoveis/estatisticas?links=%22").status_code == 400
+    assert client.get("/imoveis/estatisticas?campos=%22").status_code == 400
+
+    response = client.get("/imoveis?links=none&campos=valor,%20cidade")
+    assert response.headers["ETag"] == '"c42-none-id.cidade.valor"'
+
+
+def test_verifica_resumo_aponta_divergencias():
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchall.side_effect = [
+        [("Campinas", "casa", 2022, 2, 2, Decimal("10"), Decimal("4"), Decimal("6")),
+         ("Sorocaba", "casa", 2021, 1, 1, Decimal("5"), Decimal("5"), Decimal("5"))],
+        [("Campinas", "casa", 2022, 2, 2, Decimal("10"), Decimal("4"), Decimal("6")),
+         ("Sorocaba", "casa", 2021, 2, 2, Decimal("9"), Decimal("4"), Decimal("5"))],
+    ]
+
+    divergentes = views.verifica_resumo(mock_conn)
+
+    assert [grupo for grupo, _, _ in divergentes] == [("Sorocaba", "casa", 2021)]
+
+
+@patch("servidor.connect_db")
+def test_busca_texto_fulltext_com_prefixo(mock_connect_db, client):
+    """Testa GET /imoveis/texto usando MATCH ... AGAINST com prefixos e relevância"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = [
+        (2, 'Price Prairie', 'Travessa', 'Colonton', 'North Garyville', '93354', 'casa em condominio', 260069.89, '2021-11-30', 3, datetime(2025, 1, 1), 1.75),
+        (9, 'Prairie Road', 'Rua', 'Colonton', 'Lake Michael', '99549', 'terreno', 100000.0, '2020-01-01', 4, datetime(2025, 1, 1), 0.5),
+    ]
+
+    response = client.get("/imoveis/texto?q=Prairie Colon&limite=1")
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert [imovel["id"] for imovel in data["imoveis"]] == [2]
+    assert data["imoveis"][0]["relevancia"] == 1.75
+    assert "versao" not in data["imoveis"][0]
+    sql, params = mock_cursor.execute.call_args.args
+    assert "MATCH(logradouro, bairro, cidade) AGAINST (%s IN BOOLEAN MODE)" in sql
+    assert params == ("+Prairie* +Colon*", "+Prairie* +Colon*", 2, 0)
+
+    mock_cursor.fetchall.return_value = mock_cursor.fetchall.return_value[1:]
+    response = client.get(data["z_links"]["next"]["href"])
+    assert mock_cursor.execute.call_args.args[1][-1] == 1
+    assert "prev" in response.get_json()["z_links"]
+
+
+def test_busca_texto_sem_palavras(client):
+    with patch("servidor.connect_db"):
+        assert client.get("/imoveis/texto?q=+-*()").status_code == 400
+
+@patch("servidor.connect_db")
+def test_metrics_por_rota_e_consulta(mock_connect_db, client):
+    """GET /metrics expõe as requisições pelo molde da rota, as consultas e o pool"""
+    import metricas
+    metricas.registro.limpar()
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchone.return_value = None
+
+    assert client.get("/imoveis/7").status_code == 404
+    assert client.get("/rota/inexistente").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    texto = response.get_data(as_text=True)
+    assert 'imoveis_http_requisicoes_total{rota="/imoveis/<int:id>",metodo="GET",status="404"} 1' in texto
+    assert 'imoveis_http_requisicoes_total{rota="nao_encontrada",metodo="GET",status="404"} 1' in texto
+    assert 'imoveis_consulta_duracao_segundos_count{consulta="buscar_imovel"} 1' in texto
+    assert 'imoveis_consulta_linhas_total{consulta="buscar_imovel"} 0' in texto
+    assert "imoveis_db_conexao_segundos_count 1" in texto
+    assert 'imoveis_pool_conexoes{estado="livre"} 1' in texto
+
+@patch("servidor.connect_db")
+def test_admin_consultas_mais_lentas(mock_connect_db, client):
+    """GET /admin/consultas lista as formas de consulta por tempo total e p99"""
+    import consultas_lentas
+    consultas_lentas.registro_consultas.limpar()
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.return_value = []
+
+    client.get("/imoveis/cidade/Campinas")
+    client.get("/imoveis/cidade/Sorocaba")
+
+    response = client.get("/admin/consultas?n=10")
+    assert response.status_code == 200
+    dados = response.get_json()
+    assert len(dados["por_total"]) == len(dados["por_p99"]) == 2
+    por_cidade = [f for f in dados["por_total"] if f["sql"] == views.SQL_IMOVEIS_POR_CIDADE.replace("%s", "?")]
+    assert por_cidade[0]["execucoes"] == 2
+    assert len(client.get("/admin/consultas?n=1").get_json()["por_total"]) == 1
+    assert client.get("/admin/consultas?n=0").status_code == 400
+
+@patch("servidor.connect_db")
+def test_listagem_comprimida_guardada_pela_versao(mock_connect_db, client):
+    """Repetir GET /imoveis com gzip na mesma versão usa o corpo já comprimido"""
+    import gzip
+    import compressao
+    compressao.corpos_colecao.limpar()
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchone.return_value = (5, datetime(2024, 1, 1))
+    mock_cursor.fetchall.return_value = [
+        (i, 'Rua das Flores', 'Rua', 'Jardim', 'Campinas', '13000-000', 'casa', 250000, '2022-01-15') for i in range(1, 50)
+    ]
+
+    response = client.get("/imoveis", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == 'W/"c5"'
+    assert "Accept-Encoding" in response.headers["Vary"]
+    corpo = gzip.decompress(response.get_data())
+    assert [imovel["id"] for imovel in json.loads(corpo)] == list(range(1, 50))
+    assert mock_cursor.fetchall.call_count == 1
+
+    repetida = client.get("/imoveis", headers={"Accept-Encoding": "gzip"})
+    assert repetida.get_data() == response.get_data()
+    assert repetida.headers["Content-Encoding"] == "gzip"
+    assert mock_cursor.fetchall.call_count == 1
+
+    assert client.get("/imoveis", headers={"Accept-Encoding": "gzip", "If-None-Match": 'W/"c5"'}).status_code == 304
+    assert "Content-Encoding" not in client.get("/imoveis").headers
+    assert mock_cursor.fetchall.call_count == 2
+
+
+@patch("servidor.connect_db")
+def test_listagem_stream_comprimida(mock_connect_db, client):
+    """GET /imoveis?stream=1 com gzip comprime lote a lote e devolve a conexão ao fechar"""
+    import gzip
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchone.return_value = (5, datetime(2024, 1, 1))
+    mock_cursor.fetchmany.side_effect = [
+        [(1, 'Rua das Flores', 'Rua', 'Jardim', 'Campinas', '13000-000', 'casa', 250000, '2022-01-15')],
+        [],
+    ]
+
+    response = client.get("/imoveis?stream=1", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert json.loads(gzip.decompress(response.get_data()))[0]["id"] == 1
+    em_uso = servidor.pool.estatisticas()["em_uso"]
+    response.close()
+    assert servidor.pool.estatisticas()["em_uso"] == em_uso - 1
+
+@patch("servidor.connect_db")
+def test_mudancas_desde_token(mock_connect_db, client):
+    """GET /imoveis/mudancas junta gravações e remoções em ordem de versão"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchall.side_effect = [
+        [(4, 'Rua das Flores', 'Rua', 'Jardim', 'Campinas', '13000-000', 'casa', 250000, '2022-01-15', 12, datetime(2024, 1, 1))],
+        [(2, 11)],
+    ]
+    desde = utils.codifica_token_mudancas(10, 3)
+
+    response = client.get(f"/imoveis/mudancas?desde={desde}&limite=5")
+
+    assert response.status_code == 200
+    dados = response.get_json()
+    assert [(m["acao"], m["id"], m["versao"]) for m in dados["mudancas"]] == [("removido", 2, 11), ("gravado", 4, 12)]
+    assert dados["mudancas"][1]["imovel"]["cidade"] == "Campinas"
+    assert utils.decodifica_token_mudancas(dados["proximo"]) == (12, 4)
+    assert dados["mais"] is False
+    mock_cursor.execute.assert_any_call(
+        "SELECT id, versao FROM imoveis_removidos WHERE (versao, id) > (%s, %s) ORDER BY versao, id LIMIT %s", (10, 3, 6))
+
+@patch("servidor.connect_db")
+def test_mudancas_token_invalido(mock_connect_db, client):
+    mock_connect_db.return_value = MagicMock()
+    assert client.get("/imoveis/mudancas?desde=xyz").status_code == 400
+    assert client.get("/imoveis/mudancas?limite=0").status_code == 400
+    assert client.get("/imoveis/mudancas?campos=senha").status_code == 400
+
+@patch("servidor.connect_db")
+def test_exportar_csv_em_streaming(mock_connect_db, client):
+    """GET /imoveis/exportar?formato=csv lê em lotes com fetchmany, sem z_links"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_connect_db.return_value = mock_conn
+    mock_cursor.fetchmany.side_effect = [
+        [(1, 'Rua das Flores', 'Rua', 'Jardim', 'Campinas', '13000-000', 'casa', Decimal('250000.00'), date(2022, 1, 15))],
+        [],
+    ]
+
+    response = client.get("/imoveis/exportar?formato=csv&cidade=Campinas")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="imoveis.csv"'
+    assert response.get_data(as_text=True).splitlines() == [
+        "id,logradouro,tipo_logradouro,bairro,cidade,cep,tipo,valor,data_aquisicao",
+        "1,Rua das Flores,Rua,Jardim,Campinas,13000-000,casa,250000.00,2022-01-15",
+    ]
+    mock_conn.cursor.assert_called_with(buffered=False)
+    mock_cursor.execute.assert_called_with(
+        "SELECT id, logradouro, tipo_logradouro, bairro, cidade, cep, tipo, valor, data_aquisicao FROM imoveis"
+        " WHERE cidade = %s ORDER BY id", ("Campinas",))
+    response.close()
+
+@patch("servidor.connect_db")
+def test_exportar_parametros_invalidos(mock_connect_db, client):
+    mock_connect_db.return_value = MagicMock()
+    assert client.get("/imoveis/exportar?formato=xml").status_code == 400
+    assert client.get("/imoveis/exportar?valor_min=abc").get_json() == {"Erro": ["valor_min deve ser um número"]}
+
+@patch("servidor.connect_db")
+def test_sobrecarga_responde_503_com_retry_after(mock_connect_db, client, monkeypatch):
+    """Com o banco no limite e a fila cheia, a requisição é recusada sem abrir conexão"""
+    import admissao
+    controle = admissao.ControleAdmissao(limite=1, fila_maxima=0)
+    monkeypatch.setattr(servidor, "controle_admissao", controle)
+    controle.entrar()  # outra requisição ocupando a única vaga
+
+    response = client.get("/imoveis/1")
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    mock_connect_db.assert_not_called()
+    estado = client.get("/admin/estatisticas").get_json()["admissao"]
+    assert estado["em_execucao"] == 1
+    assert estado["descartadas"]["fila_cheia"] == 1
+    assert 'imoveis_admissao_descartadas_total{motivo="fila_cheia"} 1' in client.get("/metrics").get_data(as_text=True)
+
+    controle.sair()
+    mock_connect_db.return_value.cursor.return_value.fetchone.return_value = None
+    assert client.get("/imoveis/1").status_code == 404
+    assert controle.estatisticas()["em_execucao"] == 0
+
+def test_prioridade_por_rota():
+    """Escritas e GET por id na frente; listagens completas e exportação por último"""
+    import admissao
+    casos = [
+        ("POST", "/imoveis", admissao.ALTA),
+        ("GET", "/imoveis/7", admissao.ALTA),
+        ("GET", "/imoveis/busca?cidade=Campinas", admissao.NORMAL),
+        ("GET", "/imoveis?limite=20", admissao.NORMAL),
+        ("GET", "/imoveis", admissao.BAIXA),
+        ("GET", "/imoveis/cidade/Campinas", admissao.BAIXA),
+        ("GET", "/imoveis/exportar", admissao.BAIXA),
+    ]
+    for metodo, url, prioridade in casos:
+        with app.test_request_context(url, method=metodo):
+            assert servidor.prioridade_requisicao() == prioridade, url
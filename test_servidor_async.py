@@ -0,0 +1,202 @@
+import asyncio
+import json
+import pytest
+import cache
+import servidor_async
+from pool import PoolConexoesAsync, PoolEsgotado
+from unittest.mock import AsyncMock, patch
+from mysql.connector import Error
+
+
+@pytest.fixture(autouse=True)
+def pool_novo(monkeypatch):
+    """Cada teste roda em outro event loop, então usa um pool novo"""
+    monkeypatch.setattr(servidor_async, "pool", PoolConexoesAsync(lambda: servidor_async.connect_db()))
+
+@pytest.fixture(autouse=True)
+def cache_vazio():
+    cache.cache_imoveis.limpar()
+    yield
+    cache.cache_imoveis.limpar()
+
+
+def chama(metodo, caminho, query=b"", corpo=None):
+    """Executa o app ASGI e retorna (status, headers, json)."""
+    scope = {
+        "type": "http", "method": metodo, "path": caminho, "query_string": query,
+        "scheme": "http", "headers": [(b"host", b"localhost")],
+    }
+    mensagens = [{"type": "http.request", "body": json.dumps(corpo).encode() if corpo is not None else b""}]
+    enviadas = []
+
+    async def receive():
+        return mensagens.pop(0)
+
+    async def send(mensagem):
+        enviadas.append(mensagem)
+
+    asyncio.run(servidor_async.app(scope, receive, send))
+    inicio, corpo = enviadas
+    return inicio["status"], dict(inicio["headers"]), json.loads(corpo["body"])
+
+def conexao_mock(fetchall=None, fetchone=None, rowcount=1, lastrowid=None):
+    cursor = AsyncMock()
+    cursor.fetchall.return_value = fetchall or []
+    cursor.fetchone.return_value = fetchone
+    cursor.rowcount = rowcount
+    cursor.lastrowid = lastrowid
+    conn = AsyncMock()
+    conn.in_transaction = False
+    conn.cursor.return_value = cursor
+    return conn, cursor
+
+LINHA = (1, 'Nicole Common', 'Travessa', 'Lake Danielle', 'Judymouth', '85184', 'casa em condominio', 488423.52, '2017-07-29')
+
+
+@patch("servidor_async.connect_db")
+def test_listar_imoveis_async(mock_connect_db):
+    conn, cursor = conexao_mock(fetchall=[LINHA])
+    mock_connect_db.return_value = conn
+
+    status, headers, dados = chama("GET", "/imoveis")
+
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json"
+    assert dados[0]["logradouro"] == "Nicole Common"
+    assert dados[0]["z_links"] == {"self": {"href": "http://localhost/imoveis/1", "method": "GET"}}
+    cursor.execute.assert_awaited_once_with("SELECT * FROM imoveis", ())
+    assert servidor_async.pool.estatisticas()["em_uso"] == 0
+
+@patch("servidor_async.connect_db")
+def test_listagem_paginada_async_usa_o_sql_de_views(mock_connect_db):
+    conn, cursor = conexao_mock(fetchall=[LINHA, (2,) + LINHA[1:]])
+    mock_connect_db.return_value = conn
+
+    status, _, dados = chama("GET", "/imoveis/tipo/casa", b"limite=1")
+
+    assert status == 200
+    assert [imovel["id"] for imovel in dados["imoveis"]] == [1]
+    assert dados["z_links"]["self"]["href"] == "http://localhost/imoveis/tipo/casa?limite=1"
+    assert "apos=" in dados["z_links"]["next"]["href"]
+    cursor.execute.assert_awaited_once_with(
+        "SELECT * FROM imoveis WHERE tipo = %s ORDER BY id ASC LIMIT %s", ("casa", 2)
+    )
+
+@patch("servidor_async.connect_db")
+def test_campos_async(mock_connect_db):
+    conn, cursor = conexao_mock(fetchall=[(1, "Judymouth")])
+    cursor.description = [("id",), ("cidade",)]
+    mock_connect_db.return_value = conn
+
+    status, _, dados = chama("GET", "/imoveis", b"campos=cidade")
+
+    assert status == 200
+    assert dados == [{"id": 1, "cidade": "Judymouth", "z_links": {"self": {"href": "http://localhost/imoveis/1", "method": "GET"}}}]
+    cursor.execute.assert_awaited_once_with("SELECT id, cidade FROM imoveis", ())
+    assert chama("GET", "/imoveis", b"campos=nome")[0] == 400
+
+@patch("servidor_async.connect_db")
+def test_links_async_como_no_flask(mock_connect_db):
+    conn, cursor = conexao_mock(fetchall=[LINHA, (2,) + LINHA[1:]])
+    mock_connect_db.return_value = conn
+
+    status, _, dados = chama("GET", "/imoveis/cidade/Judymouth", b"links=none")
+    assert status == 200
+    assert all("z_links" not in imovel for imovel in dados)
+
+    status, _, dados = chama("GET", "/imoveis/tipo/casa", b"limite=1&links=full")
+    assert status == 200
+    assert set(dados["imoveis"][0]["z_links"]) == {"self", "update", "delete", "collection"}
+    assert "links=full" in dados["z_links"]["next"]["href"]
+
+    status, _, dados = chama("GET", "/imoveis", b"links=todos")
+    assert (status, dados) == (400, {"Erro": "links deve ser none, self ou full"})
+
+@patch("servidor_async.connect_db")
+def test_get_imovel_async_nao_encontrado(mock_connect_db):
+    conn, _ = conexao_mock(fetchone=None)
+    mock_connect_db.return_value = conn
+
+    status, _, dados = chama("GET", "/imoveis/99")
+
+    assert status == 404
+    assert dados == {"mensagem": "imóvel não encontrado"}
+
+@patch("servidor_async.connect_db")
+def test_cria_imovel_async(mock_connect_db):
+    conn, _ = conexao_mock(lastrowid=7)
+    mock_connect_db.return_value = conn
+    novo = dict(zip(["logradouro", "tipo_logradouro", "bairro", "cidade", "cep", "tipo", "valor", "data_aquisicao"], LINHA[1:]))
+
+    status, headers, dados = chama("POST", "/imoveis", corpo=novo)
+
+    assert status == 201
+    assert dados["id"] == 7
+    assert headers[b"location"] == b"http://localhost/imoveis/7"
+    conn.commit.assert_awaited_once()
+
+@patch("servidor_async.connect_db")
+def test_cria_imovel_async_sem_campo(mock_connect_db):
+    conn, _ = conexao_mock()
+    mock_connect_db.return_value = conn
+
+    status, _, dados = chama("POST", "/imoveis", corpo={"logradouro": "Rua A"})
+
+    assert status == 400
+    assert dados == {"Erro": [f"o parâmetro {campo} está faltando" for campo in ("tipo_logradouro", "bairro", "cidade", "cep", "tipo", "valor", "data_aquisicao")]}
+    conn.cursor.assert_not_awaited()
+
+@patch("servidor_async.connect_db")
+def test_delete_imovel_async(mock_connect_db):
+    conn, cursor = conexao_mock(fetchall=[LINHA])
+    mock_connect_db.return_value = conn
+
+    status, _, dados = chama("DELETE", "/imoveis/1")
+
+    assert status == 200
+    assert dados == {"mensagem": "imóvel removido com sucesso."}
+    cursor.execute.assert_awaited_with("DELETE FROM imoveis WHERE id=%s", (1,))
+
+@patch("servidor_async.connect_db")
+def test_patch_imovel_async(mock_connect_db):
+    conn, cursor = conexao_mock(rowcount=0)
+    mock_connect_db.return_value = conn
+
+    status, _, dados = chama("PATCH", "/imoveis/3", corpo={"valor": 1000})
+
+    assert status == 404
+    cursor.execute.assert_awaited_once_with("UPDATE imoveis SET valor=%s WHERE id=%s", (1000, 3))
+    conn.commit.assert_not_awaited()
+
+@patch("servidor_async.connect_db")
+def test_erro_de_banco_async(mock_connect_db):
+    conn, cursor = conexao_mock()
+    cursor.execute.side_effect = Error("falhou")
+    mock_connect_db.return_value = conn
+
+    status, _, dados = chama("GET", "/imoveis")
+
+    assert status == 500
+    assert dados["erro"].startswith("Erro no banco de dados")
+    assert servidor_async.pool.estatisticas()["em_uso"] == 0
+
+def test_rota_inexistente_e_metodo_nao_permitido():
+    assert chama("GET", "/nada")[0] == 404
+    assert chama("POST", "/imoveis/1")[0] == 405
+
+def test_pool_async_timeout():
+    async def fabrica():
+        return AsyncMock(in_transaction=False)
+
+    async def cenario():
+        pool = PoolConexoesAsync(fabrica, maximo=1, timeout=0.05)
+        conn = await pool.emprestar()
+        with pytest.raises(PoolEsgotado):
+            await pool.emprestar()
+        await pool.devolver(conn)
+        assert await pool.emprestar() is conn
+        return pool.estatisticas()
+
+    stats = asyncio.run(cenario())
+    assert stats["timeouts"] == 1
+    assert stats["criadas"] == 1
@@ -1,12 +1,114 @@
+import base64
+import json
+import re
+from datetime import date
+from decimal import Decimal
+
+from modelos import COLUNAS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
 def row_to_imovel(row):
-    return {
-        "id": row[0],
-        "logradouro": row[1],
-        "tipo_logradouro": row[2],
-        "bairro": row[3],
-        "cidade": row[4],
-        "cep": row[5],
-        "tipo": row[6],
-        "valor": row[7],
-        "data_aquisicao": row[8]
-    }
\ No newline at end of file
+    return dict(zip(COLUNAS, row))
+
+def nomes_colunas(cursor, campos):
+    """Nomes das colunas lidos do cursor.description quando a consulta tem
+    lista explícita de colunas (?campos); None para SELECT *, que é mapeado
+    por posição em row_to_imovel."""
+    if campos is None:
+        return None
+    return [coluna[0] for coluna in cursor.description]
+
+def rows_to_imoveis(rows, nomes=None):
+    # dicts simples: o orjson e o encoder em C do json serializam sem passar por Python
+    if nomes is None:
+        nomes = COLUNAS
+    return [dict(zip(nomes, row)) for row in rows]
+
+def json_default(o):
+    """Serializa DATE como 'AAAA-MM-DD' e DECIMAL como número (usado pelos dois servidores)."""
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+_NAO_ASCII = re.compile(r"[^\x00-\x7e]")
+
+def _escapa_unicode(encontrado):
+    codigo = ord(encontrado.group())
+    if codigo > 0xFFFF:
+        codigo -= 0x10000
+        return "\\u%04x\\u%04x" % (0xD800 | (codigo >> 10), 0xDC00 | (codigo & 0x3FF))
+    return "\\u%04x" % codigo
+
+def json_rapido(obj):
+    """Serializa com o orjson no mesmo formato do json.dumps usado pelo Flask
+    (chaves ordenadas, sem espaços, só ASCII).
+
+    Caracteres fora do ASCII só aparecem dentro de strings, então escapá-los
+    depois da serialização dá o mesmo resultado do ensure_ascii. Levanta
+    TypeError para o que o orjson não serializa (inteiros acima de 64 bits,
+    por exemplo), para o chamador cair no json padrão. A única diferença são
+    floats em notação exponencial (1e16 em vez de 1e+16), que as colunas
+    DECIMAL(12,2) não produzem.
+    """
+    texto = orjson.dumps(
+        obj, default=json_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    ).decode()
+    if not texto.isascii() or "\x7f" in texto:
+        texto = _NAO_ASCII.sub(_escapa_unicode, texto)
+    return texto
+
+def json_compacto(obj):
+    """JSON compacto, com chaves ordenadas e só ASCII; usa o orjson quando instalado."""
+    if orjson is not None:
+        try:
+            return json_rapido(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, default=json_default, sort_keys=True, separators=(",", ":"))
+
+def row_versao(row):
+    """(versao, atualizado_em) da linha, colunas adicionadas pela migração 003."""
+    if len(row) < 11:
+        return None
+    return row[9], row[10]
+
+def codifica_cursor(id, direcao):
+    """Gera o cursor opaco de paginação: direcao é 'p' (próxima) ou 'a' (anterior),
+    ou 'o' quando o cursor guarda um deslocamento (busca textual)."""
+    bruto = f"{direcao}{id}".encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+def decodifica_cursor(cursor, direcoes=("p", "a")):
+    """Retorna (id, direcao) do cursor, ou levanta ValueError se for inválido."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        direcao, id = bruto[0], int(bruto[1:])
+    except (ValueError, IndexError, UnicodeDecodeError):
+        raise ValueError("cursor inválido")
+    if direcao not in direcoes or id < 0:
+        raise ValueError("cursor inválido")
+    return id, direcao
+
+def codifica_token_mudancas(versao, id):
+    """Token opaco do feed de mudanças: a (versao, id) da última mudança entregue."""
+    bruto = f"m{versao}.{id}".encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+def decodifica_token_mudancas(token):
+    """Retorna (versao, id) do token, ou levanta ValueError se for inválido."""
+    try:
+        bruto = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        prefixo = bruto[0]
+        versao, id = (int(parte) for parte in bruto[1:].split("."))
+    except (ValueError, IndexError, UnicodeDecodeError):
+        raise ValueError("token inválido")
+    if prefixo != "m" or versao < 0 or id < 0:
+        raise ValueError("token inválido")
+    return versao, id
@@ -1,113 +1,903 @@
+import re
 import utils
-from mysql.connector import Error
+import cache
+import consultas_lentas
+import metricas
+import modelos
+from armazenamento import ERROS_BANCO, usa_sqlite
+from modelos import DadosInvalidos, imovel_de_dados
+from datetime import date
+from decimal import Decimal, InvalidOperation
 
-def listar_imoveis(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM imoveis")
+class VersaoDivergente(Exception):
+    """A versão informada no If-Match não é mais a versão atual do imóvel."""
+
+LIMITE_PADRAO_PAGINA = 20
+LIMITE_MAXIMO_PAGINA = 100
+
+CAMPOS_IMOVEL = ['logradouro', 'tipo_logradouro', 'bairro', 'cidade', 'cep', 'tipo', 'valor', 'data_aquisicao']
+
+TAMANHO_LOTE_ESCRITA = 500
+
+SQL_INSERE_IMOVEL = """
+        INSERT INTO imoveis (logradouro, tipo_logradouro, bairro, cidade, cep, tipo, valor, data_aquisicao)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """
+
+SQL_IMOVEL_POR_ID = "SELECT * FROM imoveis WHERE id =%s"
+SQL_IMOVEIS_POR_TIPO = "SELECT * FROM imoveis WHERE tipo =%s"
+SQL_IMOVEIS_POR_CIDADE = "SELECT * FROM imoveis WHERE cidade =%s"
+
+CAMPOS_CONSULTA = ['id'] + CAMPOS_IMOVEL
+
+def le_campos(valor):
+    """Converte ?campos=id,cidade,valor na tupla de colunas a selecionar.
+
+    Retorna None sem o parâmetro (SELECT *). O id sempre entra, pois é usado
+    nos links e nos cursores. Levanta ValueError com todos os nomes fora de
+    CAMPOS_CONSULTA.
+    """
+    if valor is None:
+        return None
+    pedidos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+    if not pedidos:
+        raise ValueError("campos não pode ser vazio")
+    invalidos = [campo for campo in pedidos if campo not in CAMPOS_CONSULTA]
+    if invalidos:
+        raise ValueError(f"campos inválidos: {', '.join(invalidos)}; use: {', '.join(CAMPOS_CONSULTA)}")
+    return tuple(campo for campo in CAMPOS_CONSULTA if campo == 'id' or campo in pedidos)
+
+def projeta(sql, campos=None):
+    """Troca o SELECT * pela lista explícita de colunas quando há ?campos."""
+    if campos is None:
+        return sql
+    return sql.replace("SELECT *", "SELECT " + ", ".join(campos), 1)
+
+def filtros_sql(tipo=None, cidade=None):
+    """Monta as condições de igualdade usadas pelas listagens filtradas."""
+    condicoes = []
+    params = []
+    if tipo is not None:
+        condicoes.append("tipo = %s")
+        params.append(tipo)
+    if cidade is not None:
+        condicoes.append("cidade = %s")
+        params.append(cidade)
+    return condicoes, params
+
+def consulta_pagina(limite, id_cursor=None, direcao="p", tipo=None, cidade=None, campos=None):
+    """Retorna (sql, params) da busca de uma página, buscando um item a mais."""
+    condicoes, params = filtros_sql(tipo, cidade)
+    if id_cursor is not None:
+        condicoes.append("id > %s" if direcao == "p" else "id < %s")
+        params.append(id_cursor)
+    sql = projeta("SELECT * FROM imoveis", campos)
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    sql += " ORDER BY id " + ("ASC" if direcao == "p" else "DESC") + " LIMIT %s"
+    params.append(limite + 1)
+    return sql, tuple(params)
+
+CAMPOS_ORDENACAO = ['id', 'valor', 'data_aquisicao', 'cidade', 'tipo', 'bairro']
+
+def le_filtros_busca(args):
+    """Converte os parâmetros de GET /imoveis/busca; retorna (filtros, erros).
+
+    Todos os erros encontrados são retornados de uma vez.
+    """
+    filtros = {}
+    erros = []
+    for campo in ('tipo', 'cidade', 'bairro'):
+        if args.get(campo):
+            filtros[campo] = args[campo]
+    for campo in ('valor_min', 'valor_max'):
+        if args.get(campo):
+            try:
+                filtros[campo] = Decimal(args[campo])
+                if not filtros[campo].is_finite():
+                    raise InvalidOperation
+            except InvalidOperation:
+                erros.append(f"{campo} deve ser um número")
+    for campo in ('data_min', 'data_max'):
+        if args.get(campo):
+            try:
+                filtros[campo] = date.fromisoformat(args[campo])
+            except ValueError:
+                erros.append(f"{campo} deve ser uma data AAAA-MM-DD")
+    ordenar = args.get('ordenar', 'id')
+    if ordenar not in CAMPOS_ORDENACAO:
+        erros.append(f"ordenar deve ser um de: {', '.join(CAMPOS_ORDENACAO)}")
+    filtros['ordenar'] = ordenar
+    ordem = args.get('ordem', 'asc').lower()
+    if ordem not in ('asc', 'desc'):
+        erros.append("ordem deve ser asc ou desc")
+    filtros['ordem'] = ordem
+    try:
+        filtros['limite'] = int(args.get('limite', LIMITE_PADRAO_PAGINA))
+        if filtros['limite'] < 1:
+            raise ValueError
+    except ValueError:
+        erros.append("limite deve ser um inteiro positivo")
+    try:
+        filtros['campos'] = le_campos(args.get('campos'))
+    except ValueError as e:
+        erros.append(str(e))
+    return filtros, erros
+
+def condicoes_busca(filtros):
+    """Condições e parâmetros dos filtros de le_filtros_busca.
+
+    Igualdades vêm antes das faixas para que o índice (tipo, cidade, valor)
+    resolva tipo + cidade + faixa de valor.
+    """
+    condicoes, params = filtros_sql(filtros.get('tipo'), filtros.get('cidade'))
+    if 'bairro' in filtros:
+        condicoes.append("bairro = %s")
+        params.append(filtros['bairro'])
+    faixas = [('valor_min', "valor >= %s"), ('valor_max', "valor <= %s"),
+              ('data_min', "data_aquisicao >= %s"), ('data_max', "data_aquisicao <= %s")]
+    for campo, condicao in faixas:
+        if campo in filtros:
+            condicoes.append(condicao)
+            params.append(filtros[campo])
+    return condicoes, params
+
+def consulta_busca(filtros):
+    """Monta (sql, params) da busca combinada, sempre parametrizada.
+
+    Nomes de colunas só entram no SQL a partir de CAMPOS_ORDENACAO, nunca
+    direto da requisição.
+    """
+    condicoes, params = condicoes_busca(filtros)
+
+    ordenar = filtros.get('ordenar', 'id')
+    if ordenar not in CAMPOS_ORDENACAO:
+        raise ValueError(f"coluna de ordenação inválida: {ordenar}")
+    ordem = "DESC" if filtros.get('ordem') == 'desc' else "ASC"
+
+    sql = projeta("SELECT * FROM imoveis", filtros.get('campos'))
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    sql += f" ORDER BY {ordenar} {ordem}"
+    if ordenar != 'id':
+        sql += f", id {ordem}"
+    sql += " LIMIT %s"
+    params.append(min(filtros.get('limite', LIMITE_PADRAO_PAGINA), LIMITE_MAXIMO_PAGINA))
+    return sql, tuple(params)
+
+@metricas.mede_consulta
+def busca_imoveis(conn, filtros):
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(*consulta_busca(filtros))
     rows = cursor.fetchall()
-    imoveis = [utils.row_to_imovel(row) for row in rows]
+    nomes = utils.nomes_colunas(cursor, filtros.get('campos'))
+    cursor.close()
+    return utils.rows_to_imoveis(rows, nomes)
+
+AGRUPAMENTOS_ESTATISTICAS = ['cidade', 'tipo', 'ano']
+RAZAO_FAIXAS = 1.01
+
+def _mediana_das_faixas(faixas, quantidade, minimo, maximo):
+    """Estima a mediana pelo histograma de faixas de 1% (erro máximo de ~0,5%)."""
+    if not quantidade:
+        return None
+    alvo = (quantidade + 1) / 2
+    acumulado = 0
+    for faixa, n in faixas:
+        acumulado += n
+        if acumulado >= alvo:
+            estimativa = 0.0 if faixa < 0 else RAZAO_FAIXAS ** (faixa + 0.5)
+            return round(min(max(estimativa, float(minimo)), float(maximo)), 2)
+    return float(maximo)
+
+def consultas_estatisticas(agrupar, cidade=None, tipo=None):
+    """Retorna as consultas (sql, params) do resumo e das faixas de valor.
+
+    `agrupar` é uma lista com colunas de AGRUPAMENTOS_ESTATISTICAS (pode ser
+    vazia, para o total geral).
+    """
+    for coluna in agrupar:
+        if coluna not in AGRUPAMENTOS_ESTATISTICAS:
+            raise ValueError(f"não é possível agrupar por {coluna}")
+    condicoes, params = filtros_sql(tipo, cidade)
+    where = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+    colunas = ", ".join(agrupar)
+    grupo = f" GROUP BY {colunas} ORDER BY {colunas}" if agrupar else ""
+    prefixo = colunas + ", " if agrupar else ""
+    resumo = (
+        f"SELECT {prefixo}SUM(quantidade), SUM(quantidade_valor), SUM(soma_valor), MIN(min_valor), MAX(max_valor) "
+        f"FROM imoveis_resumo{where}{grupo}"
+    )
+    faixas = f"SELECT {prefixo}faixa, SUM(quantidade) FROM imoveis_resumo_faixas{where} GROUP BY {prefixo}faixa ORDER BY {prefixo}faixa"
+    return (resumo, tuple(params)), (faixas, tuple(params))
+
+def resultado_estatisticas(agrupar, resumos, linhas_faixas):
+    faixas = {}
+    for row in linhas_faixas:
+        faixas.setdefault(tuple(row[:len(agrupar)]), []).append((row[-2], row[-1]))
+
+    resultado = []
+    for row in resumos:
+        chave = tuple(row[:len(agrupar)])
+        quantidade, quantidade_valor, soma, minimo, maximo = row[len(agrupar):]
+        if not quantidade:
+            continue
+        item = dict(zip(agrupar, chave))
+        item.update({
+            "quantidade": int(quantidade),
+            "media": round(float(soma) / int(quantidade_valor), 2) if quantidade_valor else None,
+            "minimo": minimo,
+            "maximo": maximo,
+            "mediana": _mediana_das_faixas(faixas.get(chave, []), int(quantidade_valor or 0), minimo, maximo),
+        })
+        resultado.append(item)
+    return resultado
+
+@metricas.mede_consulta
+def estatisticas(conn, agrupar, cidade=None, tipo=None):
+    """Quantidade, média, mínimo, máximo e mediana de valor, lidos de imoveis_resumo."""
+    consulta_resumo, consulta_faixas = consultas_estatisticas(agrupar, cidade, tipo)
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(*consulta_resumo)
+    resumos = cursor.fetchall()
+    cursor.execute(*consulta_faixas)
+    linhas_faixas = cursor.fetchall()
+    cursor.close()
+    return resultado_estatisticas(agrupar, resumos, linhas_faixas)
+
+SQL_RESUMO_BASE = """
+    SELECT cidade, COALESCE(tipo, ''), COALESCE(YEAR(data_aquisicao), 0), COUNT(*), COUNT(valor), COALESCE(SUM(valor), 0), MIN(valor), MAX(valor)
+    FROM imoveis
+    GROUP BY cidade, COALESCE(tipo, ''), COALESCE(YEAR(data_aquisicao), 0)
+"""
+
+SQL_NOVA_VERSAO = "UPDATE imoveis_estado SET versao = versao + 1, atualizado_em = CURRENT_TIMESTAMP(6) WHERE id = 1"
+SQL_NOVA_VERSAO_SQLITE = (
+    "UPDATE imoveis_estado SET versao = versao + 1, atualizado_em = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = 1"
+)
+
+def sql_nova_versao(conn):
+    """UPDATE que incrementa a versão global (migração 003) no dialeto da conexão."""
+    return SQL_NOVA_VERSAO_SQLITE if usa_sqlite(conn) else SQL_NOVA_VERSAO
+
+@metricas.mede_consulta
+def reconstroi_resumo(conn):
+    """Recalcula imoveis_resumo e imoveis_resumo_faixas a partir da tabela imoveis.
+
+    Incrementa a versão global na mesma transação, para que o ETag de
+    /imoveis/estatisticas mude e os corpos guardados em cache não sirvam o
+    resumo antigo.
+    """
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute("DELETE FROM imoveis_resumo")
+    cursor.execute("DELETE FROM imoveis_resumo_faixas")
+    cursor.execute(
+        "INSERT INTO imoveis_resumo (cidade, tipo, ano, quantidade, quantidade_valor, soma_valor, min_valor, max_valor)"
+        + SQL_RESUMO_BASE
+    )
+    cursor.execute("""
+        INSERT INTO imoveis_resumo_faixas (cidade, tipo, ano, faixa, quantidade)
+        SELECT cidade, COALESCE(tipo, ''), COALESCE(YEAR(data_aquisicao), 0), imoveis_faixa(valor), COUNT(*)
+        FROM imoveis
+        WHERE valor IS NOT NULL
+        GROUP BY cidade, COALESCE(tipo, ''), COALESCE(YEAR(data_aquisicao), 0), imoveis_faixa(valor)
+    """)
+    cursor.execute(sql_nova_versao(conn))
+    conn.commit()
+    cursor.close()
+
+@metricas.mede_consulta
+def verifica_resumo(conn):
+    """Compara o resumo com a agregação da tabela base; retorna os grupos divergentes."""
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(SQL_RESUMO_BASE)
+    esperado = {tuple(row[:3]): tuple(row[3:]) for row in cursor.fetchall()}
+    cursor.execute(
+        "SELECT cidade, tipo, ano, quantidade, quantidade_valor, soma_valor, min_valor, max_valor FROM imoveis_resumo"
+    )
+    atual = {tuple(row[:3]): tuple(row[3:]) for row in cursor.fetchall()}
+    cursor.close()
+    return sorted(
+        (grupo, esperado.get(grupo), atual.get(grupo))
+        for grupo in set(esperado) | set(atual)
+        if esperado.get(grupo) != atual.get(grupo)
+    )
+
+PROFUNDIDADE_MAXIMA_TEXTO = 1000
+SQL_MATCH_ENDERECO = "MATCH(logradouro, bairro, cidade) AGAINST (%s IN BOOLEAN MODE)"
+
+def consulta_texto(q, dialeto="mysql"):
+    """Converte o texto digitado em uma busca booleana do FULLTEXT.
+
+    Cada palavra vira obrigatória e com prefixo (+palavra* no MySQL,
+    "palavra"* no FTS5 do SQLite), e os operadores digitados pelo usuário
+    são descartados. Retorna None se não sobrar palavra.
+    """
+    palavras = re.findall(r"\w+", q)
+    if not palavras:
+        return None
+    if dialeto == "sqlite":
+        return " ".join(f'"{palavra}"*' for palavra in palavras)
+    return " ".join(f"+{palavra}*" for palavra in palavras)
+
+def consulta_busca_texto(q, limite, cursor_pagina=None, campos=None, dialeto="mysql"):
+    """Retorna (sql, params, deslocamento) da busca por endereço ordenada por relevância.
+
+    A paginação usa um cursor com o deslocamento, limitado a
+    PROFUNDIDADE_MAXIMA_TEXTO resultados. No SQLite a busca usa a tabela
+    imoveis_fts e a relevância é o bm25 com o sinal trocado.
+    """
+    consulta = consulta_texto(q, dialeto)
+    if consulta is None:
+        raise ValueError("a busca precisa de pelo menos uma palavra")
+    deslocamento = 0
+    if cursor_pagina is not None:
+        deslocamento, _ = utils.decodifica_cursor(cursor_pagina, direcoes=("o",))
+    if deslocamento >= PROFUNDIDADE_MAXIMA_TEXTO:
+        raise ValueError("a busca textual não pagina além de %d resultados" % PROFUNDIDADE_MAXIMA_TEXTO)
+    if dialeto == "sqlite":
+        colunas = "imoveis.*" if campos is None else ", ".join(f"imoveis.{campo}" for campo in campos)
+        sql = (
+            f"SELECT {colunas}, -bm25(imoveis_fts) AS relevancia FROM imoveis_fts "
+            "JOIN imoveis ON imoveis.id = imoveis_fts.rowid WHERE imoveis_fts MATCH %s "
+            "ORDER BY relevancia DESC, imoveis.id ASC LIMIT %s OFFSET %s"
+        )
+        return sql, (consulta, limite + 1, deslocamento), deslocamento
+    colunas = "*" if campos is None else ", ".join(campos)
+    sql = (
+        f"SELECT {colunas}, {SQL_MATCH_ENDERECO} AS relevancia FROM imoveis WHERE {SQL_MATCH_ENDERECO} "
+        "ORDER BY relevancia DESC, id ASC LIMIT %s OFFSET %s"
+    )
+    return sql, (consulta, consulta, limite + 1, deslocamento), deslocamento
+
+def resultado_texto(rows, limite, deslocamento, nomes=None):
+    tem_mais = len(rows) > limite and deslocamento + limite < PROFUNDIDADE_MAXIMA_TEXTO
+    rows = rows[:limite]
+    imoveis = utils.rows_to_imoveis(rows, nomes)
+    for row, imovel in zip(rows, imoveis):
+        imovel["relevancia"] = round(float(row[-1]), 4)
+    proximo = utils.codifica_cursor(deslocamento + limite, "o") if tem_mais else None
+    anterior = utils.codifica_cursor(max(deslocamento - limite, 0), "o") if deslocamento > 0 else None
+    return {"imoveis": imoveis, "proximo": proximo, "anterior": anterior}
+
+@metricas.mede_consulta
+def busca_texto(conn, q, limite, cursor_pagina=None, campos=None):
+    """Busca por endereço (logradouro, bairro, cidade) ordenada por relevância.
+
+    Retorna um dict como pagina_imoveis; cada imóvel traz também a "relevancia".
+    """
+    limite = min(limite, LIMITE_MAXIMO_PAGINA)
+    sql, params, deslocamento = consulta_busca_texto(q, limite, cursor_pagina, campos, "sqlite" if usa_sqlite(conn) else "mysql")
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    nomes = utils.nomes_colunas(cursor, campos)
+    cursor.close()
+    return resultado_texto(rows, limite, deslocamento, nomes)
+
+def resultado_pagina(rows, limite, direcao, cursor_pagina, nomes=None):
+    """Monta o dict da página a partir das linhas (limite + 1) lidas do banco."""
+    tem_mais = len(rows) > limite
+    rows = list(rows[:limite])
+    if direcao == "a":
+        rows.reverse()
+    imoveis = utils.rows_to_imoveis(rows, nomes)
+
+    proximo = anterior = None
+    if imoveis:
+        primeiro, ultimo = imoveis[0]["id"], imoveis[-1]["id"]
+        if direcao == "p":
+            proximo = utils.codifica_cursor(ultimo, "p") if tem_mais else None
+            anterior = utils.codifica_cursor(primeiro, "a") if cursor_pagina is not None else None
+        else:
+            proximo = utils.codifica_cursor(ultimo, "p")
+            anterior = utils.codifica_cursor(primeiro, "a") if tem_mais else None
+    return {"imoveis": imoveis, "proximo": proximo, "anterior": anterior}
+
+@metricas.mede_consulta
+def pagina_imoveis(conn, limite, cursor_pagina=None, tipo=None, cidade=None, campos=None):
+    """Busca uma página de imóveis ordenada por id (paginação por keyset).
+
+    Retorna um dict com os imóveis da página e os cursores opacos da próxima
+    página e da anterior (None quando não existem). Levanta ValueError se o
+    cursor for inválido.
+    """
+    limite = min(limite, LIMITE_MAXIMO_PAGINA)
+    id_cursor, direcao = None, "p"
+    if cursor_pagina is not None:
+        id_cursor, direcao = utils.decodifica_cursor(cursor_pagina)
+
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(*consulta_pagina(limite, id_cursor, direcao, tipo, cidade, campos))
+    rows = cursor.fetchall()
+    nomes = utils.nomes_colunas(cursor, campos)
+    cursor.close()
+    return resultado_pagina(rows, limite, direcao, cursor_pagina, nomes)
+
+LIMITE_MAXIMO_MUDANCAS = 1000
+
+def consultas_mudancas(versao, id, limite, campos=None):
+    """SQL das linhas gravadas e das remoções depois de (versao, id), na ordem do feed.
+
+    Com `campos` as linhas gravadas trazem essas colunas e a versão por último.
+    """
+    sql_gravados = "SELECT * FROM imoveis WHERE (versao, id) > (%s, %s) ORDER BY versao, id LIMIT %s"
+    if campos is not None:
+        sql_gravados = projeta(sql_gravados, campos + ("versao",))
+    return (
+        (sql_gravados, (versao, id, limite + 1)),
+        ("SELECT id, versao FROM imoveis_removidos WHERE (versao, id) > (%s, %s) ORDER BY versao, id LIMIT %s",
+         (versao, id, limite + 1)),
+    )
+
+@metricas.mede_consulta
+def mudancas_imoveis(conn, limite, token=None, campos=None):
+    """Imóveis gravados ou removidos depois do token, em ordem de versão.
+
+    A versão global só cresce (migração 003) e cada escrita recebe a sua, então
+    (versao, id) da última mudança entregue marca exatamente onde o cliente
+    parou. Sem token, começa do início: todas as linhas atuais. `campos`
+    (de le_campos) limita as colunas de cada imóvel gravado. Retorna
+    {"mudancas", "proximo", "mais"}; levanta ValueError se o token for inválido.
+    """
+    limite = min(limite, LIMITE_MAXIMO_MUDANCAS)
+    versao, id = (0, 0) if token is None else utils.decodifica_token_mudancas(token)
+    (sql_gravados, params_gravados), (sql_removidos, params_removidos) = consultas_mudancas(versao, id, limite, campos)
+
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(sql_gravados, params_gravados)
+    if campos is None:
+        gravados = [(row[9], row[0], utils.row_to_imovel(row)) for row in cursor.fetchall()]
+    else:
+        gravados = [(row[-1], row[0], dict(zip(campos, row))) for row in cursor.fetchall()]
+    cursor.execute(sql_removidos, params_removidos)
+    removidos = [(row[1], row[0], None) for row in cursor.fetchall()]
+    cursor.close()
+
+    # as duas listas vêm ordenadas e com limite + 1; as primeiras `limite`
+    # mudanças da junção estão entre elas
+    juntas = sorted(gravados + removidos, key=lambda mudanca: mudanca[:2])
+    mais = len(juntas) > limite
+    juntas = juntas[:limite]
+    mudancas = []
+    for versao_mudanca, id_mudanca, imovel in juntas:
+        if imovel is None:
+            mudancas.append({"acao": "removido", "id": id_mudanca, "versao": versao_mudanca})
+        else:
+            mudancas.append({"acao": "gravado", "id": id_mudanca, "versao": versao_mudanca, "imovel": imovel})
+    if juntas:
+        token = utils.codifica_token_mudancas(juntas[-1][0], juntas[-1][1])
+    elif token is None:
+        token = utils.codifica_token_mudancas(0, 0)
+    return {"mudancas": mudancas, "proximo": token, "mais": mais}
+
+@metricas.mede_consulta
+def iter_imoveis(conn, tamanho_lote=500, tipo=None, cidade=None, campos=None):
+    """Gera os imóveis em lotes lidos com fetchmany de um cursor não bufferizado.
+
+    Cada item gerado é a lista de imóveis de um lote, de forma que a memória
+    usada não depende do tamanho da tabela.
+    """
+    condicoes, params = filtros_sql(tipo, cidade)
+    sql = projeta("SELECT * FROM imoveis", campos)
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+
+    cursor = consultas_lentas.cursor(conn, buffered=False)
+    try:
+        cursor.execute(sql, tuple(params))
+        nomes = utils.nomes_colunas(cursor, campos)
+        while True:
+            rows = cursor.fetchmany(tamanho_lote)
+            if not rows:
+                break
+            yield utils.rows_to_imoveis(rows, nomes)
+    finally:
+        cursor.close()
+
+TAMANHO_LOTE_EXPORTACAO = 5000
+
+def consulta_exportacao(filtros):
+    """(sql, params, colunas) da exportação: os filtros da busca, sem limite, em ordem de id."""
+    colunas = filtros.get('campos') or tuple(CAMPOS_CONSULTA)
+    condicoes, params = condicoes_busca(filtros)
+    sql = projeta("SELECT * FROM imoveis", colunas)
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    return sql + " ORDER BY id", tuple(params), colunas
+
+@metricas.mede_consulta
+def iter_exportacao(conn, sql, params, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """Lotes de linhas cruas (tuplas do driver), lidas de um cursor sem buffer.
+
+    Ao contrário de iter_imoveis não monta dicts: quem exporta só precisa
+    dos valores na ordem das colunas de consulta_exportacao.
+    """
+    cursor = consultas_lentas.cursor(conn, buffered=False)
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(tamanho_lote)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+@metricas.mede_consulta
+def listar_imoveis(conn, campos=None):
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(projeta("SELECT * FROM imoveis", campos))
+    rows = cursor.fetchall()
+    imoveis = utils.rows_to_imoveis(rows, utils.nomes_colunas(cursor, campos))
     cursor.close()
     return imoveis
 
-def get_imovel_por_id(conn, id):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM imoveis WHERE id =%s", (id,))
+def _tags_listagem(imoveis, filtro):
+    return [filtro] + [cache.tag_id(imovel["id"]) for imovel in imoveis]
+
+@cache.em_cache("imovel", lambda encontrado, id, campos=None: [cache.tag_id(id)])
+@metricas.mede_consulta
+def buscar_imovel(conn, id, campos=None):
+    """Retorna (imovel, versao) ou None; versao é (numero, atualizado_em), ou None
+    se a tabela ainda não tem as colunas de versão ou se só alguns campos foram lidos."""
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(projeta(SQL_IMOVEL_POR_ID, campos), (id,))
     row = cursor.fetchone()
+    nomes = utils.nomes_colunas(cursor, campos)
     cursor.close()
     if not row:
         return None
-    return utils.row_to_imovel(row)
+    if nomes is not None:
+        return dict(zip(nomes, row)), None
+    return utils.row_to_imovel(row), utils.row_versao(row)
+
+def get_imovel_por_id(conn, id, campos=None):
+    encontrado = buscar_imovel(conn, id, campos)
+    if encontrado is None:
+        return None
+    return encontrado[0]
+
+@metricas.mede_consulta
+def versao_imovel(conn, id):
+    """Lê só (versao, atualizado_em) do imóvel, sem buscar a linha inteira."""
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute("SELECT versao, atualizado_em FROM imoveis WHERE id=%s", (id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return tuple(row) if row else None
 
+@metricas.mede_consulta
+def versao_colecao(conn):
+    """Lê a versão global da tabela, que muda a cada escrita em imoveis."""
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute("SELECT versao, atualizado_em FROM imoveis_estado WHERE id = 1")
+    row = cursor.fetchone()
+    cursor.close()
+    return tuple(row) if row else None
+
+@metricas.mede_consulta
 def cria_imovel_db(conn, dados):
-    required_params = ['logradouro', 'tipo_logradouro', 'bairro', 'cidade', 'cep', 'tipo', 'valor', 'data_aquisicao']
-    for param in required_params:
-        if param not in dados:
-            return [param]
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO imoveis (logradouro, tipo_logradouro, bairro, cidade, cep, tipo, valor, data_aquisicao)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """,
-        (
-            dados["logradouro"],
-            dados["tipo_logradouro"],
-            dados["bairro"],
-            dados["cidade"],
-            dados["cep"],
-            dados["tipo"],
-            dados["valor"],
-            dados["data_aquisicao"]
-        )
-    )
+    """Insere o imóvel e retorna o imóvel criado, com os valores como foram
+    gravados; levanta DadosInvalidos com todos os problemas dos dados antes
+    de tocar no banco."""
+    valores, erros = modelos.valida(dados)
+    if erros:
+        raise DadosInvalidos(erros)
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(SQL_INSERE_IMOVEL, tuple(valores[campo] for campo in CAMPOS_IMOVEL))
     
     novo_id = cursor.lastrowid
     
     conn.commit()
     cursor.close()
-    
-    dados['id'] = novo_id
-    return dados
+    cache.invalidar(cache.tag_id(novo_id), cache.tag_tipo(valores["tipo"]), cache.tag_cidade(valores["cidade"]))
+    return imovel_de_dados(novo_id, valores)
 
-def get_imoveis_por_tipo(conn, tipo):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM imoveis WHERE tipo =%s", (tipo,))
+@cache.em_cache("tipo", lambda imoveis, tipo, campos=None: _tags_listagem(imoveis, cache.tag_tipo(tipo)))
+@metricas.mede_consulta
+def get_imoveis_por_tipo(conn, tipo, campos=None):
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(projeta(SQL_IMOVEIS_POR_TIPO, campos), (tipo,))
     rows = cursor.fetchall()
-    imoveis = [utils.row_to_imovel(row) for row in rows]
+    imoveis = utils.rows_to_imoveis(rows, utils.nomes_colunas(cursor, campos))
     cursor.close()
     return imoveis
 
-def get_imoveis_por_cidade(conn, cidade):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM imoveis WHERE cidade =%s", (cidade,))
+@cache.em_cache("cidade", lambda imoveis, cidade, campos=None: _tags_listagem(imoveis, cache.tag_cidade(cidade)))
+@metricas.mede_consulta
+def get_imoveis_por_cidade(conn, cidade, campos=None):
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(projeta(SQL_IMOVEIS_POR_CIDADE, campos), (cidade,))
     rows = cursor.fetchall()
-    imoveis = [utils.row_to_imovel(row) for row in rows]
+    imoveis = utils.rows_to_imoveis(rows, utils.nomes_colunas(cursor, campos))
     cursor.close()
     return imoveis
 
-def atualiza_imovel(conn, id, data):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM imoveis WHERE id=%s", (id,))
-    rows = cursor.fetchall()
-    if not rows:
-        cursor.close()
-        return None
-    
-    required_params = ['logradouro', 'tipo_logradouro', 'bairro', 'cidade', 'cep', 'tipo', 'valor', 'data_aquisicao']
-    for param in required_params:
-        if param not in data:
-            return [param]
-   
-    cursor.execute("""
+SQL_ATUALIZA_IMOVEL = """
         UPDATE imoveis
         SET logradouro=%s, tipo_logradouro=%s, bairro=%s, cidade=%s, cep=%s, tipo=%s, valor=%s, data_aquisicao=%s
         WHERE id=%s
-    """, (
-        data["logradouro"],
-        data["tipo_logradouro"],
-        data["bairro"],
-        data["cidade"],
-        data["cep"],
-        data["tipo"],
-        data["valor"],
-        data["data_aquisicao"],
-        id
-    ))
+    """
+
+def _nao_encontrado(conn, id, versao_esperada):
+    """Chamada quando o UPDATE/DELETE não afetou linhas: True se o imóvel não existe.
+
+    Sem If-Match o imóvel não existe (a conexão usa FOUND_ROWS, então o
+    rowcount do UPDATE conta as linhas encontradas, não só as alteradas).
+    Com If-Match é preciso uma leitura para separar 404 de 412.
+    """
+    if versao_esperada is None or versao_imovel(conn, id) is None:
+        return True
+    raise VersaoDivergente(id)
+
+def _tags_escrita(id, data):
+    tags = [cache.tag_id(id)]
+    if "tipo" in data:
+        tags.append(cache.tag_tipo(data["tipo"]))
+    if "cidade" in data:
+        tags.append(cache.tag_cidade(data["cidade"]))
+    return tags
+
+@metricas.mede_consulta
+def atualiza_imovel(conn, id, data, versao_esperada=None):
+    """Atualiza o imóvel com um único UPDATE; com `versao_esperada` (If-Match)
+    a linha só é alterada se a versão ainda for essa.
+
+    Retorna o imóvel como foi gravado (sem reler a linha) ou None se não
+    existe. Levanta DadosInvalidos se os dados não passam na validação e
+    VersaoDivergente se a linha existe mas mudou de versão.
+    """
+    valores, erros = modelos.valida(data)
+    if erros:
+        raise DadosInvalidos(erros)
+
+    sql = SQL_ATUALIZA_IMOVEL
+    params = tuple(valores[campo] for campo in CAMPOS_IMOVEL) + (id,)
+    if versao_esperada is not None:
+        sql = SQL_ATUALIZA_IMOVEL.rstrip() + " AND versao=%s"
+        params += (versao_esperada,)
+
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(sql, params)
+    afetadas = cursor.rowcount
+    cursor.close()
+    if afetadas == 0 and _nao_encontrado(conn, id, versao_esperada):
+        return None
     conn.commit()
-    cursor.execute("SELECT * FROM imoveis WHERE id=%s", (id,))
-    row = cursor.fetchone()
-    imovel = utils.row_to_imovel(row)
+    cache.invalidar(*_tags_escrita(id, valores))
+    return imovel_de_dados(id, valores)
+
+def consulta_atualizacao_parcial(id, data, versao_esperada=None):
+    """Monta (sql, params, valores) do UPDATE só com as colunas enviadas.
+
+    Levanta DadosInvalidos com todos os problemas (campos desconhecidos,
+    corpo vazio, tipos e formatos); os nomes de coluna só entram no SQL a
+    partir de CAMPOS_IMOVEL.
+    """
+    valores, erros = modelos.valida(data, parcial=True)
+    if erros:
+        raise DadosInvalidos(erros)
+    campos = [campo for campo in CAMPOS_IMOVEL if campo in valores]
+    atribuicoes = ", ".join(f"{campo}=%s" for campo in campos)
+    sql = f"UPDATE imoveis SET {atribuicoes} WHERE id=%s"
+    params = tuple(valores[campo] for campo in campos) + (id,)
+    if versao_esperada is not None:
+        sql += " AND versao=%s"
+        params += (versao_esperada,)
+    return sql, params, valores
+
+@metricas.mede_consulta
+def atualiza_parcial_imovel(conn, id, data, versao_esperada=None):
+    """PATCH: atualiza só os campos enviados, com um único UPDATE.
+
+    Retorna só o id e os campos gravados (não o imóvel inteiro), ou None se
+    o imóvel não existe. Levanta DadosInvalidos ou VersaoDivergente (If-Match).
+    """
+    sql, params, valores = consulta_atualizacao_parcial(id, data, versao_esperada)
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(sql, params)
+    afetadas = cursor.rowcount
     cursor.close()
-    return imovel
+    if afetadas == 0 and _nao_encontrado(conn, id, versao_esperada):
+        return None
+    conn.commit()
+    cache.invalidar(*_tags_escrita(id, valores))
+    return imovel_de_dados(id, valores)
 
-def delete_imovel(conn, id):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM imoveis WHERE id=%s", (id,))
-    rows = cursor.fetchall()
-    if not rows:
-        cursor.close()
+@metricas.mede_consulta
+def delete_imovel(conn, id, versao_esperada=None):
+    """Remove o imóvel com um único DELETE (condicional com `versao_esperada`).
+
+    Retorna False se não existe; levanta VersaoDivergente se a linha existe
+    mas mudou de versão.
+    """
+    sql, params = "DELETE FROM imoveis WHERE id=%s", (id,)
+    if versao_esperada is not None:
+        sql, params = "DELETE FROM imoveis WHERE id=%s AND versao=%s", (id, versao_esperada)
+    cursor = consultas_lentas.cursor(conn)
+    cursor.execute(sql, params)
+    afetadas = cursor.rowcount
+    cursor.close()
+    if afetadas == 0 and _nao_encontrado(conn, id, versao_esperada):
         return False
-    cursor.execute("DELETE FROM imoveis WHERE id=%s", (id,))
     conn.commit()
-    cursor.close()
-    return True
\ No newline at end of file
+    cache.invalidar(cache.tag_id(id))
+    return True
+
+def _em_blocos(itens, tamanho):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+def valida_lote(itens, exige_id=False):
+    """Valida todos os itens de um lote antes de qualquer escrita.
+
+    Retorna (validos, erros): validos é uma lista de (indice, valores), com os
+    valores convertidos por modelos.valida (e o id, com `exige_id`), e erros
+    uma lista de {"indice", "erros"} com todos os problemas de cada item.
+    """
+    validos = []
+    erros = []
+    ids_vistos = set()
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            erros.append({"indice": indice, "erros": ["o item deve ser um objeto"]})
+            continue
+        valores, problemas = modelos.valida(item)
+        if exige_id:
+            id = item.get("id")
+            if not isinstance(id, int) or isinstance(id, bool):
+                problemas.append("o parâmetro id deve ser um inteiro")
+            elif id in ids_vistos:
+                problemas.append(f"o id {id} aparece mais de uma vez no lote")
+            else:
+                ids_vistos.add(id)
+                valores["id"] = id
+        if problemas:
+            erros.append({"indice": indice, "erros": problemas})
+        else:
+            validos.append((indice, valores))
+    return validos, erros
+
+def valida_ids_lote(ids):
+    """Como valida_lote, para uma lista de ids a remover."""
+    validos = []
+    erros = []
+    vistos = set()
+    for indice, id in enumerate(ids):
+        if not isinstance(id, int) or isinstance(id, bool):
+            erros.append({"indice": indice, "erros": ["o id deve ser um inteiro"]})
+        elif id in vistos:
+            erros.append({"indice": indice, "erros": [f"o id {id} aparece mais de uma vez no lote"]})
+        else:
+            vistos.add(id)
+            validos.append((indice, id))
+    return validos, erros
+
+def _escreve_em_blocos(conn, validos, escreve_bloco, tudo_ou_nada, tamanho_lote):
+    """Executa `escreve_bloco(cursor, bloco)` em transações de até `tamanho_lote` itens.
+
+    Em tudo_ou_nada há uma única transação: qualquer erro desfaz tudo e é
+    levantado de novo. No modo melhor esforço cada bloco tem sua transação e
+    um bloco que falha vira erro de cada um dos seus itens.
+    escreve_bloco retorna (resultados, erros) do bloco.
+    """
+    resultados = []
+    erros = []
+    cursor = consultas_lentas.cursor(conn)
+    try:
+        for bloco in _em_blocos(validos, tamanho_lote):
+            try:
+                resultados_bloco, erros_bloco = escreve_bloco(cursor, bloco)
+            except ERROS_BANCO as e:
+                conn.rollback()
+                if tudo_ou_nada:
+                    raise
+                erros.extend({"indice": indice, "erros": [f"Erro no banco de dados: {e}"]} for indice, _ in bloco)
+                continue
+            if erros_bloco and tudo_ou_nada:
+                conn.rollback()
+                return [], erros + erros_bloco
+            if not tudo_ou_nada:
+                conn.commit()
+            resultados.extend(resultados_bloco)
+            erros.extend(erros_bloco)
+        if tudo_ou_nada:
+            conn.commit()
+    finally:
+        cursor.close()
+    return resultados, erros
+
+def _ids_existentes(cursor, ids):
+    marcadores = ", ".join(["%s"] * len(ids))
+    # o SQLite não tem FOR UPDATE; lá as escritas já são serializadas pelo lock do banco
+    trava = "" if usa_sqlite(cursor) else " FOR UPDATE"
+    cursor.execute(f"SELECT id FROM imoveis WHERE id IN ({marcadores}){trava}", tuple(ids))
+    return {row[0] for row in cursor.fetchall()}
+
+@metricas.mede_consulta
+def cria_imoveis_lote(conn, itens, tudo_ou_nada=True, tamanho_lote=TAMANHO_LOTE_ESCRITA):
+    """Insere vários imóveis com INSERTs de várias linhas.
+
+    Retorna (criados, erros); criados é uma lista de (indice, id). Os ids de
+    cada bloco são consecutivos a partir de lastrowid, pois um INSERT com
+    número de linhas conhecido reserva o intervalo de AUTO_INCREMENT de uma vez.
+    """
+    validos, erros = valida_lote(itens)
+    if erros and tudo_ou_nada:
+        return [], erros
+
+    def escreve_bloco(cursor, bloco):
+        cursor.executemany(SQL_INSERE_IMOVEL, [tuple(item[c] for c in CAMPOS_IMOVEL) for _, item in bloco])
+        primeiro_id = cursor.lastrowid
+        return [(indice, primeiro_id + i) for i, (indice, _) in enumerate(bloco)], []
+
+    criados, erros_escrita = _escreve_em_blocos(conn, validos, escreve_bloco, tudo_ou_nada, tamanho_lote)
+    por_indice = dict(validos)
+    tags = set()
+    for indice, id in criados:
+        tags.update((cache.tag_id(id), cache.tag_tipo(por_indice[indice]["tipo"]), cache.tag_cidade(por_indice[indice]["cidade"])))
+    cache.invalidar(*tags)
+    return criados, sorted(erros + erros_escrita, key=lambda erro: erro["indice"])
+
+@metricas.mede_consulta
+def atualiza_imoveis_lote(conn, itens, tudo_ou_nada=True, tamanho_lote=TAMANHO_LOTE_ESCRITA):
+    """Atualiza vários imóveis com um UPDATE por bloco, juntando imoveis a uma
+    tabela derivada com os novos valores.
+
+    Retorna (atualizados, erros); atualizados é uma lista de (indice, id).
+    """
+    validos, erros = valida_lote(itens, exige_id=True)
+    if erros and tudo_ou_nada:
+        return [], erros
+
+    def escreve_bloco(cursor, bloco):
+        existentes = _ids_existentes(cursor, [item["id"] for _, item in bloco])
+        erros_bloco = [{"indice": indice, "erros": ["imóvel não encontrado"]} for indice, item in bloco if item["id"] not in existentes]
+        bloco = [(indice, item) for indice, item in bloco if item["id"] in existentes]
+        if not bloco:
+            return [], erros_bloco
+        colunas = ", ".join(f"%s AS {c}" for c in CAMPOS_IMOVEL)
+        derivada = " UNION ALL ".join([f"SELECT %s AS id, {colunas}"] * len(bloco))
+        atribuicoes = ", ".join(f"i.{c} = v.{c}" for c in CAMPOS_IMOVEL)
+        params = []
+        for _, item in bloco:
+            params.append(item["id"])
+            params.extend(item[c] for c in CAMPOS_IMOVEL)
+        if usa_sqlite(cursor):
+            atribuicoes = ", ".join(f"{c} = v.{c}" for c in CAMPOS_IMOVEL)
+            cursor.execute(f"UPDATE imoveis SET {atribuicoes} FROM ({derivada}) AS v WHERE imoveis.id = v.id", tuple(params))
+        else:
+            cursor.execute(f"UPDATE imoveis i JOIN ({derivada}) v ON i.id = v.id SET {atribuicoes}", tuple(params))
+        return [(indice, item["id"]) for indice, item in bloco], erros_bloco
+
+    atualizados, erros_escrita = _escreve_em_blocos(conn, validos, escreve_bloco, tudo_ou_nada, tamanho_lote)
+    por_indice = dict(validos)
+    tags = set()
+    for indice, id in atualizados:
+        tags.update((cache.tag_id(id), cache.tag_tipo(por_indice[indice]["tipo"]), cache.tag_cidade(por_indice[indice]["cidade"])))
+    cache.invalidar(*tags)
+    return atualizados, sorted(erros + erros_escrita, key=lambda erro: erro["indice"])
+
+@metricas.mede_consulta
+def delete_imoveis_lote(conn, ids, tudo_ou_nada=True, tamanho_lote=TAMANHO_LOTE_ESCRITA):
+    """Remove vários imóveis com um DELETE ... WHERE id IN (...) por bloco.
+
+    Retorna (removidos, erros); removidos é uma lista de (indice, id).
+    """
+    validos, erros = valida_ids_lote(ids)
+    if erros and tudo_ou_nada:
+        return [], erros
+
+    def escreve_bloco(cursor, bloco):
+        existentes = _ids_existentes(cursor, [id for _, id in bloco])
+        erros_bloco = [{"indice": indice, "erros": ["imóvel não encontrado"]} for indice, id in bloco if id not in existentes]
+        bloco = [(indice, id) for indice, id in bloco if id in existentes]
+        if bloco:
+            marcadores = ", ".join(["%s"] * len(bloco))
+            cursor.execute(f"DELETE FROM imoveis WHERE id IN ({marcadores})", tuple(id for _, id in bloco))
+        return bloco, erros_bloco
+
+    removidos, erros_escrita = _escreve_em_blocos(conn, validos, escreve_bloco, tudo_ou_nada, tamanho_lote)
+    cache.invalidar(*(cache.tag_id(id) for _, id in removidos))
+    return removidos, sorted(erros + erros_escrita, key=lambda erro: erro["indice"])